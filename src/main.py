@@ -2,45 +2,81 @@
 import importlib.resources
 import os.path
 from datetime import datetime, timedelta
-from sumacli import utils, validator, client_systems, patching, migration, upgrade, client as suma_xmlrpc_client
+from sumacli import utils, validator, client_systems, patching, migration, upgrade, waves, plan, inventory, \
+    events, log_mgr, shard, tracing, daemon, fingerprint, pipeline, report, profiler, client as suma_xmlrpc_client
+from sumacli.scheduler import SKIPPED
 import logging.config
 import logging
 import argparse
 import sys
+import time
+from contextlib import contextmanager
 
+SCHEDULER_FACTORIES = {"patch": patching.PatchingSchedulerFactory,
+                       "migrate": migration.ProductMigrationSchedulerFactory,
+                       "upgrade": upgrade.SystemUpgradeSchedulerFactory}
 
-def perform_scheduling(scheduler, system, date):
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# commands that never run in the daemon
+LOCAL_COMMANDS = ["serve", "user"]
+
+# seconds between checks of the session of the daemon
+SESSION_CHECK_INTERVAL = 600
+
+_shared_client = None
+_shared_client_checked = 0.0
+
+
+def record_event(operation, system, date, action_ids, latency, errors, details=None, bulk=False):
+    event_stream = events.get_event_stream()
+    if event_stream is None:
+        return
+    if action_ids is SKIPPED:
+        status, action_ids = "skipped", None
+    else:
+        status = "scheduled" if action_ids else "failed"
+    event_stream.emit(operation=operation, system=system.name, date=date, status=status, action_ids=action_ids or [],
+                      latency=round(latency, 3), error="; ".join(errors) if errors else None, bulk=bulk,
+                      **(details or {}))
+
+
+def log_scheduling_result(system, description, date, action_ids):
     logger = logging.getLogger(__name__)
-    action_ids = scheduler.schedule()
-    if action_ids:
-        if isinstance(scheduler, migration.SystemProductMigrationScheduler):
-            logger.info(f"System {system.name} scheduled successfully for product migration at {date}")
-        elif isinstance(scheduler, patching.SystemPatchingScheduler):
-            advisory_types_description = [t.value for t in scheduler.get_advisory_types()]
-            logger.info(f"System {system.name} scheduled successfully for "
-                        f"{advisory_types_description} patching at {date}")
-        elif isinstance(scheduler, utils.SystemPackageRefreshScheduler):
-            logger.info(f"System {system.name} scheduled successfully for a package refresh at {date}")
-        elif isinstance(scheduler, upgrade.SystemUpgradeScheduler):
-            logger.info(f"System {system.name} scheduled successfully for upgrade at {date}")
-        elif isinstance(scheduler, utils.SystemRebootScheduler):
-            logger.info(f"System {system.name} scheduled successfully for reboot at {date}")
+    if action_ids is SKIPPED:
+        logger.warning(f"System {system.name} skipped for {description} at {date}")
+    elif action_ids:
+        logger.info(f"System {system.name} scheduled successfully for {description} at {date}")
     else:
-        if isinstance(scheduler, migration.SystemProductMigrationScheduler):
-            logger.error(f"System {system.name} failed to be scheduled for product migration at {date}")
-        elif isinstance(scheduler, patching.SystemPatchingScheduler):
-            advisory_types_description = [t.value for t in scheduler.get_advisory_types()]
-            logger.error(f"System {system.name} failed to be scheduled for "
-                         f"{advisory_types_description} patching at {date}")
-        elif isinstance(scheduler, utils.SystemPackageRefreshScheduler):
-            logger.error(f"System {system.name} failed to be scheduled for a package refresh at {date}")
-        elif isinstance(scheduler, upgrade.SystemUpgradeScheduler):
-            logger.error(f"System {system.name} failed to be scheduled for upgrade at {date}")
-        elif isinstance(scheduler, utils.SystemRebootScheduler):
-            logger.error(f"System {system.name} failed to be scheduled for reboot at {date}")
+        logger.error(f"System {system.name} failed to be scheduled for {description} at {date}")
+
+
+def perform_scheduling(scheduler, system, date, system_plan=None):
+    start = time.monotonic()
+    with log_mgr.collect_errors() as errors, \
+            tracing.span(f"{scheduler.operation} {system.name}", "system", system=system.name, date=date):
+        if system_plan is None:
+            action_ids = scheduler.schedule()
+        else:
+            action_ids = scheduler.apply(system_plan)
+    log_scheduling_result(system, scheduler.get_description(), date, action_ids)
+    record_event(scheduler.operation, system, date, action_ids, time.monotonic() - start, errors,
+                 scheduler.get_details())
     return action_ids
 
 
+def perform_bulk_scheduling(bulk_scheduler, date):
+    start = time.monotonic()
+    with tracing.span(bulk_scheduler.description, "system", date=date):
+        results = bulk_scheduler.schedule()
+    latency = time.monotonic() - start
+    errors = bulk_scheduler.get_errors()
+    for system, action_ids in results.items():
+        log_scheduling_result(system, bulk_scheduler.description, date, action_ids)
+        record_event(bulk_scheduler.operation, system, date, action_ids, latency, errors.get(system), bulk=True)
+    return results
+
+
 # Exit codes:
 # 0  success. every system has been scheduled for patching
 # 2  total failure. improper command line options passed
@@ -48,82 +84,403 @@ def perform_scheduling(scheduler, system, date):
 # 65 total failure. all systems scheduling has failed
 # 66 total failure. all systems scheduling has failed due to improper input
 
-def perform_suma_scheduling(factory, args):
-    logger = logging.getLogger(__name__)
-
+def get_client(args):
+    # the daemon keeps one logged in client for all the commands it runs
+    global _shared_client_checked
+    if _shared_client is not None:
+        if time.monotonic() - _shared_client_checked > SESSION_CHECK_INTERVAL:
+            _shared_client.login()
+            _shared_client_checked = time.monotonic()
+        return _shared_client
     client = suma_xmlrpc_client.SumaClient(args.config)
     client.login()
-    systems = client_systems.SystemListParser(client, args.filename).parse()
+    return client
+
+
+def get_scheduler_factory(operation, system_inventory=None, fingerprint_store=None):
+    if operation == "patch":
+        return patching.PatchingSchedulerFactory(system_inventory, fingerprint_store)
+    return SCHEDULER_FACTORIES[operation]()
+
+
+def open_fingerprint_store(args, operation):
+    # errata fingerprints are only kept for patching
+    if operation != "patch":
+        return None
+    return fingerprint.FingerprintStore(args.config)
+
+
+@contextmanager
+def open_inventory(args):
+    # the local inventory is only used when asked for and synced recently enough, otherwise None is given. It is
+    # closed at the end of the command, as the daemon runs many of them
+    logger = logging.getLogger(__name__)
+    if args.inventory_max_age is None:
+        yield None
+        return
+    system_inventory = inventory.Inventory(args.config)
+    try:
+        if not system_inventory.is_fresh(args.inventory_max_age):
+            logger.warning(f"Inventory {system_inventory.get_filename()} is older than {args.inventory_max_age} "
+                           f"seconds. Run 'sumacli inventory --sync' to update it. Using the server instead.")
+            yield None
+        else:
+            yield system_inventory
+    finally:
+        system_inventory.close()
+
+
+def parse_systems(client, args, system_inventory=None):
+    logger = logging.getLogger(__name__)
+    with tracing.span("parse input", filename=args.filename):
+        systems = client_systems.SystemListParser(client, args.filename, system_inventory).parse()
     if systems == {}:
         logger.error("No systems found in file: " + args.filename)
         logger.error("The format of the file is: systemName,year-month-day hour:minute:second")
         logger.error("Example: sumacli-client,2021-11-06 10:00:00")
         sys.exit(66)
+    return systems
 
-    exit_code = 0
-    failed_systems = 0
-    success_systems = 0
-    action_id_file_manager = validator.ActionIDFileManager(args.save_action_ids_file)
+
+def get_date_buckets(systems, args):
+    # returns the input date, start date and systems of every date that is not in the past.
+    # The effective schedule date of each system is set, spread in waves if requested
+    logger = logging.getLogger(__name__)
+    buckets = []
     for date in systems.keys():
-        schedule_date = datetime.now() if date == "now" else datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
+        schedule_date = datetime.now() if date == "now" else datetime.strptime(date, DATE_FORMAT)
         delta = timedelta(seconds=5)
         if schedule_date + delta < datetime.now():
             system_names = [s.name for s in systems[date]]
             logger.warning(f"Date {date} is in the past! System(s) skipped: {system_names}")
             continue
-        for system in systems[date]:
-            try:
-                scheduler = factory.get_scheduler(client, system, schedule_date, args)
-            except ValueError as e:
-                logger.error(f"System {system.name} failed to be scheduled at {date}: {e}")
-                failed_systems += 1
-                continue
-            action_ids = perform_scheduling(scheduler, system, date)
-            if action_ids is not None:
-                action_id_file_manager.append(action_ids)
-                success_systems += 1
-            else:
-                failed_systems += 1
-    if action_id_file_manager.save():
-        logger.info(f"Action IDs file saved: {action_id_file_manager.get_filename()}")
+        bucket_systems = systems[date]
+        for system in bucket_systems:
+            system.schedule_date = schedule_date
+        if args.wave_size is not None:
+            bucket_systems = waves.WaveScheduler(timedelta(minutes=args.wave_window), args.wave_size,
+                                                 args.wave_order).spread(bucket_systems, schedule_date)
+        buckets.append((date, schedule_date, bucket_systems))
+    return buckets
+
 
+def get_exit_code(failed_systems, success_systems):
+    exit_code = 0
     if failed_systems > 0 and success_systems > 0:
         exit_code = 64
     elif failed_systems > 0 and success_systems == 0:
         exit_code = 65
     elif failed_systems == 0 and success_systems > 0:
         exit_code = 0
-    sys.exit(exit_code)
+    return exit_code
+
+
+def perform_suma_scheduling(factory, args, system_inventory=None):
+    logger = logging.getLogger(__name__)
+
+    client = get_client(args)
+    systems = parse_systems(client, args, system_inventory)
+    suffix = ""
+    if args.shard is not None:
+        shard_index, shard_count = args.shard
+        systems = shard.select_shard(systems, shard_index, shard_count)
+        system_count = sum(len(date_systems) for date_systems in systems.values())
+        logger.info(f"Shard {shard_index}/{shard_count}: {system_count} system(s) selected")
+        suffix = f".shard-{shard_index}-of-{shard_count}"
+
+    failed_systems = 0
+    success_systems = 0
+    action_ids_filename = args.save_action_ids_file
+    if action_ids_filename is not None:
+        # shards of a run on the same host must not write to the same file
+        action_ids_filename += suffix
+    action_id_file_manager = validator.ActionIDFileManager(action_ids_filename, suffix)
+    pipelined_systems = []
+    for _, _, bucket_systems in get_date_buckets(systems, args):
+        for wave_date, wave_systems in waves.group_by_schedule_date(bucket_systems):
+            effective_date = wave_date.strftime(DATE_FORMAT)
+            bulk_scheduler = factory.get_bulk_scheduler(client, wave_systems, wave_date, args)
+            if bulk_scheduler is None:
+                pipelined_systems += wave_systems
+                continue
+            for action_ids in perform_bulk_scheduling(bulk_scheduler, effective_date).values():
+                if action_ids is SKIPPED:
+                    continue
+                if action_ids:
+                    action_id_file_manager.append(action_ids)
+                    success_systems += 1
+                else:
+                    failed_systems += 1
+    if pipelined_systems:
+        success, failed = perform_pipelined_scheduling(client, factory, args, pipelined_systems,
+                                                       action_id_file_manager)
+        success_systems += success
+        failed_systems += failed
+    if action_id_file_manager.save():
+        logger.info(f"Action IDs file saved: {action_id_file_manager.get_filename()}")
+    sys.exit(get_exit_code(failed_systems, success_systems))
+
+
+def get_system_stage(name, work, workers):
+    # a pipeline stage that keeps the errors and a trace span of each system it works on
+    def run(system_run):
+        system = system_run["system"]
+        with log_mgr.collect_errors() as errors, \
+                tracing.span(f"{name} {system.name}", "system", system=system.name, date=system_run["date"]):
+            passed = work(system_run)
+        system_run["errors"] += errors
+        return passed
+    return pipeline.PipelineStage(name, run, workers)
+
+
+def resolve_system(client, factory, args, system_run):
+    system = system_run["system"]
+    system_run["start"] = time.monotonic()
+    # the stages of a system run on different threads, so an async span ties them together in the trace
+    tracing.begin_async(f"{args.cmd} {system.name}", system_run["number"], "system", system=system.name,
+                        date=system_run["date"])
+    try:
+        system.get_id(client)
+        system_run["scheduler"] = factory.get_scheduler(client, system, system.schedule_date, args)
+    except ValueError as e:
+        logging.getLogger(__name__).error(f"System {system.name} failed to be scheduled at {system_run['date']}: {e}")
+        return False
+    return True
+
+
+def inspect_system(system_run):
+    system_run["plan"] = system_run["scheduler"].plan()
+    if system_run["plan"] is SKIPPED:
+        system_run["action_ids"] = SKIPPED
+        return False
+    return system_run["plan"] is not None
+
+
+def schedule_system(system_run):
+    system_run["action_ids"] = system_run["scheduler"].apply(system_run["plan"])
+    return system_run["action_ids"] is not None
+
+
+def finish_system_run(args, system_run):
+    # logs and records the result of a system. Returns its action IDs, SKIPPED, or None if it failed
+    system, date = system_run["system"], system_run["date"]
+    scheduler, action_ids = system_run["scheduler"], system_run["action_ids"]
+    latency = 0
+    if system_run["start"] is not None:
+        latency = time.monotonic() - system_run["start"]
+        tracing.end_async(f"{args.cmd} {system.name}", system_run["number"], "system")
+    if scheduler is None:
+        record_event(args.cmd, system, date, None, latency, system_run["errors"])
+    else:
+        log_scheduling_result(system, scheduler.get_description(), date, action_ids)
+        record_event(scheduler.operation, system, date, action_ids, latency, system_run["errors"],
+                     scheduler.get_details())
+    # the scheduler and plan of a finished system are not needed anymore
+    system_run["scheduler"] = system_run["plan"] = None
+    return action_ids
+
+
+def perform_pipelined_scheduling(client, factory, args, systems, action_id_file_manager):
+    # systems go through resolve, inspect and schedule stages with their own workers, so the read calls that inspect
+    # the next systems overlap with the write calls that schedule the previous ones
+    resolve_workers, inspect_workers, schedule_workers = args.stage_workers
+    counts = {"success": 0, "failed": 0, "skipped": 0}
+
+    def finish(system_run):
+        action_ids = finish_system_run(args, system_run)
+        if action_ids is SKIPPED:
+            # neither a success nor a failure, so it does not change the exit code
+            counts["skipped"] += 1
+        elif action_ids is not None:
+            action_id_file_manager.append(action_ids)
+            counts["success"] += 1
+        else:
+            counts["failed"] += 1
+
+    system_pipeline = pipeline.Pipeline([
+        get_system_stage("resolve", lambda system_run: resolve_system(client, factory, args, system_run),
+                         resolve_workers),
+        get_system_stage("inspect", inspect_system, inspect_workers),
+        get_system_stage("schedule", schedule_system, schedule_workers)], args.queue_size)
+    system_runs = ({"system": system, "number": number, "date": system.schedule_date.strftime(DATE_FORMAT),
+                    "scheduler": None, "plan": None, "action_ids": None, "errors": [], "start": None}
+                   for number, system in enumerate(systems))
+    system_pipeline.run(system_runs, finish)
+    system_pipeline.log_stats()
+    return counts["success"], counts["failed"]
+
+
+def perform_planning(args):
+    logger = logging.getLogger(__name__)
+    with open_inventory(args) as system_inventory:
+        factory = get_scheduler_factory(args.operation, system_inventory, open_fingerprint_store(args, args.operation))
+
+        client = get_client(args)
+        systems = parse_systems(client, args, system_inventory)
+
+        scheduled_systems = []
+        for date, start_date, bucket_systems in get_date_buckets(systems, args):
+            scheduled_systems += [(system, date, start_date) for system in bucket_systems]
+        planner = plan.Planner(client, factory, args, args.workers)
+        results = planner.plan([system for system, _, _ in scheduled_systems])
+
+    failed_systems = 0
+    success_systems = 0
+    plan_file_manager = plan.PlanFileManager(args.output)
+    for (system, system_plan), (_, date, start_date) in zip(results, scheduled_systems):
+        effective_date = system.schedule_date.strftime(DATE_FORMAT)
+        if system_plan is None:
+            logger.error(f"System {system.name} failed to be planned for {args.operation} at {effective_date}")
+            failed_systems += 1
+            continue
+        if system_plan is SKIPPED:
+            logger.warning(f"System {system.name} skipped for {args.operation} at {effective_date}")
+            continue
+        if date == "now":
+            # keeps "now" relative to the time the plan is applied
+            system_plan["date"] = "now"
+            system_plan["delay"] = (system.schedule_date - start_date).total_seconds()
+        else:
+            system_plan["date"] = effective_date
+        plan_file_manager.append(system_plan)
+        logger.info(f"System {system.name} planned for {args.operation} at {effective_date}")
+        success_systems += 1
+    if plan_file_manager.save(args.operation, vars(args)):
+        logger.info(f"Plan file saved: {plan_file_manager.get_filename()}")
+    sys.exit(get_exit_code(failed_systems, success_systems))
+
+
+def perform_plan_apply(args):
+    logger = logging.getLogger(__name__)
+    plan_file_manager = plan.PlanFileManager(args.plan_filename)
+    entries = plan_file_manager.read()
+    operation = plan_file_manager.get_operation()
+    factory = get_scheduler_factory(operation, fingerprint_store=open_fingerprint_store(args, operation))
+    options = argparse.Namespace(**plan_file_manager.get_options())
+
+    client = get_client(args)
+
+    failed_systems = 0
+    success_systems = 0
+    action_id_file_manager = validator.ActionIDFileManager(args.save_action_ids_file)
+    now = datetime.now()
+    for entry in entries:
+        system = client_systems.System(entry['name'], entry['target'], entry['kopts'], entry['group'])
+        if entry['date'] == "now":
+            system.schedule_date = now + timedelta(seconds=entry['delay'])
+        else:
+            system.schedule_date = datetime.strptime(entry['date'], DATE_FORMAT)
+            if system.schedule_date + timedelta(seconds=5) < datetime.now():
+                logger.warning(f"Date {entry['date']} is in the past! System skipped: {system.name}")
+                continue
+        scheduler = factory.get_apply_scheduler(client, system, system.schedule_date, options, entry)
+        action_ids = perform_scheduling(scheduler, system, system.schedule_date.strftime(DATE_FORMAT), entry)
+        if action_ids is not None:
+            action_id_file_manager.append(action_ids)
+            success_systems += 1
+        else:
+            failed_systems += 1
+    if action_id_file_manager.save():
+        logger.info(f"Action IDs file saved: {action_id_file_manager.get_filename()}")
+    sys.exit(get_exit_code(failed_systems, success_systems))
 
 
 def perform_patching(args):
-    factory = patching.PatchingSchedulerFactory()
-    perform_suma_scheduling(factory, args)
+    with open_inventory(args) as system_inventory:
+        factory = patching.PatchingSchedulerFactory(system_inventory, open_fingerprint_store(args, "patch"))
+        perform_suma_scheduling(factory, args, system_inventory)
 
 
 def perform_product_migration(args):
     factory = migration.ProductMigrationSchedulerFactory()
-    perform_suma_scheduling(factory, args)
+    with open_inventory(args) as system_inventory:
+        perform_suma_scheduling(factory, args, system_inventory)
 
 
 def perform_system_upgrade(args):
     factory = upgrade.SystemUpgradeSchedulerFactory()
-    perform_suma_scheduling(factory, args)
+    with open_inventory(args) as system_inventory:
+        perform_suma_scheduling(factory, args, system_inventory)
 
 
 def perform_validation(args):
-    action_id_file_manager = validator.ActionIDFileManager(args.action_ids_filename)
+    logger = logging.getLogger(__name__)
+    action_ids_filename = args.action_ids_filename[0]
+    if len(args.action_ids_filename) > 1 or args.merged_file is not None:
+        merged_file_manager = validator.ActionIDFileManager(args.merged_file, ".merged")
+        merged_file_manager.merge(args.action_ids_filename)
+        if not merged_file_manager.save():
+            logger.error(f"Action IDs not found in files: {args.action_ids_filename}")
+            sys.exit(1)
+        action_ids_filename = merged_file_manager.get_filename()
+        logger.info(f"Merged action IDs file saved: {action_ids_filename}")
+    action_id_file_manager = validator.ActionIDFileManager(action_ids_filename)
 
-    client = suma_xmlrpc_client.SumaClient()
-    client.login()
+    client = get_client(args)
 
     action_id_validator = validator.ActionIDValidator(client, action_id_file_manager)
     action_id_validator.validate()
+    if not args.latency:
+        return
+
+    with open_inventory(args) as system_inventory:
+        collector = validator.ActionLatencyCollector(client, args.workers, system_inventory)
+        samples = collector.collect(action_id_file_manager.get_action_ids(), action_id_validator.get_systems())
+    if not samples:
+        logger.error("No action times found to report latencies.")
+        return
+    latency_report = validator.LatencyReport(samples)
+    latency_report.log()
+    logger.info(f"Latency report saved: {latency_report.save(args.latency_output)}")
 
 
 def perform_utils_tasks(args):
     factory = utils.UtilsSchedulerFactory()
-    perform_suma_scheduling(factory, args)
+    with open_inventory(args) as system_inventory:
+        perform_suma_scheduling(factory, args, system_inventory)
+
+
+def perform_inventory_tasks(args):
+    logger = logging.getLogger(__name__)
+    system_inventory = inventory.Inventory(args.config)
+    try:
+        if args.sync:
+            client = get_client(args)
+            system_inventory.sync(client, args.workers, args.full)
+        last_sync = system_inventory.get_last_sync()
+        system_count = system_inventory.count_systems()
+    finally:
+        system_inventory.close()
+    if last_sync is None:
+        logger.warning(f"Inventory {system_inventory.get_filename()} has never been synced")
+    else:
+        logger.info(f"Inventory {system_inventory.get_filename()} has {system_count} system(s), last synced at "
+                    f"{datetime.fromtimestamp(last_sync).strftime(DATE_FORMAT)}")
+
+
+def perform_report(args):
+    logger = logging.getLogger(__name__)
+    with open_inventory(args) as system_inventory:
+        client = get_client(args)
+        if args.filename is not None:
+            systems = [system for date_systems in parse_systems(client, args, system_inventory).values()
+                       for system in date_systems]
+        else:
+            fleet = system_inventory.get_systems() if system_inventory is not None else client.system.listSystems()
+            systems = [client_systems.System(s['name'], system_id=s['id']) for s in fleet]
+
+        start = time.monotonic()
+        matrix, advisory_details = report.ErrataCollector(client, args.workers, system_inventory).collect(systems)
+    logger.info(f"Errata of {len(matrix.get_systems())} system(s) and details of {len(advisory_details)} "
+                f"advisories collected in {time.monotonic() - start:.1f} seconds")
+    fleet_report = report.FleetReport(matrix, advisory_details, args.critical_severity.split(","))
+    summary = fleet_report.get_summary()
+    logger.info(f"{summary['systems_with_pending_advisories']} of {summary['systems']} system(s) have pending "
+                f"advisories, {summary['systems_missing_critical_security']} miss critical security fixes, "
+                f"{summary['systems_requiring_reboot']} require a reboot, {summary['clusters']} cluster(s) of "
+                f"identical systems")
+    logger.info(f"Report file saved: {fleet_report.save(args.output, args.format, args.table)}")
+
 
 def perform_user_tasks(args):
     client = suma_xmlrpc_client.SumaClient(args.config)
@@ -134,56 +491,193 @@ def perform_user_tasks(args):
         client.logout()
 
 
-def main():
-    logging_file = "/etc/sumacli/logging.conf"
-    if not os.path.isfile(logging_file):
-        logging_file = importlib.resources.files("sumacli").joinpath("conf/logging.conf")
-    logging.config.fileConfig(logging_file)
+def perform_serve(args):
+    global _shared_client, _shared_client_checked
     logger = logging.getLogger(__name__)
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-c", "--config", help="Config filename.", required=False)
-    subparsers = parser.add_subparsers(required=True, dest="cmd")
-
-    patching_parser = subparsers.add_parser("patch", help="Patches systems.")
-    patching_parser.add_argument("filename",
-                                 help="Filename of systems and their schedules for patching.")
-    patching_parser.add_argument("-p", "--policy", help="Products patching policy filename.")
-    patching_parser.add_argument(
+    client = suma_xmlrpc_client.SumaClient(args.config)
+    client.login()
+    client.enable_cache(args.cache_ttl)
+    _shared_client = client
+    _shared_client_checked = time.monotonic()
+    try:
+        daemon.SumaDaemon(daemon.get_socket_path(args.config), run_command).serve_forever()
+    except RuntimeError as e:
+        logger.error(e)
+        sys.exit(1)
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def shard_type(value):
+    try:
+        return shard.parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def add_shard_arguments(parser):
+    parser.add_argument("--shard", type=shard_type,
+                        help="Only schedule the systems of shard i out of N (i/N), so that several hosts or "
+                             "processes can split the same input file.")
+
+
+def stage_workers_type(value):
+    try:
+        workers = tuple(positive_int(w) for w in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a list of positive integers")
+    if len(workers) != 3:
+        raise argparse.ArgumentTypeError(f"{value} does not have the workers of the resolve, inspect and schedule "
+                                         f"stages")
+    return workers
+
+
+def add_pipeline_arguments(parser):
+    parser.add_argument("--stage-workers", type=stage_workers_type, default=(2, 4, 2),
+                        help="Number of workers of the resolve, inspect and schedule stages, separated by commas "
+                             "(default: 2,4,2).")
+    parser.add_argument("--queue-size", type=positive_int, default=64,
+                        help="Maximum number of systems waiting between two stages (default: 64).")
+
+
+def add_wave_arguments(parser):
+    parser.add_argument("--wave-size", type=positive_int,
+                        help="Maximum number of systems per wave. Systems sharing a date are spread in waves.")
+    parser.add_argument("--wave-window", type=positive_int, default=60,
+                        help="Minutes between the first and the last wave (default: 60).")
+    parser.add_argument("--wave-order", choices=waves.WaveScheduler.ORDERS, default="input",
+                        help="Order of systems across waves: input order, grouped by group, or the first "
+                             "system of each group first (canary).")
+
+
+def add_patching_arguments(parser):
+    parser.add_argument("filename", help="Filename of systems and their schedules for patching.")
+    parser.add_argument("-p", "--policy", help="Products patching policy filename.")
+    parser.add_argument(
         "-a", "--all-patches", help="Apply all available patches to each system.", action="store_true")
-    patching_parser.add_argument("-b", "--bugfix", help="Apply bug fix patches to each system.",
-                                 action="store_true")
-    patching_parser.add_argument("-e", "--enhancement", help="Apply product enhancement patches to each system.",
-                                 action="store_true")
-    patching_parser.add_argument("-s", "--security", help="Apply security patches to each system.",
-                                 action="store_true")
-    patching_parser.add_argument("-f", "--save-action-ids-file", help="File name to save action IDs of scheduled jobs.")
-    group = patching_parser.add_mutually_exclusive_group()
+    parser.add_argument("-b", "--bugfix", help="Apply bug fix patches to each system.", action="store_true")
+    parser.add_argument("-e", "--enhancement", help="Apply product enhancement patches to each system.",
+                        action="store_true")
+    parser.add_argument("-s", "--security", help="Apply security patches to each system.", action="store_true")
+    group = parser.add_mutually_exclusive_group()
     group.add_argument(
         "-r", "--reboot", help="Add a system reboot to each action chain for each system.", action="store_true")
     group.add_argument(
         "-n", "--no-reboot",
         help="Do not add a system reboot to the action chain of every system even if suggested by a patch.",
         action="store_true")
+    parser.add_argument("--unchanged", choices=patching.UNCHANGED_POLICIES, default="skip",
+                        help="What to do with systems whose errata are the same as when they were last scheduled and "
+                             "whose actions are still pending or have failed: skip them, only reschedule the failed "
+                             "ones or always reschedule them (default: skip).")
+
+
+def add_migration_arguments(parser):
+    parser.add_argument("filename", help="Filename of systems and their schedules for migration.")
+    parser.add_argument("-d", "--dry-run", help="Dry run mode. Do not perform the migration.", action="store_true")
+    parser.add_argument("-l", "--list-migration-targets", help="List migration targets for each system.",
+                        action="store_true")
+
+
+def add_upgrade_arguments(parser):
+    parser.add_argument("filename", help="Filename of systems and their schedules for upgrade.")
+
+
+def check_patching_arguments(parser, args):
+    logger = logging.getLogger(__name__)
+    if args.policy is None and args.all_patches is False and args.bugfix is False and \
+            args.enhancement is False and args.security is False:
+        parser.print_usage()
+        logger.error("The 'patch' subcommand needs at least one patching option")
+        sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--config", help="Config filename.", required=False)
+    parser.add_argument("--inventory-max-age", type=positive_int,
+                        help="Read systems, groups and base products from the local inventory when it was synced "
+                             "less than this number of seconds ago.")
+    parser.add_argument("--no-daemon", help="Runs the command in this process even if a daemon is running.",
+                        action="store_true")
+    parser.add_argument("--events-file", help="Appends one JSON event per system outcome to this file.")
+    parser.add_argument("--trace", help="Saves a Chrome trace event file with a span for each system and each API "
+                                        "call to this file. It can be opened with Perfetto or chrome://tracing.")
+    parser.add_argument("--profile", help="Profiles the CPU time and memory of the command and saves a summary of "
+                                          "the hot functions and top allocators and a pstats file.",
+                        action="store_true")
+    parser.add_argument("--profile-output", help="File name prefix of the profile files (default: "
+                                                 "profiles/profile.<timestamp>).")
+    subparsers = parser.add_subparsers(required=True, dest="cmd")
+
+    patching_parser = subparsers.add_parser("patch", help="Patches systems.")
+    add_patching_arguments(patching_parser)
+    patching_parser.add_argument("-f", "--save-action-ids-file", help="File name to save action IDs of scheduled jobs.")
+    patching_parser.add_argument("--bulk", help="Group systems with identical errata sets and schedule each group "
+                                                "with a single call.", action="store_true")
+    add_wave_arguments(patching_parser)
+    add_shard_arguments(patching_parser)
+    add_pipeline_arguments(patching_parser)
     patching_parser.set_defaults(func=perform_patching)
 
     migration_parser = subparsers.add_parser("migrate", help="Migrates systems to a new Service Pack.")
-    migration_parser.add_argument("filename", help="Filename of systems and their schedules for migration.")
+    add_migration_arguments(migration_parser)
     migration_parser.add_argument("-f", "--save-action-ids-file",
                                   help="File name to save action IDs of scheduled jobs.")
-    migration_parser.add_argument("-d", "--dry-run", help="Dry run mode. Do not perform the migration.",
-                                  action="store_true")
-    migration_parser.add_argument("-l", "--list-migration-targets", help="List migration targets for each system.",
-                                  action="store_true")
+    add_wave_arguments(migration_parser)
+    add_shard_arguments(migration_parser)
+    add_pipeline_arguments(migration_parser)
     migration_parser.set_defaults(func=perform_product_migration)
 
     upgrade_parser = subparsers.add_parser("upgrade", help="Upgrades systems to a new product version.")
-    upgrade_parser.add_argument("filename", help="Filename of systems and their schedules for upgrade.")
+    add_upgrade_arguments(upgrade_parser)
     upgrade_parser.add_argument("-f", "--save-action-ids-file", help="File name to save action IDs of scheduled jobs.")
+    upgrade_parser.add_argument("--bulk", help="Prepare systems concurrently and schedule the systems that share a "
+                                               "date with a single call.", action="store_true")
+    upgrade_parser.add_argument("-w", "--workers", type=positive_int, default=8,
+                                help="Number of systems prepared concurrently in bulk mode (default: 8).")
+    add_wave_arguments(upgrade_parser)
+    add_shard_arguments(upgrade_parser)
+    add_pipeline_arguments(upgrade_parser)
     upgrade_parser.set_defaults(func=perform_system_upgrade)
 
+    plan_parser = subparsers.add_parser("plan", help="Discovers everything an operation needs and saves it to a plan "
+                                                     "file without scheduling anything.")
+    plan_subparsers = plan_parser.add_subparsers(required=True, dest="operation")
+    plan_patching_parser = plan_subparsers.add_parser("patch", help="Plans the patching of systems.")
+    add_patching_arguments(plan_patching_parser)
+    plan_migration_parser = plan_subparsers.add_parser("migrate", help="Plans the migration of systems.")
+    add_migration_arguments(plan_migration_parser)
+    plan_upgrade_parser = plan_subparsers.add_parser("upgrade", help="Plans the upgrade of systems.")
+    add_upgrade_arguments(plan_upgrade_parser)
+    for operation_parser in [plan_patching_parser, plan_migration_parser, plan_upgrade_parser]:
+        operation_parser.add_argument("-o", "--output", help="File name to save the plan to.")
+        operation_parser.add_argument("-w", "--workers", type=positive_int, default=8,
+                                      help="Number of systems inspected concurrently (default: 8).")
+        add_wave_arguments(operation_parser)
+        operation_parser.set_defaults(func=perform_planning)
+
+    apply_parser = subparsers.add_parser("apply", help="Schedules the systems of a plan file.")
+    apply_parser.add_argument("plan_filename", help="Plan file created by the 'plan' command.")
+    apply_parser.add_argument("-f", "--save-action-ids-file", help="File name to save action IDs of scheduled jobs.")
+    apply_parser.set_defaults(func=perform_plan_apply)
+
     validator_parser = subparsers.add_parser("validate", help="Validates results from actions file.")
-    validator_parser.add_argument("action_ids_filename", help="Validate results of actions specified in file.")
+    validator_parser.add_argument("action_ids_filename", nargs="+",
+                                  help="Validate results of actions specified in file. Several files, such as the "
+                                       "ones of each shard of a run, are merged first.")
+    validator_parser.add_argument("-m", "--merged-file", help="File name to save the merged action IDs to.")
+    validator_parser.add_argument("--latency", help="Reports the queue delay and execution time of the actions by "
+                                                    "operation, base product and group.", action="store_true")
+    validator_parser.add_argument("--latency-output", help="File name to save the latency report to (default: "
+                                                           "reports/latency.<timestamp>.json).")
+    validator_parser.add_argument("-w", "--workers", type=positive_int, default=8,
+                                  help="Number of systems whose action times are fetched concurrently (default: 8).")
     validator_parser.set_defaults(func=perform_validation)
 
     utils_parser = subparsers.add_parser("utils", help="Some utility commands to run on systems.")
@@ -193,21 +687,113 @@ def main():
                               action="store_true")
     utils_group.add_argument("-b", "--reboot", help="Schedules a reboot for a system.", action="store_true")
     utils_parser.add_argument("-f", "--save-action-ids-file", help="File name to save action IDs of scheduled jobs.")
+    add_wave_arguments(utils_parser)
+    add_shard_arguments(utils_parser)
+    add_pipeline_arguments(utils_parser)
     utils_parser.set_defaults(func=perform_utils_tasks)
 
+    inventory_parser = subparsers.add_parser("inventory", help="Local inventory of the systems of the server.")
+    inventory_parser.add_argument("-s", "--sync", help="Fetches the systems that changed since the last sync.",
+                                  action="store_true")
+    inventory_parser.add_argument("--full", help="Fetches all systems again when syncing.", action="store_true")
+    inventory_parser.add_argument("-w", "--workers", type=positive_int, default=8,
+                                  help="Number of systems fetched concurrently (default: 8).")
+    inventory_parser.set_defaults(func=perform_inventory_tasks)
+
+    report_parser = subparsers.add_parser("report", help="Reports the pending advisories of the systems.")
+    report_parser.add_argument("filename", nargs="?",
+                               help="Filename of systems to report on, in the input format. All the systems of the "
+                                    "server by default.")
+    report_parser.add_argument("-o", "--output", help="File name to save the report to.")
+    report_parser.add_argument("--format", choices=["json", "csv"], default="json",
+                               help="Format of the report (default: json).")
+    report_parser.add_argument("--table", choices=report.REPORT_TABLES, default="advisories",
+                               help="Table saved in CSV format: systems per advisory, advisories per product and "
+                                    "type, systems missing critical security fixes or clusters of identical systems "
+                                    "(default: advisories).")
+    report_parser.add_argument("--critical-severity", default="critical",
+                               help="Severities of the security advisories reported as critical, separated by commas "
+                                    "(default: critical).")
+    report_parser.add_argument("-w", "--workers", type=positive_int, default=8,
+                               help="Number of systems collected concurrently (default: 8).")
+    report_parser.set_defaults(func=perform_report)
+
     user_parser = subparsers.add_parser("user", help="User management commands.")
     user_parser.add_argument("-i", "--login", help="Logs in to the server.", action="store_true")
     user_parser.add_argument("-o", "--logout", help="Logs out the user from the server.", action="store_true")
     user_parser.set_defaults(func=perform_user_tasks)
 
-    args = parser.parse_args()
+    serve_parser = subparsers.add_parser("serve", help="Runs a daemon that keeps the session and the answers of the "
+                                                       "server warm for the next commands.")
+    serve_parser.add_argument("--cache-ttl", type=positive_int, default=300,
+                              help="Seconds the answers of the server are cached for (default: 300).")
+    serve_parser.set_defaults(func=perform_serve)
+
+    return parser, patching_parser, plan_patching_parser
+
+
+def parse_arguments(argv=None):
+    parser, patching_parser, plan_patching_parser = build_parser()
+    args = parser.parse_args(argv)
     if args.cmd == 'patch':
-        if args.policy is None and args.all_patches is False and args.bugfix is False and \
-                args.enhancement is False and args.security is False:
-            patching_parser.print_usage()
-            logger.error("The 'patch' subcommand needs at least one patching option")
-            sys.exit(1)
-    args.func(args)
+        check_patching_arguments(patching_parser, args)
+    elif args.cmd == 'plan' and args.operation == 'patch':
+        check_patching_arguments(plan_patching_parser, args)
+    return args
+
+
+def execute(args):
+    # the events and trace files of a command are closed when it ends, as the daemon runs many commands
+    if args.events_file is not None:
+        events.open_event_stream(args.events_file)
+    if args.trace is not None:
+        tracing.start_tracing(args.trace)
+    try:
+        if args.profile:
+            execute_profiled(args)
+        else:
+            args.func(args)
+    finally:
+        events.close_event_stream()
+        tracing.stop_tracing()
+
+
+def execute_profiled(args):
+    command_profiler = profiler.Profiler()
+    try:
+        command_profiler.start()
+    except ValueError as e:
+        logging.getLogger(__name__).error(f"The command cannot be profiled: {e}")
+        sys.exit(2)
+    try:
+        args.func(args)
+    finally:
+        command_profiler.stop()
+        command_profiler.save(args.profile_output)
+
+
+def run_command(argv):
+    # runs a command in the daemon and returns its exit code
+    try:
+        execute(parse_arguments(argv))
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return 0
+
+
+def main():
+    logging_file = "/etc/sumacli/logging.conf"
+    if not os.path.isfile(logging_file):
+        logging_file = importlib.resources.files("sumacli").joinpath("conf/logging.conf")
+    logging.config.fileConfig(logging_file)
+    log_mgr.start_queue_logging()
+
+    args = parse_arguments()
+    if args.cmd not in LOCAL_COMMANDS and not args.no_daemon:
+        exit_code = daemon.forward(daemon.get_socket_path(args.config), sys.argv[1:])
+        if exit_code is not None:
+            sys.exit(exit_code)
+    execute(args)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,94 @@
 import getpass
 import logging
 import sys
-from xmlrpc.client import ServerProxy, Fault
+import threading
+import time
+from contextlib import contextmanager
+from xmlrpc.client import ServerProxy, Fault, ProtocolError
 from .config_mgr import ConfigManager
 import ssl
 
 from .session_mgr import SessionManager
+from . import tracing
+from .transport import get_transport
+
+
+class ResponseCache:
+    # read-only calls whose answers rarely change, kept by a long running client such as the daemon. System IDs and
+    # group memberships are left out, as a system that was just registered or added to a group must be targeted
+    CACHEABLE_METHODS = {"system.getInstalledProducts", "errata.listKeywords", "kickstart.profile.getKickstartTree",
+                         "kickstart.tree.getDetails", "org.listOrgs", "org.listUsers"}
+
+    def __init__(self, ttl):
+        self.__ttl = ttl
+        self.__entries = {}
+        self.__lock = threading.Lock()
+
+    def get(self, name, args):
+        # returns whether the response was found and the response
+        if name not in self.CACHEABLE_METHODS:
+            return False, None
+        with self.__lock:
+            entry = self.__entries.get((name, args))
+        if entry is None or time.monotonic() - entry[0] > self.__ttl:
+            return False, None
+        return True, entry[1]
+
+    def put(self, name, args, response):
+        if name not in self.CACHEABLE_METHODS:
+            return
+        with self.__lock:
+            self.__entries[(name, args)] = (time.monotonic(), response)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+class ProxyPool:
+    # ServerProxy is not thread safe, so a proxy is used by one thread at a time. Idle proxies, with their open
+    # connection to the server, are shared by all threads and by the commands a daemon runs one after another. The
+    # last returned proxy is handed out first, as its connection is the most likely to be still open
+
+    def __init__(self, proxy_factory):
+        self.__proxy_factory = proxy_factory
+        self.__idle = []
+        self.__lock = threading.Lock()
+        self.__created = 0
+
+    @contextmanager
+    def acquire(self):
+        with self.__lock:
+            proxy = self.__idle.pop() if self.__idle else None
+            if proxy is None:
+                self.__created += 1
+        if proxy is None:
+            proxy = self.__proxy_factory()
+        broken = False
+        try:
+            yield proxy
+        except (OSError, ProtocolError):
+            broken = True
+            raise
+        finally:
+            if broken:
+                # the connection may be broken, it is not used again
+                proxy("close")()
+            else:
+                with self.__lock:
+                    self.__idle.append(proxy)
+
+    def close(self):
+        with self.__lock:
+            idle, self.__idle = self.__idle, []
+        for proxy in idle:
+            proxy("close")()
+
+    def get_created(self):
+        return self.__created
 
 
 class _MultiCallMethod:
@@ -17,11 +100,25 @@ class _MultiCallMethod:
         return _MultiCallMethod(self.__client, "%s.%s" % (self.__name, name))
 
     def __call__(self, *args):
-        m = getattr(self.__client.get_instance(), self.__name)
-        if args == ():
-            return m(self.__client.get_session_key())
-        else:
-            return m(self.__client.get_session_key(), *args)
+        cache = self.__client.get_cache()
+        if cache is not None:
+            try:
+                found, response = cache.get(self.__name, args)
+            except TypeError:
+                # unhashable arguments, such as lists, are never cached
+                cache = None
+            else:
+                if found:
+                    return response
+        with self.__client.get_proxy_pool().acquire() as proxy, tracing.span(self.__name, "rpc"):
+            m = getattr(proxy, self.__name)
+            if args == ():
+                response = m(self.__client.get_session_key())
+            else:
+                response = m(self.__client.get_session_key(), *args)
+        if cache is not None:
+            cache.put(self.__name, args, response)
+        return response
 
 
 class SumaClient:
@@ -31,25 +128,42 @@ class SumaClient:
         self.__session_manager = SessionManager()
         self.__logger = logging.getLogger(__name__)
 
-        context = ssl.create_default_context()
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        self.__client = ServerProxy(self.__config_manager.manager_api_url, context=context)
+        self.__context = ssl.create_default_context()
+        self.__context.check_hostname = False
+        self.__context.verify_mode = ssl.CERT_NONE
+        self.__proxy_pool = ProxyPool(self.__create_proxy)
+        self.__cache = None
 
     def __getattr__(self, name):
         return _MultiCallMethod(self, name)
 
     def login(self):
-        if self.__session_manager.session_key is not None:
-            # try to run a query to the server to see if the session is still valid
-            try:
-                self.__client.user.listAssignableRoles(self.__session_manager.session_key)
-                api_url = self.__config_manager.manager_api_url
-                self.__logger.info(f'User {self.__config_manager.manager_login} already logged in to {api_url}')
+        session_key = self.__session_manager.session_key
+        if session_key is not None and self.__is_session_valid(session_key):
+            api_url = self.__config_manager.manager_api_url
+            self.__logger.info(f'User {self.__config_manager.manager_login} already logged in to {api_url}')
+            return
+
+        # parallel sumacli processes log in one at a time, the ones that waited use the session of the first one
+        with self.__session_manager.lock():
+            self.__session_manager.reload()
+            shared_session_key = self.__session_manager.session_key
+            if shared_session_key not in [None, session_key] and self.__is_session_valid(shared_session_key):
+                self.__logger.info(f'User {self.__config_manager.manager_login} logged in by another process')
                 return
-            except Fault as e:
-                self.__logger.warning(f'Session key is not valid anymore: {e.faultString}')
+            self.__login()
+
+    def __is_session_valid(self, session_key):
+        # try to run a query to the server to see if the session is still valid
+        try:
+            with self.__proxy_pool.acquire() as proxy:
+                proxy.user.listAssignableRoles(session_key)
+            return True
+        except Fault as e:
+            self.__logger.warning(f'Session key is not valid anymore: {e.faultString}')
+            return False
 
+    def __login(self):
         if self.__config_manager.manager_login is None:
             self.__config_manager.manager_login = input('Enter your username: ')
 
@@ -59,8 +173,9 @@ class SumaClient:
                 f'Enter your password for username {self.__config_manager.manager_login}: ')
 
         try:
-            self.__session_manager.session_key = self.__client.auth.login(
-                self.__config_manager.manager_login, manager_password)
+            with self.__proxy_pool.acquire() as proxy:
+                self.__session_manager.session_key = proxy.auth.login(self.__config_manager.manager_login,
+                                                                      manager_password)
         except Fault as e:
             self.__logger.error(f'Could not login: {e.faultString} as user {self.__config_manager.manager_login}')
             sys.exit(1)
@@ -68,8 +183,9 @@ class SumaClient:
 
     def logout(self):
         if self.__session_manager.session_key is not None:
-            self.__client.auth.logout(self.__session_manager.session_key)
-            self.__client("close")()
+            with self.__proxy_pool.acquire() as proxy:
+                proxy.auth.logout(self.__session_manager.session_key)
+            self.__proxy_pool.close()
         del self.__session_manager.session_key
         if self.__config_manager.manager_login is not None:
             self.__logger.info(f'User {self.__config_manager.manager_login} logged out')
@@ -80,5 +196,17 @@ class SumaClient:
     def get_session_key(self):
         return self.__session_manager.session_key
 
-    def get_instance(self):
-        return self.__client
+    def enable_cache(self, ttl):
+        self.__cache = ResponseCache(ttl)
+        return self.__cache
+
+    def get_cache(self):
+        return self.__cache
+
+    def get_proxy_pool(self):
+        return self.__proxy_pool
+
+    def __create_proxy(self):
+        api_url = self.__config_manager.manager_api_url
+        return ServerProxy(api_url, transport=get_transport(api_url, self.__context,
+                                                            self.__config_manager.compress_requests))
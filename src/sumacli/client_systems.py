@@ -1,7 +1,61 @@
 import csv
 import logging
+import sys
+from array import array
+from collections import namedtuple
+from collections.abc import Sequence
 from xmlrpc.client import Fault
 from .advisory_type import AdvisoryType
+from . import selector
+
+# only the fields of an erratum that are needed for scheduling
+Erratum = namedtuple('Erratum', ['id', 'advisory_name', 'advisory_type'])
+
+# advisory types stored as one byte per erratum, 0 is an unknown type
+ADVISORY_TYPE_CODES = {t.value: code for code, t in enumerate(AdvisoryType, 1) if t != AdvisoryType.ALL}
+ADVISORY_TYPE_VALUES = {code: value for value, code in ADVISORY_TYPE_CODES.items()}
+
+
+def intern(value):
+    # strings repeated across systems, such as group names and targets, are kept once
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class SystemErrata(Sequence):
+    # errata of a system as an array of IDs and an array of advisory type codes. Advisory names are interned, so
+    # systems with the same pending advisories share them. Errata are built as Erratum tuples when read
+
+    __slots__ = ('__ids', '__names', '__types')
+
+    def __init__(self, errata=()):
+        ids = []
+        names = []
+        self.__types = array('B')
+        for erratum in errata:
+            ids.append(erratum.id)
+            names.append(intern(erratum.advisory_name))
+            self.__types.append(ADVISORY_TYPE_CODES.get(erratum.advisory_type, 0))
+        try:
+            self.__ids = array('q', ids)
+        except TypeError:
+            self.__ids = tuple(ids)
+        self.__names = tuple(names)
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Erratum(self.__ids[index], self.__names[index], ADVISORY_TYPE_VALUES.get(self.__types[index]))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, SystemErrata)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def get_ids(self):
+        return list(self.__ids)
 
 
 class SystemErrataInspector:
@@ -10,33 +64,45 @@ class SystemErrataInspector:
         self.__client = client
         self.__system = system
         self.__advisoryTypes = advisory_types
-        self.__errata = []
+        self.__errata = None
 
     def has_suggested_reboot(self):
         for patch in self.obtain_system_errata():
-            keywords = self.__client.errata.listKeywords(patch['advisory_name'])
+            keywords = self.__client.errata.listKeywords(patch.advisory_name)
             if 'reboot_suggested' in keywords:
                 return True
         return False
 
     def obtain_system_errata(self):
-        if self.__errata:
+        if self.__errata is not None:
             return self.__errata
 
-        if AdvisoryType.ALL in self.__advisoryTypes:
-            self.__errata = self.__client.system.getRelevantErrata(self.__system.get_id(self.__client))
-        else:
-            for advisoryType in self.__advisoryTypes:
-                self.__errata += self.__client.system.getRelevantErrataByType(self.__system.get_id(self.__client),
-                                                                              advisoryType.value)
+        self.__errata = SystemErrata()
+        if not self.__advisoryTypes:
+            return self.__errata
+
+        # a single call per system, whatever the number of advisory types, filtered here
+        advisory_types = {t.value for t in self.__advisoryTypes}
+        errata = {}
+        for patch in self.__client.system.getRelevantErrata(self.__system.get_id(self.__client)):
+            if AdvisoryType.ALL in self.__advisoryTypes or patch.get('advisory_type') in advisory_types:
+                errata.setdefault(patch.get('id'), Erratum(patch.get('id'), patch.get('advisory_name'),
+                                                           patch.get('advisory_type')))
+        self.__errata = SystemErrata(errata.values())
         return self.__errata
 
 
 class System:
-    def __init__(self, name, target=None, kopts=None):
-        self.__name = name
-        self.__target = target
-        self.__kopts = kopts
+    # a huge input file holds one instance per system for the whole run, so instances have no __dict__
+    __slots__ = ('__name', '__target', '__kopts', '__group', '__schedule_date', '__system_id')
+
+    def __init__(self, name, target=None, kopts=None, group=None, system_id=None):
+        self.__name = intern(name)
+        self.__target = intern(target)
+        self.__kopts = intern(kopts)
+        self.__group = intern(group)
+        self.__schedule_date = None
+        self.__system_id = system_id
 
     @property
     def name(self):
@@ -50,19 +116,37 @@ class System:
     def kopts(self):
         return self.__kopts
 
+    @property
+    def group(self):
+        return self.__group
+
+    @property
+    def schedule_date(self):
+        return self.__schedule_date
+
+    @schedule_date.setter
+    def schedule_date(self, schedule_date):
+        self.__schedule_date = schedule_date
+
     def get_id(self, client):
-        system_id = client.system.getId(self.__name)
-        if len(system_id) == 0:
-            raise ValueError("No such system: " + self.__name)
-        return system_id[0]['id']
+        # the ID is known beforehand when the system comes from a group listing or the inventory
+        if self.__system_id is None:
+            system_id = client.system.getId(self.__name)
+            if len(system_id) == 0:
+                raise ValueError("No such system: " + self.__name)
+            self.__system_id = system_id[0]['id']
+        return self.__system_id
 
 
 class SystemListParser:
 
-    def __init__(self, client, systems_filename):
+    def __init__(self, client, systems_filename, inventory=None):
         self.__client = client
         self.__filename = systems_filename
+        self.__inventory = inventory
         self.__systems = {}
+        # members of each group, fetched once even if the group is used by several lines
+        self.__groups = {}
         self.__logger = logging.getLogger(__name__)
 
     def parse(self):
@@ -77,13 +161,64 @@ class SystemListParser:
         return self.__systems
 
     def _get_systems_from_group(self, group):
+        if group not in self.__groups:
+            self.__groups[group] = self.__fetch_group_systems(group)
+        return self.__groups[group]
+
+    def __fetch_group_systems(self, group):
+        # only the ID and name of each member are kept
+        systems = None
+        if self.__inventory is not None:
+            systems = self.__inventory.get_group_systems(group)
+        if systems is None:
+            try:
+                systems = self.__client.systemgroup.listSystems(group)
+            except Fault as err:
+                self.__logger.error(err.faultString)
+                self.__logger.warning(f'Group "{group}" does not exist!')
+                return []
+        return [(system.get('id'), intern(system.get('profile_name'))) for system in systems]
+
+    def _get_systems_from_selector(self, expression):
+        # returns the ID, name and group of the systems selected by an expression of groups and system names, in the
+        # order they were listed. Only groups are fetched, system names are looked up in them first
+        names = {}
+        groups = {}
+
+        def resolve(term):
+            if term.startswith('group:'):
+                group = term[len('group:'):]
+                system_ids = set()
+                for system_id, name in self._get_systems_from_group(group):
+                    names.setdefault(system_id, name)
+                    groups.setdefault(system_id, group)
+                    system_ids.add(system_id)
+                return system_ids
+            system_id = self.__find_system_id(term, names)
+            if system_id is None:
+                self.__logger.warning(f'System "{term}" does not exist!')
+                return set()
+            names.setdefault(system_id, term)
+            return {system_id}
+
+        selected = selector.evaluate(expression, resolve)
+        return [(system_id, name, groups.get(system_id)) for system_id, name in names.items()
+                if system_id in selected]
+
+    def __find_system_id(self, name, names):
+        for system_id, system_name in names.items():
+            if system_name == name:
+                return system_id
+        if self.__inventory is not None:
+            system_id = self.__inventory.get_system_id(name)
+            if system_id is not None:
+                return system_id
         try:
-            systems = self.__client.systemgroup.listSystems(group)
+            system_ids = self.__client.system.getId(name)
         except Fault as err:
             self.__logger.error(err.faultString)
-            self.__logger.warning(f'Group "{group}" does not exist!')
-            return []
-        return systems
+            return None
+        return system_ids[0]['id'] if system_ids else None
 
     def _add_system(self, data):
         if not data:
@@ -99,12 +234,22 @@ class SystemListParser:
         kopts = None
         if len(data) == 4:
             kopts = data[3]
+        if selector.is_expression(s):
+            try:
+                systems = self._get_systems_from_selector(s)
+            except ValueError as err:
+                self.__logger.error(f'Invalid selector "{s}": {err}')
+                return False
+            self.__systems.setdefault(d, []).extend(System(name, target, kopts, group, system_id)
+                                                    for system_id, name, group in systems)
+            return True
         if d not in self.__systems.keys():
             self.__systems[d] = []
         if ":" in s:
             group = s.split(':')[1]
             systems = self._get_systems_from_group(group)
-            [self.__systems[d].append(System(s.get('profile_name'), target, kopts)) for s in systems]
+            [self.__systems[d].append(System(name, target, kopts, group, system_id)) for system_id, name in systems]
         else:
-            self.__systems[d].append(System(s, target, kopts))
+            system_id = self.__inventory.get_system_id(s) if self.__inventory is not None else None
+            self.__systems[d].append(System(s, target, kopts, system_id=system_id))
         return True
@@ -45,6 +45,8 @@ class ConfigManager:
 
         self.__MANAGER_API_URL = config['server']['api_url']
         self.__MANAGER_FQDN = config['server']['fqdn']
+        # gzip encoded request bodies have to be enabled in the web server of SUSE Manager first
+        self.__COMPRESS_REQUESTS = config['server'].getboolean('compress_requests', fallback=False)
         self.__MANAGER_LOGIN = None
         self.__MANAGER_PASSWORD = None
         if 'credentials' in config:
@@ -64,6 +66,10 @@ class ConfigManager:
     def manager_fqdn(self):
         return self.__MANAGER_FQDN
 
+    @property
+    def compress_requests(self):
+        return self.__COMPRESS_REQUESTS
+
     @property
     def manager_login(self):
         return self.__MANAGER_LOGIN
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+from .config_mgr import ConfigManager
+
+SOCKET_NAME = "sumacli.sock"
+
+
+def get_socket_path(config_file=None):
+    config_manager = ConfigManager(config_file)
+    return f'{config_manager.get_config_dir()}/{config_manager.manager_fqdn}/{SOCKET_NAME}'
+
+
+class _ReplyHandler(logging.Handler):
+    # sends the log records of a command back to the CLI that asked for it, formatted like the console logs
+
+    def __init__(self, connection_file):
+        super().__init__(logging.INFO)
+        self.__connection_file = connection_file
+        self.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    def emit(self, record):
+        try:
+            _send(self.__connection_file, log=self.format(record))
+        except OSError:
+            # the CLI went away, the command still runs to completion
+            pass
+
+
+def _send(connection_file, **message):
+    connection_file.write((json.dumps(message) + "\n").encode())
+    connection_file.flush()
+
+
+class SumaDaemon:
+    # serves commands of the CLI over a Unix socket. Each request is one JSON line with the arguments and the
+    # working directory of the CLI. The daemon answers with one JSON line per log record and a last one with the
+    # exit code. Commands run one at a time, as they change the working directory of the process
+
+    def __init__(self, socket_path, runner):
+        self.__socket_path = socket_path
+        self.__runner = runner
+        self.__lock = threading.Lock()
+        self.__server = None
+        self.__logger = logging.getLogger(__name__)
+
+    def serve_forever(self):
+        if os.path.exists(self.__socket_path):
+            if is_daemon_running(self.__socket_path):
+                raise RuntimeError(f"A daemon is already listening on {self.__socket_path}")
+            os.unlink(self.__socket_path)
+
+        daemon = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                daemon.handle(self.rfile, self.wfile)
+
+        self.__server = socketserver.UnixStreamServer(self.__socket_path, RequestHandler)
+        os.chmod(self.__socket_path, int('0600', 8))
+        self.__logger.info(f"Listening on {self.__socket_path}")
+        try:
+            self.__server.serve_forever()
+        except KeyboardInterrupt:
+            self.__logger.info("Daemon stopped")
+        finally:
+            self.__server.server_close()
+            os.unlink(self.__socket_path)
+
+    def shutdown(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+
+    def handle(self, rfile, wfile):
+        line = rfile.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        if "argv" not in request:
+            # ping
+            _send(wfile, exit=0)
+            return
+
+        reply_handler = _ReplyHandler(wfile)
+        root_logger = logging.getLogger()
+        with self.__lock:
+            cwd = os.getcwd()
+            root_logger.addHandler(reply_handler)
+            try:
+                os.chdir(request["cwd"])
+                exit_code = self.__runner(request["argv"])
+            except Exception as e:
+                self.__logger.exception(f"Command {request['argv']} failed: {e}")
+                exit_code = 1
+            finally:
+                root_logger.removeHandler(reply_handler)
+                os.chdir(cwd)
+        try:
+            _send(wfile, exit=exit_code)
+        except OSError:
+            pass
+
+
+def is_daemon_running(socket_path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            with sock.makefile("rwb") as connection_file:
+                _send(connection_file)
+                return connection_file.readline() != b""
+    except OSError:
+        return False
+
+
+def forward(socket_path, argv):
+    # runs the command in the daemon and prints its logs. Returns the exit code of the command or None when no
+    # daemon is listening
+    if not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    with sock, sock.makefile("rwb") as connection_file:
+        _send(connection_file, argv=argv, cwd=os.getcwd())
+        for line in connection_file:
+            message = json.loads(line)
+            if "log" in message:
+                print(message["log"], flush=True)
+            elif "exit" in message:
+                return message["exit"]
+    logging.getLogger(__name__).error(f"Connection to the daemon at {socket_path} was lost")
+    return 1
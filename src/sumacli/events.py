@@ -0,0 +1,47 @@
+import json
+import logging
+import queue
+from datetime import datetime
+from logging.handlers import QueueListener
+
+_event_stream = None
+
+
+class EventStream:
+    # writes one JSON object per line. Events are written by a listener thread, like the logs
+
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__queue = queue.SimpleQueue()
+        self.__handler = logging.FileHandler(filename)
+        self.__handler.setFormatter(logging.Formatter('%(message)s'))
+        self.__listener = QueueListener(self.__queue, self.__handler)
+        self.__listener.start()
+
+    def emit(self, **event):
+        event = {"timestamp": datetime.now().isoformat(), **event}
+        self.__queue.put_nowait(logging.makeLogRecord({'msg': json.dumps(event, default=str)}))
+
+    def get_filename(self):
+        return self.__filename
+
+    def close(self):
+        self.__listener.stop()
+        self.__handler.close()
+
+
+def open_event_stream(filename):
+    global _event_stream
+    _event_stream = EventStream(filename)
+    return _event_stream
+
+
+def close_event_stream():
+    global _event_stream
+    if _event_stream is not None:
+        _event_stream.close()
+        _event_stream = None
+
+
+def get_event_stream():
+    return _event_stream
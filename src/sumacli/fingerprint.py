@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .config_mgr import ConfigManager
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS fingerprints (system_id INTEGER PRIMARY KEY, fingerprint TEXT NOT NULL,
+                                         action_ids TEXT NOT NULL, recorded REAL NOT NULL);
+'''
+
+
+def get_errata_fingerprint(advisory_types, errata_ids):
+    data = json.dumps([sorted(t.value for t in advisory_types), sorted(errata_ids)])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class FingerprintStore:
+    # errata fingerprint and action IDs of the last successful scheduling of each system
+
+    def __init__(self, config_file=None, database_filename=None):
+        if database_filename is None:
+            config_manager = ConfigManager(config_file)
+            manager_dir = f'{config_manager.get_config_dir()}/{config_manager.manager_fqdn}'
+            if not os.path.isdir(manager_dir):
+                os.makedirs(manager_dir, int('0700', 8))
+            database_filename = f'{manager_dir}/fingerprints.db'
+        self.__filename = database_filename
+        self.__lock = threading.Lock()
+        # systems are planned concurrently
+        self.__connection = sqlite3.connect(self.__filename, check_same_thread=False)
+        with self.__lock, self.__connection:
+            self.__connection.executescript(SCHEMA)
+
+    def get_filename(self):
+        return self.__filename
+
+    def get(self, system_id):
+        # returns the fingerprint and action IDs, or None if the system has never been scheduled
+        with self.__lock:
+            row = self.__connection.execute('SELECT fingerprint, action_ids FROM fingerprints WHERE system_id = ?',
+                                            (system_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def record(self, system_id, fingerprint, action_ids):
+        with self.__lock, self.__connection:
+            self.__connection.execute('INSERT OR REPLACE INTO fingerprints (system_id, fingerprint, action_ids, '
+                                      'recorded) VALUES (?, ?, ?, ?)',
+                                      (system_id, fingerprint, json.dumps(action_ids), time.time()))
+
+    def close(self):
+        self.__connection.close()
@@ -0,0 +1,156 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.client import Fault
+
+from .config_mgr import ConfigManager
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS systems (id INTEGER PRIMARY KEY, name TEXT NOT NULL, last_checkin TEXT,
+                                    base_product TEXT);
+CREATE INDEX IF NOT EXISTS systems_name ON systems (name);
+CREATE INDEX IF NOT EXISTS systems_base_product ON systems (base_product);
+CREATE TABLE IF NOT EXISTS server_groups (name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS system_groups (system_id INTEGER NOT NULL, group_name TEXT NOT NULL,
+                                          PRIMARY KEY (system_id, group_name));
+CREATE INDEX IF NOT EXISTS system_groups_group_name ON system_groups (group_name);
+CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT);
+'''
+
+# systems fetched and written to the database at a time when syncing
+SYNC_BATCH_SIZE = 500
+
+
+class Inventory:
+
+    def __init__(self, config_file=None, database_filename=None):
+        self.__logger = logging.getLogger(__name__)
+        if database_filename is None:
+            config_manager = ConfigManager(config_file)
+            manager_dir = f'{config_manager.get_config_dir()}/{config_manager.manager_fqdn}'
+            if not os.path.isdir(manager_dir):
+                os.makedirs(manager_dir, int('0700', 8))
+            database_filename = f'{manager_dir}/inventory.db'
+        self.__filename = database_filename
+        self.__lock = threading.Lock()
+        # systems are looked up from the threads that inspect them concurrently
+        self.__connection = sqlite3.connect(self.__filename, check_same_thread=False)
+        with self.__lock, self.__connection:
+            self.__connection.executescript(SCHEMA)
+
+    def get_filename(self):
+        return self.__filename
+
+    def sync(self, client, workers=8, full=False):
+        # only systems that checked in since the last sync are fetched again. Group members change without a check-in,
+        # so they are fetched again on every sync with a single call per group. Relevant errata change without a
+        # check-in too, when new errata are synced to the server, so they are not kept
+        remote_systems = client.system.listSystems()
+        with self.__lock:
+            known = dict(self.__connection.execute('SELECT id, last_checkin FROM systems').fetchall())
+        changed = [s for s in remote_systems if full or known.get(s['id']) != str(s.get('last_checkin'))]
+        removed = set(known.keys()) - {s['id'] for s in remote_systems}
+        groups = [g['name'] for g in client.systemgroup.listAllGroups()]
+
+        synced = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            memberships = list(executor.map(lambda g: self.__fetch_group(client, g), groups))
+            for start in range(0, len(changed), SYNC_BATCH_SIZE):
+                batch = changed[start:start + SYNC_BATCH_SIZE]
+                base_products = list(executor.map(lambda s: self.__fetch_base_product(client, s), batch))
+                with self.__lock, self.__connection:
+                    for system, base_product in zip(batch, base_products):
+                        if base_product is False:
+                            continue
+                        self.__connection.execute('INSERT OR REPLACE INTO systems (id, name, last_checkin, '
+                                                  'base_product) VALUES (?, ?, ?, ?)',
+                                                  (system['id'], system['name'], str(system.get('last_checkin')),
+                                                   base_product))
+                        synced += 1
+
+        with self.__lock, self.__connection:
+            for system_id in removed:
+                self.__connection.execute('DELETE FROM systems WHERE id = ?', (system_id,))
+            self.__connection.execute('DELETE FROM server_groups')
+            self.__connection.executemany('INSERT INTO server_groups (name) VALUES (?)', [(g,) for g in groups])
+            self.__connection.execute('DELETE FROM system_groups')
+            for group, members in zip(groups, memberships):
+                self.__connection.executemany('INSERT OR IGNORE INTO system_groups (system_id, group_name) '
+                                              'VALUES (?, ?)', [(system_id, group) for system_id in members])
+            self.__connection.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)',
+                                      ('last_sync', str(time.time())))
+        self.__logger.info(f"Inventory synced: {synced} system(s) updated, {len(removed)} removed, "
+                           f"{len(remote_systems) - len(changed)} unchanged, {len(groups)} group(s)")
+        return synced, len(removed)
+
+    def __fetch_group(self, client, group):
+        try:
+            return [system['id'] for system in client.systemgroup.listSystemsMinimal(group)]
+        except Fault as err:
+            self.__logger.error(f"Failed to sync group {group}: {err.faultString}")
+            return []
+
+    def __fetch_base_product(self, client, system):
+        # False when the system could not be fetched, None when it has no base product
+        try:
+            for product in client.system.getInstalledProducts(system['id']):
+                if product['isBaseProduct']:
+                    return product['friendlyName']
+        except Fault as err:
+            self.__logger.error(f"Failed to sync system {system['name']}: {err.faultString}")
+            return False
+        return None
+
+    def get_last_sync(self):
+        with self.__lock:
+            row = self.__connection.execute("SELECT value FROM metadata WHERE key = 'last_sync'").fetchone()
+        return float(row[0]) if row is not None else None
+
+    def is_fresh(self, max_age):
+        last_sync = self.get_last_sync()
+        return last_sync is not None and time.time() - last_sync <= max_age
+
+    def count_systems(self):
+        with self.__lock:
+            return self.__connection.execute('SELECT COUNT(*) FROM systems').fetchone()[0]
+
+    def get_systems(self):
+        # same format as system.listSystems
+        with self.__lock:
+            rows = self.__connection.execute('SELECT id, name FROM systems ORDER BY name').fetchall()
+        return [{'id': system_id, 'name': name} for system_id, name in rows]
+
+    def get_system_id(self, name):
+        with self.__lock:
+            row = self.__connection.execute('SELECT id FROM systems WHERE name = ?', (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def get_group_systems(self, group):
+        # same format as systemgroup.listSystems. None if the group is not known by the inventory
+        with self.__lock:
+            if self.__connection.execute('SELECT 1 FROM server_groups WHERE name = ?', (group,)).fetchone() is None:
+                return None
+            rows = self.__connection.execute('SELECT s.id, s.name FROM systems s JOIN system_groups g '
+                                             'ON s.id = g.system_id WHERE g.group_name = ? ORDER BY s.name',
+                                             (group,)).fetchall()
+        return [{'id': system_id, 'profile_name': name} for system_id, name in rows]
+
+    def get_system_groups(self, system_id):
+        # None if the system is not known by the inventory
+        with self.__lock:
+            if self.__connection.execute('SELECT 1 FROM systems WHERE id = ?', (system_id,)).fetchone() is None:
+                return None
+            rows = self.__connection.execute('SELECT group_name FROM system_groups WHERE system_id = ? '
+                                             'ORDER BY group_name', (system_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_base_product(self, system_id):
+        with self.__lock:
+            row = self.__connection.execute('SELECT base_product FROM systems WHERE id = ?', (system_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def close(self):
+        self.__connection.close()
@@ -0,0 +1,55 @@
+import atexit
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+
+class ErrorCollector(logging.Handler):
+    # keeps the error messages logged by the current thread while collecting. Collections nest, an error is kept by
+    # every collection of its thread that is open
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.__local = threading.local()
+
+    def emit(self, record):
+        collections = getattr(self.__local, 'collections', None)
+        if collections:
+            message = record.getMessage()
+            for errors in collections:
+                errors.append(message)
+
+    @contextmanager
+    def collect(self):
+        if getattr(self.__local, 'collections', None) is None:
+            self.__local.collections = []
+        errors = []
+        self.__local.collections.append(errors)
+        try:
+            yield errors
+        finally:
+            self.__local.collections.pop()
+
+
+_error_collector = ErrorCollector()
+
+
+def start_queue_logging():
+    # the handlers configured by logging.conf run in a listener thread, out of the scheduling path
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    root.addHandler(_error_collector)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def collect_errors():
+    return _error_collector.collect()
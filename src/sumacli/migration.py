@@ -5,6 +5,9 @@ from .scheduler import SchedulerFactory, Scheduler
 
 
 class SystemProductMigrationScheduler(Scheduler):
+    operation = "migrate"
+    description = "product migration"
+
     def __init__(self, client, system, date, args):
         self.__client = client
         self.__system = system
@@ -13,11 +16,11 @@ class SystemProductMigrationScheduler(Scheduler):
         self.__dry_run = args.dry_run
         self.__list_migration_targets = args.list_migration_targets
 
-    def schedule(self):
-        action_ids = []
+    def plan(self):
         try:
+            system_id = self.__system.get_id(self.__client)
             if self.__list_migration_targets or self.__system.kopts is not None:
-                migration_targets = self.__client.system.listMigrationTargets(self.__system.get_id(self.__client))
+                migration_targets = self.__client.system.listMigrationTargets(system_id)
                 if self.__list_migration_targets:
                     if not migration_targets:
                         self.__logger.info(f"No migration targets found for system {self.__system.name}")
@@ -27,33 +30,40 @@ class SystemProductMigrationScheduler(Scheduler):
                         self.__logger.info(f"  {target}")
                     return None
 
-                if self.__system.kopts is not None:
-                    migration_target_found = False
-                    for target in migration_targets:
-                        if target['ident'] == self.__system.kopts:
-                            action_ids.append(self.__client.system.scheduleProductMigration(
-                                self.__system.get_id(self.__client), self.__system.kopts, self.__system.target, [],
-                                self.__dry_run, self.__date))
-                            migration_target_found = True
-                            break
-                    if not migration_target_found:
-                        self.__logger.warning(
-                            f"Migration target {self.__system.kopts} not found for system {self.__system.name}")
+                if self.__system.kopts not in [target['ident'] for target in migration_targets]:
+                    self.__logger.warning(
+                        f"Migration target {self.__system.kopts} not found for system {self.__system.name}")
+                    return None
+        except Fault as err:
+            self.__logger.error(f"Failed to list migration targets for system {self.__system.name}")
+            self.__logger.error("Fault code: %d" % err.faultCode)
+            self.__logger.error("Fault string: %s" % err.faultString)
+            return None
+        except ValueError as err:
+            self.__logger.error(err)
+            return None
+        return {"system_id": system_id,
+                "target": self.__system.target,
+                "ident": self.__system.kopts,
+                "dry_run": self.__dry_run}
+
+    def apply(self, plan):
+        action_ids = []
+        try:
+            if plan['ident'] is not None:
+                action_ids.append(self.__client.system.scheduleProductMigration(
+                    plan['system_id'], plan['ident'], plan['target'], [], plan['dry_run'], self.__date))
             else:
-                action_ids.append(self.__client.system.scheduleProductMigration(self.__system.get_id(self.__client),
-                                                                                self.__system.target, [],
-                                                                                self.__dry_run, self.__date))
+                action_ids.append(self.__client.system.scheduleProductMigration(
+                    plan['system_id'], plan['target'], [], plan['dry_run'], self.__date))
             self.__logger.debug(f"Successfully scheduled product migration with action ID {action_ids}")
-            if self.__dry_run:
+            if plan['dry_run']:
                 self.__logger.info(f"Dry run mode: no action taken for system {self.__system.name}")
         except Fault as err:
             self.__logger.error(f"Failed to schedule product migration for system {self.__system.name}")
             self.__logger.error("Fault code: %d" % err.faultCode)
             self.__logger.error("Fault string: %s" % err.faultString)
             return None
-        except ValueError as err:
-            self.__logger.error(err)
-            return None
         return action_ids
 
 
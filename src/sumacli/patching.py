@@ -1,18 +1,29 @@
 #!/usr/bin/python3
 import csv
+import hashlib
 from xmlrpc.client import Fault
 from datetime import datetime
 import logging.config
 import logging
+import threading
 
-from .scheduler import SchedulerFactory, Scheduler
+from .scheduler import SchedulerFactory, Scheduler, BulkScheduler, SKIPPED
 from .client_systems import SystemErrataInspector
 from .advisory_type import AdvisoryType
+from .fingerprint import get_errata_fingerprint
+from . import log_mgr
+
+# what to do with a system whose errata are unchanged since its last scheduling and whose action is still
+# pending or has failed
+UNCHANGED_POLICIES = ["skip", "retry-failed", "reschedule"]
 
 
 class SystemPatchingScheduler(Scheduler):
+    operation = "patch"
+    description = "patching"
 
-    def __init__(self, client, system, date, advisory_types, reboot_required, no_reboot, label_prefix):
+    def __init__(self, client, system, date, advisory_types, reboot_required, no_reboot, label_prefix,
+                 fingerprint_store=None, unchanged_policy="reschedule"):
         self.__client = client
         self.__system = system
         self.__date = date
@@ -20,16 +31,16 @@ class SystemPatchingScheduler(Scheduler):
         self.__rebootRequired = reboot_required
         self.__noReboot = no_reboot
         self.__labelPrefix = label_prefix
-        self.__systemErrataInspector = SystemErrataInspector(client, system, advisory_types)
+        self.__fingerprintStore = fingerprint_store
+        self.__unchangedPolicy = unchanged_policy
         self.__logger = logging.getLogger(__name__)
 
-    def schedule(self):
-        if self.__system_has_in_progress_action(self.__system.name, self.__date):
-            self.__logger.error(f"System {self.__system.name} already has an action in progress!")
-            return None
-
+    def plan(self):
+        # the errata are only needed until the plan is built, they are not kept by the scheduler
+        system_errata_inspector = SystemErrataInspector(self.__client, self.__system, self.__advisoryTypes)
         try:
-            errata = self.__systemErrataInspector.obtain_system_errata()
+            errata = system_errata_inspector.obtain_system_errata()
+            system_id = self.__system.get_id(self.__client)
         except ValueError as err:
             self.__logger.error(err)
             return None
@@ -40,22 +51,47 @@ class SystemPatchingScheduler(Scheduler):
                                   f"{self.__system.name} . Skipping...")
             return None
 
+        errata_ids = errata.get_ids()
+        fingerprint = get_errata_fingerprint(self.__advisoryTypes, errata_ids)
+        # checked before the actions in progress, as the pending action of an unchanged system is its own
+        if is_unchanged_and_outstanding(self.__client, self.__fingerprintStore, self.__unchangedPolicy,
+                                        self.__system, system_id, fingerprint):
+            return SKIPPED
+        if self.__system_has_in_progress_action(self.__system.name, self.__date):
+            self.__logger.error(f"System {self.__system.name} already has an action in progress!")
+            return None
+
+        reboot = self.__rebootRequired or system_errata_inspector.has_suggested_reboot() and not self.__noReboot
+        return {"system_id": system_id,
+                "advisory_types": [t.value for t in self.__advisoryTypes],
+                "errata_ids": errata_ids,
+                "reboot": reboot,
+                "fingerprint": fingerprint}
+
+    def apply(self, plan):
         label = self.__labelPrefix + "-" + self.__system.name + str(self.__date)
         try:
-            action_ids = self.__create_action_chain(label, errata, self.__rebootRequired, self.__noReboot)
+            action_ids = self.__create_action_chain(label, plan)
+            if self.__client.actionchain.scheduleChain(label, self.__date) == 1:
+                if self.__fingerprintStore is not None and 'fingerprint' in plan:
+                    self.__fingerprintStore.record(plan['system_id'], plan['fingerprint'], action_ids)
+                return action_ids
         except Fault as err:
             self.__logger.error("Failed to create action chain for system: " + self.__system.name)
             self.__logger.error("Fault code: %d" % err.faultCode)
             self.__logger.error("Fault string: %s" % err.faultString)
-            return None
-
-        if self.__client.actionchain.scheduleChain(label, self.__date) == 1:
-            return action_ids
         return None
 
     def get_advisory_types(self):
         return self.__advisoryTypes
 
+    def get_description(self):
+        advisory_types_description = [t.value for t in self.__advisoryTypes]
+        return f"{advisory_types_description} patching"
+
+    def get_details(self):
+        return {"advisory_types": [t.value for t in self.__advisoryTypes]}
+
     def __system_has_in_progress_action(self, system, schedule_date):
         in_progress_actions = self.__client.schedule.listInProgressActions()
         for action in in_progress_actions:
@@ -66,37 +102,193 @@ class SystemPatchingScheduler(Scheduler):
                         return True
         return False
 
-    def __create_action_chain(self, label, errata, required_reboot, no_reboot):
+    def __create_action_chain(self, label, plan):
         action_ids = []
         if self.__client.actionchain.createChain(label) > 0:
-            errata_action_id = self.__add_errata_to_action_chain(errata, label)
+            errata_action_id = self.__client.actionchain.addErrataUpdate(plan['system_id'], plan['errata_ids'], label)
             if errata_action_id > 0:
                 action_ids.append(errata_action_id)
                 self.__logger.debug("Successfully added errata to action chain with label: " + label)
-            if required_reboot or self.__systemErrataInspector.has_suggested_reboot() and not no_reboot:
-                reboot_action_id = self.__add_system_reboot_to_action_chain(label)
+            if plan['reboot']:
+                reboot_action_id = self.__client.actionchain.addSystemReboot(plan['system_id'], label)
                 if reboot_action_id > 0:
                     action_ids.append(reboot_action_id)
                     self.__logger.debug("Successfully added system reboot to action chain with label: " + label)
         return action_ids
 
-    def __add_errata_to_action_chain(self, errata, label):
-        errata_ids = []
+
+class SystemPatchingBulkScheduler(BulkScheduler):
+    operation = "patch"
+    description = "bulk patching"
+
+    def __init__(self, client, systems, date, advisory_types_getter, reboot_required, no_reboot, label_prefix,
+                 fingerprint_store=None, unchanged_policy="reschedule"):
+        self.__client = client
+        self.__systems = systems
+        self.__date = date
+        self.__advisoryTypesGetter = advisory_types_getter
+        self.__rebootRequired = reboot_required
+        self.__noReboot = no_reboot
+        self.__labelPrefix = label_prefix
+        self.__fingerprintStore = fingerprint_store
+        self.__unchangedPolicy = unchanged_policy
+        self.__rebootSuggested = {}
+        self.__errors = {}
+        self.__logger = logging.getLogger(__name__)
+
+    def schedule(self):
+        results = {system: None for system in self.__systems}
+        fingerprints = {}
+        groups = self.__group_systems(results, fingerprints)
+        for (errata_ids, reboot), members in groups.items():
+            action_ids = self.__schedule_group(sorted(errata_ids), reboot, members)
+            results.update(action_ids)
+            if self.__fingerprintStore is not None:
+                for system, system_id in members:
+                    if action_ids.get(system):
+                        self.__fingerprintStore.record(system_id, fingerprints[system], action_ids[system])
+        return results
+
+    def __group_systems(self, results, fingerprints):
+        # systems with the same errata set and reboot requirement share a single scheduling call
+        systems_in_progress = get_systems_with_in_progress_actions(self.__client, self.__date)
+        groups = {}
+        for system in self.__systems:
+            with log_mgr.collect_errors() as errors:
+                inspection = self.__inspect(system, systems_in_progress)
+            self.__errors[system] = errors
+            if inspection is SKIPPED:
+                results[system] = SKIPPED
+            elif inspection is not None:
+                key, system_id, fingerprints[system] = inspection
+                groups.setdefault(key, []).append((system, system_id))
+        return groups
+
+    def __schedule_group(self, errata_ids, reboot, members):
+        # returns the action IDs of each member, empty if the group failed to be scheduled
+        system_names = [system.name for system, _ in members]
+        # an error of a group is an error of each of its members
+        with log_mgr.collect_errors() as errors:
+            try:
+                if reboot:
+                    action_ids = self.__schedule_action_chain(errata_ids, members)
+                else:
+                    action_ids = self.__schedule_errata(errata_ids, members)
+            except Fault as err:
+                self.__logger.error(f"Failed to schedule errata for systems: {system_names}")
+                self.__logger.error("Fault code: %d" % err.faultCode)
+                self.__logger.error("Fault string: %s" % err.faultString)
+                action_ids = {}
+        for system, _ in members:
+            self.__errors[system] += errors
+        if action_ids:
+            self.__logger.debug(f"Scheduled {len(errata_ids)} errata for {len(members)} system(s): {system_names}")
+        return action_ids
+
+    def get_errors(self):
+        return self.__errors
+
+    def __inspect(self, system, systems_in_progress):
+        # returns the group key, ID and errata fingerprint of a system to schedule, SKIPPED, or None
+        try:
+            advisory_types = self.__advisoryTypesGetter(system)
+            errata = SystemErrataInspector(self.__client, system, advisory_types).obtain_system_errata()
+            system_id = system.get_id(self.__client)
+        except ValueError as err:
+            self.__logger.error(err)
+            return None
+
+        if not errata:
+            advisory_types_descriptions = [t.value for t in advisory_types]
+            self.__logger.warning(f"No patches of type {advisory_types_descriptions} available for system: "
+                                  f"{system.name} . Skipping...")
+            return None
+
+        errata_ids = frozenset(errata.get_ids())
+        fingerprint = get_errata_fingerprint(advisory_types, errata_ids)
+        # checked before the actions in progress, as the pending action of an unchanged system is its own
+        if is_unchanged_and_outstanding(self.__client, self.__fingerprintStore, self.__unchangedPolicy, system,
+                                        system_id, fingerprint):
+            return SKIPPED
+        if system.name in systems_in_progress:
+            self.__logger.error(f"System {system.name} already has an action in progress!")
+            return None
+        return (errata_ids, self.__needs_reboot(errata)), system_id, fingerprint
+
+    def __needs_reboot(self, errata):
+        if self.__rebootRequired:
+            return True
+        if self.__noReboot:
+            return False
         for patch in errata:
-            errata_ids.append(patch['id'])
-        return self.__client.actionchain.addErrataUpdate(self.__system.get_id(self.__client), errata_ids, label)
+            advisory_name = patch.advisory_name
+            if advisory_name not in self.__rebootSuggested:
+                keywords = self.__client.errata.listKeywords(advisory_name)
+                self.__rebootSuggested[advisory_name] = 'reboot_suggested' in keywords
+            if self.__rebootSuggested[advisory_name]:
+                return True
+        return False
 
-    def __add_system_reboot_to_action_chain(self, label):
-        return self.__client.actionchain.addSystemReboot(self.__system.get_id(self.__client), label)
+    def __schedule_errata(self, errata_ids, members):
+        system_ids = [system_id for _, system_id in members]
+        action_ids = self.__client.system.scheduleApplyErrata(system_ids, errata_ids, self.__date)
+        return {system: list(action_ids) for system, _ in members}
+
+    def __schedule_action_chain(self, errata_ids, members):
+        # a chain keeps the reboot from running on systems whose patching failed. The label is named after its
+        # members, as other shards and runs may create chains for the same date
+        system_ids = [system_id for _, system_id in members]
+        members_hash = hashlib.sha256(",".join(str(i) for i in sorted(system_ids)).encode()).hexdigest()[:12]
+        label = f"{self.__labelPrefix}-bulk-{members_hash}-" + str(self.__date)
+        if self.__client.actionchain.createChain(label) <= 0:
+            return {}
+        errata_action_id = self.__client.actionchain.addErrataUpdate(system_ids, errata_ids, label)
+        action_ids = {}
+        for system, system_id in members:
+            action_ids[system] = [errata_action_id]
+            reboot_action_id = self.__client.actionchain.addSystemReboot(system_id, label)
+            if reboot_action_id > 0:
+                action_ids[system].append(reboot_action_id)
+        if self.__client.actionchain.scheduleChain(label, self.__date) == 1:
+            return action_ids
+        return {}
 
 
 class PatchingSchedulerFactory(SchedulerFactory):
+    def __init__(self, inventory=None, fingerprint_store=None):
+        self.__patching_policy = None
+        # schedulers are created from the workers of the pipeline, so the policy file is parsed once under a lock
+        self.__patching_policy_lock = threading.Lock()
+        self.__inventory = inventory
+        self.__fingerprint_store = fingerprint_store
+
     def get_scheduler(self, client, system, schedule_date, args):
+        advisory_types = self.__get_advisory_types(client, system, args)
+        scheduler = SystemPatchingScheduler(client, system, schedule_date, advisory_types, args.reboot,
+                                            args.no_reboot, "patching", self.__fingerprint_store, args.unchanged)
+        return scheduler
+
+    def get_bulk_scheduler(self, client, systems, schedule_date, args):
+        if not args.bulk:
+            return None
+        return SystemPatchingBulkScheduler(client, systems, schedule_date,
+                                           lambda system: self.__get_advisory_types(client, system, args),
+                                           args.reboot, args.no_reboot, "patching", self.__fingerprint_store,
+                                           args.unchanged)
+
+    def get_apply_scheduler(self, client, system, schedule_date, args, plan):
+        # the unchanged policy was applied when planning, the fingerprint is only recorded
+        advisory_types = [AdvisoryType(t) for t in plan['advisory_types']]
+        return SystemPatchingScheduler(client, system, schedule_date, advisory_types, args.reboot, args.no_reboot,
+                                       "patching", self.__fingerprint_store)
+
+    def __get_advisory_types(self, client, system, args):
         advisory_types = []
         if args.policy:
-            policy_parser = ProductPatchingPolicyParser(args.policy)
-            patching_policy = policy_parser.parse()
-            advisory_types = get_advisory_types_for_system(client, system, patching_policy)
+            with self.__patching_policy_lock:
+                if self.__patching_policy is None:
+                    self.__patching_policy = ProductPatchingPolicyParser(args.policy).parse()
+            advisory_types = get_advisory_types_for_system(client, system, self.__patching_policy, self.__inventory)
         else:
             if args.security:
                 advisory_types.append(AdvisoryType.SECURITY)
@@ -106,14 +298,56 @@ class PatchingSchedulerFactory(SchedulerFactory):
                 advisory_types.append(AdvisoryType.PRODUCT_ENHANCEMENT)
             if args.all_patches:
                 advisory_types = [AdvisoryType.ALL]
+        return advisory_types
 
-        scheduler = SystemPatchingScheduler(client, system, schedule_date, advisory_types, args.reboot,
-                                            args.no_reboot, "patching")
-        return scheduler
+
+def get_systems_with_in_progress_actions(client, schedule_date):
+    systems = set()
+    for action in client.schedule.listInProgressActions():
+        converted = datetime.strptime(action['earliest'].value, "%Y%m%dT%H:%M:%S").isoformat()
+        if schedule_date.isoformat() >= converted:
+            for s in client.schedule.listInProgressSystems(action['id']):
+                systems.add(s['server_name'])
+    return systems
+
+
+def get_outstanding_action_status(client, system_id, action_ids):
+    # "pending" or "failed" when an action of the system is still outstanding, None when they completed or are gone
+    try:
+        for action_id in action_ids:
+            if any(s['server_id'] == system_id for s in client.schedule.listInProgressSystems(action_id)):
+                return "pending"
+            if any(s['server_id'] == system_id for s in client.schedule.listFailedSystems(action_id)):
+                return "failed"
+    except Fault as err:
+        logging.getLogger(__name__).debug(f"Actions {action_ids} not found: {err.faultString}")
+    return None
+
+
+def is_unchanged_and_outstanding(client, fingerprint_store, unchanged_policy, system, system_id, fingerprint):
+    if fingerprint_store is None or unchanged_policy == "reschedule":
+        return False
+    previous = fingerprint_store.get(system_id)
+    if previous is None or previous[0] != fingerprint:
+        return False
+    previous_action_ids = previous[1]
+    status = get_outstanding_action_status(client, system_id, previous_action_ids)
+    if status == "pending" or status == "failed" and unchanged_policy == "skip":
+        logging.getLogger(__name__).warning(f"Errata of system {system.name} are unchanged since its last scheduling "
+                                            f"and its actions {previous_action_ids} are {status}. Skipping...")
+        return True
+    return False
 
 
-def get_advisory_types_for_system(client, system, policy):
+def get_advisory_types_for_system(client, system, policy, inventory=None):
     logger = logging.getLogger(__name__)
+    if inventory is not None:
+        base_product = inventory.get_base_product(system.get_id(client))
+        if base_product is not None:
+            if base_product in policy:
+                return policy[base_product]
+            logger.warning(f"Product '{base_product}' not found in policy file for system {system.name}")
+            return []
     for product in client.system.getInstalledProducts(system.get_id(client)):
         if product['isBaseProduct']:
             if product['friendlyName'] in policy:
@@ -0,0 +1,154 @@
+import logging
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class PipelineStage:
+    # a step of the pipeline run by its own workers. The function of the stage returns False to stop an item there
+
+    def __init__(self, name, func, workers):
+        self.__name = name
+        self.__func = func
+        self.__workers = workers
+        self.__lock = threading.Lock()
+        self.__processed = 0
+        self.__passed = 0
+        self.__busy_time = 0.0
+        self.__max_queue_depth = 0
+        self.__queue_depth_total = 0
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def workers(self):
+        return self.__workers
+
+    def process(self, item, queue_depth):
+        start = time.monotonic()
+        try:
+            passed = self.__func(item) is not False
+        except Exception as e:
+            logging.getLogger(__name__).exception(f"Stage {self.__name} failed: {e}")
+            passed = False
+        with self.__lock:
+            self.__processed += 1
+            self.__passed += passed
+            self.__busy_time += time.monotonic() - start
+            self.__max_queue_depth = max(self.__max_queue_depth, queue_depth)
+            self.__queue_depth_total += queue_depth
+        return passed
+
+    def get_stats(self, elapsed):
+        with self.__lock:
+            processed = self.__processed
+            return {"stage": self.__name,
+                    "workers": self.__workers,
+                    "processed": processed,
+                    "passed": self.__passed,
+                    "throughput": round(processed / elapsed, 3) if elapsed > 0 else 0.0,
+                    "utilization": round(self.__busy_time / (elapsed * self.__workers), 3) if elapsed > 0 else 0.0,
+                    "max_queue_depth": self.__max_queue_depth,
+                    "avg_queue_depth": round(self.__queue_depth_total / processed, 3) if processed else 0.0}
+
+
+class _PipelineRun:
+    # the queues and the finishing state of a single run of a pipeline. The stop markers put in a queue are counted,
+    # so the sampled queue depths only count items
+
+    def __init__(self, stages, queue_size, on_finished, logger):
+        self.__stages = stages
+        self.__on_finished = on_finished
+        self.__logger = logger
+        self.__queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.__finished = []
+        self.__finished_lock = threading.Lock()
+        self.__remaining_workers = [stage.workers for stage in stages]
+        self.__pending_stops = [0] * len(stages)
+        self.__lock = threading.Lock()
+
+    def get_finished(self):
+        return self.__finished
+
+    def put(self, item):
+        self.__queues[0].put(item)
+
+    def stop(self, index):
+        # items are all queued before the stop markers, one per worker of the stage
+        with self.__lock:
+            self.__pending_stops[index] += self.__stages[index].workers
+        for _ in range(self.__stages[index].workers):
+            self.__queues[index].put(_STOP)
+
+    def work(self, index):
+        stage = self.__stages[index]
+        while True:
+            with self.__lock:
+                queue_depth = max(0, self.__queues[index].qsize() - self.__pending_stops[index])
+            item = self.__queues[index].get()
+            if item is _STOP:
+                break
+            if stage.process(item, queue_depth) and index + 1 < len(self.__stages):
+                self.__queues[index + 1].put(item)
+            else:
+                self.__finish(item)
+        with self.__lock:
+            self.__pending_stops[index] -= 1
+            self.__remaining_workers[index] -= 1
+            last_worker = self.__remaining_workers[index] == 0
+        # the last worker of a stage stops the workers of the next one
+        if last_worker and index + 1 < len(self.__stages):
+            self.stop(index + 1)
+
+    def __finish(self, item):
+        with self.__finished_lock:
+            if self.__on_finished is None:
+                self.__finished.append(item)
+                return
+            try:
+                self.__on_finished(item)
+            except Exception as e:
+                self.__logger.exception(f"Finishing an item failed: {e}")
+
+
+class Pipeline:
+    # stages are joined by bounded queues, so a slow stage holds back the ones before it instead of letting work
+    # pile up in memory. Items that stop at a stage, or go through all of them, are finished: passed to on_finished,
+    # one at a time, or returned in completion order without it, so a callback keeps finished items from being held
+
+    def __init__(self, stages, queue_size=64):
+        self.__stages = stages
+        self.__queue_size = queue_size
+        self.__elapsed = 0.0
+        self.__logger = logging.getLogger(__name__)
+
+    def run(self, items, on_finished=None):
+        pipeline_run = _PipelineRun(self.__stages, self.__queue_size, on_finished, self.__logger)
+        threads = []
+        for index, stage in enumerate(self.__stages):
+            for number in range(stage.workers):
+                thread = threading.Thread(target=pipeline_run.work, args=(index,), name=f"{stage.name}-{number}")
+                thread.start()
+                threads.append(thread)
+
+        start = time.monotonic()
+        for item in items:
+            pipeline_run.put(item)
+        pipeline_run.stop(0)
+        for thread in threads:
+            thread.join()
+        self.__elapsed = time.monotonic() - start
+        return pipeline_run.get_finished()
+
+    def get_stats(self):
+        return [stage.get_stats(self.__elapsed) for stage in self.__stages]
+
+    def log_stats(self):
+        for stats in self.get_stats():
+            self.__logger.info(f"Stage {stats['stage']}: {stats['processed']} item(s) with {stats['workers']} "
+                               f"worker(s), {stats['throughput']} item(s)/s, {stats['utilization']:.0%} busy, "
+                               f"queue depth max {stats['max_queue_depth']} avg {stats['avg_queue_depth']}")
@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from . import tracing
+from .scheduler import SKIPPED
+
+
+class PlanFileManager:
+    def __init__(self, plan_filename):
+        self.__operation = None
+        self.__options = {}
+        self.__entries = []
+        self.__logger = logging.getLogger(__name__)
+        self.__plan_filename = plan_filename
+        if plan_filename is None:
+            plans_directory = "plans/"
+            if not os.path.exists(plans_directory):
+                os.makedirs(plans_directory)
+            self.__plan_filename = (plans_directory +
+                                    "plan." + datetime.fromtimestamp(time.time()).isoformat() + ".json")
+
+    def read(self):
+        with open(self.__plan_filename) as f:
+            data = json.load(f)
+        self.__operation = data['operation']
+        self.__options = data['options']
+        self.__entries = data['systems']
+        return self.__entries
+
+    def append(self, entry):
+        self.__entries.append(entry)
+
+    def save(self, operation, options):
+        if not self.__entries:
+            return False
+        self.__operation = operation
+        # only plain values of the command line options are needed to apply the plan
+        self.__options = {k: v for k, v in options.items() if isinstance(v, (str, int, float, bool, type(None)))}
+        with open(self.__plan_filename, "w") as f:
+            json.dump({"operation": self.__operation,
+                       "created": datetime.now().isoformat(),
+                       "options": self.__options,
+                       "systems": self.__entries}, f, indent=2)
+            f.write("\n")
+            self.__logger.debug(f"Plan file created: {self.__plan_filename}")
+            return True
+
+    def get_operation(self):
+        return self.__operation
+
+    def get_options(self):
+        return self.__options
+
+    def get_entries(self):
+        return self.__entries
+
+    def get_filename(self):
+        return self.__plan_filename
+
+
+class Planner:
+    def __init__(self, client, factory, args, workers):
+        self.__client = client
+        self.__factory = factory
+        self.__args = args
+        self.__workers = workers
+        self.__logger = logging.getLogger(__name__)
+
+    def plan(self, systems):
+        # discovery only issues read calls, so all systems are inspected concurrently
+        with ThreadPoolExecutor(max_workers=self.__workers) as executor:
+            return list(zip(systems, executor.map(self.__plan_system, systems)))
+
+    def __plan_system(self, system):
+        with tracing.span(f"plan {system.name}", "system", system=system.name):
+            return self.__plan(system)
+
+    def __plan(self, system):
+        try:
+            scheduler = self.__factory.get_scheduler(self.__client, system, system.schedule_date, self.__args)
+        except ValueError as e:
+            self.__logger.error(f"System {system.name} failed to be planned: {e}")
+            return None
+        entry = scheduler.plan()
+        if entry is None or entry is SKIPPED:
+            return entry
+        entry.update({"name": system.name, "target": system.target, "kopts": system.kopts, "group": system.group})
+        return entry
@@ -0,0 +1,131 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+SUMMARY_LINES = 40
+TOP_ALLOCATORS = 20
+
+# since Python 3.12 cProfile is built on sys.monitoring: a single profile sees the calls of every thread and enabling a
+# second one, from any thread, fails with "Another profiling tool is already active"
+PROCESS_WIDE_PROFILE = sys.version_info >= (3, 12)
+
+
+class Profiler:
+    # profiles a command with cProfile and tracemalloc. Before Python 3.12 cProfile only sees the thread that enables
+    # it, so every thread started while profiling gets its own profile and all of them are merged when saving. Since
+    # 3.12 a single profile is enabled for the whole process. Network waits show up as time spent in the socket and
+    # ssl reads, the rest is local work
+
+    def __init__(self, sample_interval=0.5, process_wide=PROCESS_WIDE_PROFILE):
+        self.__process_wide = process_wide
+        self.__profiles = []
+        self.__profiles_lock = threading.Lock()
+        self.__sample_interval = sample_interval
+        self.__sampler = None
+        self.__stopped = threading.Event()
+        self.__peak_snapshot = None
+        self.__peak_size = 0
+        self.__traced_peak = 0
+        self.__elapsed = 0
+        self.__start_time = None
+        self.__main_profile = None
+        self.__logger = logging.getLogger(__name__)
+
+    def __new_profile(self):
+        profile = cProfile.Profile()
+        with self.__profiles_lock:
+            self.__profiles.append(profile)
+        return profile
+
+    def __profile_thread(self, frame, event, arg):
+        # installed by threading.setprofile, it runs on the first event of a new thread and replaces itself
+        sys.setprofile(None)
+        self.__new_profile().enable()
+
+    def start(self):
+        # raises ValueError when another profiler is already active in the process
+        self.__main_profile = self.__new_profile()
+        self.__main_profile.enable()
+        self.__start_time = time.perf_counter()
+        tracemalloc.start()
+        self.__sampler = threading.Thread(target=self.__sample_memory, name="profiler-memory", daemon=True)
+        self.__sampler.start()
+        if not self.__process_wide:
+            threading.setprofile(self.__profile_thread)
+
+    def stop(self):
+        self.__main_profile.disable()
+        if not self.__process_wide:
+            threading.setprofile(None)
+        self.__elapsed = time.perf_counter() - self.__start_time
+        self.__stopped.set()
+        self.__sampler.join()
+        self.__take_snapshot_if_peak()
+        self.__traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def __sample_memory(self):
+        # snapshots are only taken when the traced memory grows past the last one, so the top allocators are the
+        # ones at the highest sampled memory usage
+        while not self.__stopped.wait(self.__sample_interval):
+            self.__take_snapshot_if_peak()
+
+    def __take_snapshot_if_peak(self):
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self.__peak_size * 1.1 or self.__peak_snapshot is None:
+            self.__peak_size = current
+            self.__peak_snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>")])
+
+    def get_stats(self):
+        stats = None
+        with self.__profiles_lock:
+            profiles = list(self.__profiles)
+        for profile in profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        return stats
+
+    def get_summary(self):
+        out = io.StringIO()
+        profiled_threads = "all" if self.__process_wide else len(self.__profiles)
+        out.write(f"Elapsed: {self.__elapsed:.3f}s, profiled threads: {profiled_threads}\n\n")
+        stats = self.get_stats()
+        if stats is not None:
+            stats.stream = out
+            for title, sort_key in [("own", pstats.SortKey.TIME), ("cumulative", pstats.SortKey.CUMULATIVE)]:
+                out.write(f"Hot functions by {title} time\n")
+                stats.sort_stats(sort_key).print_stats(SUMMARY_LINES)
+        out.write(f"Peak traced memory: {self.__traced_peak / 1024:.1f} KiB\n")
+        if self.__peak_snapshot is not None:
+            out.write(f"Top allocators at {self.__peak_size / 1024:.1f} KiB of traced memory\n")
+            for statistic in self.__peak_snapshot.statistics("lineno")[:TOP_ALLOCATORS]:
+                out.write(f"  {statistic}\n")
+        return out.getvalue()
+
+    def save(self, prefix=None):
+        if prefix is None:
+            profiles_directory = "profiles/"
+            if not os.path.exists(profiles_directory):
+                os.makedirs(profiles_directory)
+            prefix = profiles_directory + "profile." + datetime.fromtimestamp(time.time()).isoformat()
+        stats = self.get_stats()
+        if stats is not None:
+            stats.dump_stats(prefix + ".pstats")
+        with open(prefix + ".txt", "w") as f:
+            f.write(self.get_summary())
+        self.__logger.info(f"Profile saved: {prefix}.txt and {prefix}.pstats")
+        return prefix
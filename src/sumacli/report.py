@@ -0,0 +1,244 @@
+import csv
+import json
+import logging
+import os
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from xmlrpc.client import Fault
+
+from .advisory_type import AdvisoryType
+
+REPORT_TABLES = ["advisories", "products", "critical", "clusters"]
+
+
+def _to_bitset(indexes, size):
+    bits = bytearray((size + 7) // 8)
+    for index in indexes:
+        bits[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class ErrataMatrix:
+    # systems x advisories matrix. Every system row and every advisory column is an int used as a bitset, so the
+    # aggregates of a report are bitwise operations and bit counts instead of walks over the errata of each system
+
+    def __init__(self):
+        self.__systems = []
+        self.__advisories = []
+        self.__advisory_indexes = {}
+        self.__system_advisories = []
+        self.__rows = None
+        self.__columns = None
+
+    def add_system(self, name, base_product, errata):
+        indexes = array('I')
+        for erratum in errata:
+            index = self.__advisory_indexes.get(erratum['advisory_name'])
+            if index is None:
+                index = len(self.__advisories)
+                self.__advisory_indexes[erratum['advisory_name']] = index
+                self.__advisories.append((erratum['advisory_name'], erratum.get('advisory_type')))
+            indexes.append(index)
+        self.__systems.append((name, base_product))
+        self.__system_advisories.append(indexes)
+        self.__rows = self.__columns = None
+
+    def __build(self):
+        if self.__rows is not None:
+            return
+        column_indexes = [array('I') for _ in self.__advisories]
+        for system_index, indexes in enumerate(self.__system_advisories):
+            for index in indexes:
+                column_indexes[index].append(system_index)
+        self.__rows = [_to_bitset(indexes, len(self.__advisories)) for indexes in self.__system_advisories]
+        self.__columns = [_to_bitset(indexes, len(self.__systems)) for indexes in column_indexes]
+
+    def get_systems(self):
+        return self.__systems
+
+    def get_advisories(self):
+        return self.__advisories
+
+    def get_advisory_mask(self, predicate):
+        # bitset of the advisories for which predicate(advisory_name, advisory_type) is true
+        return _to_bitset([i for i, advisory in enumerate(self.__advisories) if predicate(*advisory)],
+                          len(self.__advisories))
+
+    def count_systems(self, advisory_index):
+        self.__build()
+        return self.__columns[advisory_index].bit_count()
+
+    def get_rows(self):
+        self.__build()
+        return self.__rows
+
+    def get_matching_systems(self, advisory_mask):
+        return [i for i, row in enumerate(self.get_rows()) if row & advisory_mask]
+
+    def get_clusters(self):
+        # systems with the same base product and the same pending advisories
+        clusters = {}
+        for i, row in enumerate(self.get_rows()):
+            clusters.setdefault((self.__systems[i][1], row), []).append(i)
+        return clusters
+
+
+class ErrataCollector:
+    # fetches the relevant errata and base product of each system concurrently, and the details of each advisory
+    # once. Only the base product is read from the inventory, errata are always current
+
+    def __init__(self, client, workers=8, inventory=None):
+        self.__client = client
+        self.__workers = workers
+        self.__inventory = inventory
+        self.__logger = logging.getLogger(__name__)
+
+    def collect(self, systems):
+        matrix = ErrataMatrix()
+        with ThreadPoolExecutor(max_workers=self.__workers) as executor:
+            for system, data in zip(systems, executor.map(self.__fetch_system, systems)):
+                if data is not None:
+                    matrix.add_system(system.name, *data)
+            advisories = matrix.get_advisories()
+            details = dict(zip([name for name, _ in advisories], executor.map(self.__fetch_advisory, advisories)))
+        return matrix, details
+
+    def __fetch_system(self, system):
+        try:
+            system_id = system.get_id(self.__client)
+            base_product = None
+            if self.__inventory is not None:
+                base_product = self.__inventory.get_base_product(system_id)
+            if base_product is None:
+                for product in self.__client.system.getInstalledProducts(system_id):
+                    if product['isBaseProduct']:
+                        base_product = product['friendlyName']
+                        break
+            return base_product, self.__client.system.getRelevantErrata(system_id)
+        except Fault as err:
+            self.__logger.error(f"Failed to collect errata of system {system.name}: {err.faultString}")
+        except ValueError as err:
+            self.__logger.error(err)
+        return None
+
+    def __fetch_advisory(self, advisory):
+        advisory_name, advisory_type = advisory
+        details = {"severity": None, "reboot_suggested": False}
+        try:
+            details["reboot_suggested"] = 'reboot_suggested' in self.__client.errata.listKeywords(advisory_name)
+            # the severity only matters for security advisories
+            if advisory_type == AdvisoryType.SECURITY.value:
+                details["severity"] = self.__client.errata.getDetails(advisory_name).get('severity')
+        except Fault as err:
+            self.__logger.error(f"Failed to get details of advisory {advisory_name}: {err.faultString}")
+        return details
+
+
+class FleetReport:
+
+    def __init__(self, matrix, advisory_details, critical_severities):
+        self.__matrix = matrix
+        self.__advisory_details = advisory_details
+        self.__critical_severities = {s.lower() for s in critical_severities}
+        self.__logger = logging.getLogger(__name__)
+
+    def __is_critical(self, advisory_name, advisory_type):
+        severity = self.__advisory_details.get(advisory_name, {}).get("severity")
+        return advisory_type == AdvisoryType.SECURITY.value and severity is not None and \
+            severity.lower() in self.__critical_severities
+
+    def __needs_reboot(self, advisory_name, advisory_type):
+        return self.__advisory_details.get(advisory_name, {}).get("reboot_suggested", False)
+
+    def get_advisories(self):
+        advisories = []
+        for i, (advisory_name, advisory_type) in enumerate(self.__matrix.get_advisories()):
+            details = self.__advisory_details.get(advisory_name, {})
+            advisories.append({"advisory": advisory_name, "type": advisory_type, "severity": details.get("severity"),
+                               "reboot_suggested": details.get("reboot_suggested", False),
+                               "systems": self.__matrix.count_systems(i)})
+        return sorted(advisories, key=lambda a: (-a["systems"], a["advisory"]))
+
+    def get_products(self):
+        # pending advisories and affected systems per base product and advisory type
+        advisory_types = sorted({t for _, t in self.__matrix.get_advisories() if t is not None})
+        masks = {t: self.__matrix.get_advisory_mask(lambda name, advisory_type: advisory_type == t)
+                 for t in advisory_types}
+        products = {}
+        systems = self.__matrix.get_systems()
+        for i, row in enumerate(self.__matrix.get_rows()):
+            product = products.setdefault(systems[i][1] or "Unknown", {"systems": 0, "types": {}})
+            product["systems"] += 1
+            for advisory_type, mask in masks.items():
+                pending = (row & mask).bit_count()
+                if pending:
+                    counts = product["types"].setdefault(advisory_type, {"systems": 0, "pending": 0, "mask": 0})
+                    counts["systems"] += 1
+                    counts["pending"] += pending
+                    counts["mask"] |= row & mask
+        rows = []
+        for base_product, product in sorted(products.items()):
+            for advisory_type, counts in sorted(product["types"].items()):
+                rows.append({"base_product": base_product, "type": advisory_type, "systems": product["systems"],
+                             "affected_systems": counts["systems"], "advisories": counts["mask"].bit_count(),
+                             "pending": counts["pending"]})
+        return rows
+
+    def get_critical(self):
+        systems = self.__matrix.get_systems()
+        critical_mask = self.__matrix.get_advisory_mask(self.__is_critical)
+        advisories = self.__matrix.get_advisories()
+        critical = []
+        for i in self.__matrix.get_matching_systems(critical_mask):
+            row = self.__matrix.get_rows()[i] & critical_mask
+            critical.append({"system": systems[i][0], "base_product": systems[i][1],
+                             "advisories": [advisories[a][0] for a in range(row.bit_length()) if row >> a & 1]})
+        return critical
+
+    def get_clusters(self):
+        systems = self.__matrix.get_systems()
+        clusters = [{"base_product": base_product, "advisories": row.bit_count(),
+                     "systems": [systems[i][0] for i in members]}
+                    for (base_product, row), members in self.__matrix.get_clusters().items() if len(members) > 1]
+        return sorted(clusters, key=lambda c: (-len(c["systems"]), c["systems"][0]))
+
+    def get_summary(self):
+        reboot_mask = self.__matrix.get_advisory_mask(self.__needs_reboot)
+        critical_mask = self.__matrix.get_advisory_mask(self.__is_critical)
+        return {"generated": datetime.now().isoformat(),
+                "systems": len(self.__matrix.get_systems()),
+                "advisories": len(self.__matrix.get_advisories()),
+                "systems_with_pending_advisories": len([row for row in self.__matrix.get_rows() if row]),
+                "systems_missing_critical_security": len(self.__matrix.get_matching_systems(critical_mask)),
+                "systems_requiring_reboot": len(self.__matrix.get_matching_systems(reboot_mask)),
+                "clusters": len(self.get_clusters())}
+
+    def get_table(self, table):
+        return {"advisories": self.get_advisories, "products": self.get_products, "critical": self.get_critical,
+                "clusters": self.get_clusters}[table]()
+
+    def to_dict(self):
+        return {"summary": self.get_summary(), **{table: self.get_table(table) for table in REPORT_TABLES}}
+
+    def save(self, filename, output_format="json", table="advisories"):
+        if filename is None:
+            reports_directory = "reports/"
+            if not os.path.exists(reports_directory):
+                os.makedirs(reports_directory)
+            filename = (reports_directory + "report." + datetime.fromtimestamp(time.time()).isoformat() + "." +
+                        output_format)
+        with open(filename, "w", newline="") as f:
+            if output_format == "json":
+                json.dump(self.to_dict(), f, indent=2)
+                f.write("\n")
+            else:
+                rows = self.get_table(table)
+                fieldnames = list(rows[0].keys()) if rows else []
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                for row in rows:
+                    writer.writerow({k: " ".join(v) if isinstance(v, list) else v for k, v in row.items()})
+        self.__logger.debug(f"Report file created: {filename}")
+        return filename
@@ -1,9 +1,59 @@
+# returned instead of a plan or of the action IDs of a system that is left as it is on purpose. It is neither a
+# success nor a failure
+SKIPPED = object()
+
+
 class SchedulerFactory:
 
     def get_scheduler(self, client, system, schedule_date, args):
         pass
 
+    def get_bulk_scheduler(self, client, systems, schedule_date, args):
+        # factories without a bulk mode return None and systems are scheduled one by one
+        return None
+
+    def get_apply_scheduler(self, client, system, schedule_date, args, plan):
+        # returns a scheduler that only needs to apply a plan, so no discovery call should be made here
+        return self.get_scheduler(client, system, schedule_date, args)
+
 
 class Scheduler:
+    # short name of the operation in events and what is being scheduled in logs
+    operation = None
+    description = None
+
+    def get_description(self):
+        return self.description
+
+    def get_details(self):
+        # operation specific data added to the events of a system
+        return {}
+
+    def schedule(self):
+        plan = self.plan()
+        if plan is None or plan is SKIPPED:
+            return plan
+        return self.apply(plan)
+
+    def plan(self):
+        # read-only discovery. Returns a JSON serializable dictionary with what apply() needs, SKIPPED,
+        # or None on failure
+        pass
+
+    def apply(self, plan):
+        # runs only the write calls described by plan. Returns the list of action IDs, or None on failure
+        pass
+
+
+class BulkScheduler:
+    operation = None
+    description = None
+
     def schedule(self):
+        # returns a dictionary of System to its list of action IDs, SKIPPED, or None if the system failed to be
+        # scheduled
         pass
+
+    def get_errors(self):
+        # returns a dictionary of System to the error messages logged while scheduling it
+        return {}
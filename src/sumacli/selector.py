@@ -0,0 +1,85 @@
+import re
+
+# "&" and "-" bind tighter than "|", operators of the same precedence are evaluated left to right
+OPERATORS = {"|": 1, "&": 2, "-": 2}
+
+# operators need spaces around them, as system names and groups may contain dashes
+TOKEN_PATTERN = re.compile(r'(?:^|\s+)([&|-])(?:\s+|$)|(\()\s*|\s*(\))')
+
+
+def is_expression(selector):
+    return TOKEN_PATTERN.search(selector) is not None
+
+
+def tokenize(selector):
+    tokens = []
+    position = 0
+    for match in TOKEN_PATTERN.finditer(selector):
+        term = selector[position:match.start()].strip()
+        if term:
+            tokens.append(term)
+        tokens.append(match.group(1) or match.group(2) or match.group(3))
+        position = match.end()
+    term = selector[position:].strip()
+    if term:
+        tokens.append(term)
+    return tokens
+
+
+def _check_position(token, expect_term):
+    # a term or "(" must follow an operator or "(", an operator or ")" must follow a term or ")"
+    if token == ")" or token in OPERATORS:
+        if expect_term:
+            raise ValueError(f"Missing term before '{token}'")
+    elif not expect_term:
+        raise ValueError(f"Missing operator before '{token}'")
+
+
+def _pop_operators(output, operators, precedence=0):
+    # moves the operators of the current parenthesis that bind at least as tight as the given precedence to the output
+    while operators and operators[-1] != "(" and OPERATORS[operators[-1]] >= precedence:
+        output.append(operators.pop())
+
+
+def to_postfix(tokens):
+    output = []
+    operators = []
+    expect_term = True
+    for token in tokens:
+        _check_position(token, expect_term)
+        if token == "(":
+            operators.append(token)
+        elif token == ")":
+            _pop_operators(output, operators)
+            if not operators:
+                raise ValueError("Unbalanced ')'")
+            operators.pop()
+        elif token in OPERATORS:
+            _pop_operators(output, operators, OPERATORS[token])
+            operators.append(token)
+        else:
+            output.append(token)
+        expect_term = token == "(" or token in OPERATORS
+    if expect_term:
+        raise ValueError("Missing term at the end")
+    _pop_operators(output, operators)
+    if operators:
+        raise ValueError("Unbalanced '('")
+    return output
+
+
+def evaluate(selector, resolve):
+    # resolve(term) returns the set of system IDs of a term, such as "group:name" or a system name. Each term is
+    # resolved once
+    resolved = {}
+    stack = []
+    for token in to_postfix(tokenize(selector)):
+        if token in OPERATORS:
+            right = stack.pop()
+            left = stack.pop()
+            stack.append(left | right if token == "|" else left & right if token == "&" else left - right)
+        else:
+            if token not in resolved:
+                resolved[token] = set(resolve(token))
+            stack.append(resolved[token])
+    return stack[0]
@@ -1,10 +1,16 @@
+import fcntl
 import logging
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
 
 from .config_mgr import ConfigManager
 
 
 class SessionManager:
+    # session keys of each user of a server, one "login:key" line per user. Several sumacli processes share the file:
+    # it is guarded by a lock file and always replaced atomically, so readers never see a partial write
 
     def __init__(self):
         self.__current_session = None
@@ -12,23 +18,71 @@ class SessionManager:
         self.__logger = logging.getLogger(__name__)
         self.__manager_dir = f'{self.__config_manager.get_config_dir()}/{self.__config_manager.manager_fqdn}'
         self.__session_file = f'{self.__manager_dir}/session'
+        self.__lock_file = f'{self.__manager_dir}/session.lock'
+        # flock is held once per process, nested and concurrent uses from threads go through this lock
+        self.__thread_lock = threading.RLock()
+        self.__lock_depth = 0
+        self.__lock_fd = None
+
+    @contextmanager
+    def lock(self, exclusive=True):
+        with self.__thread_lock:
+            if self.__lock_depth == 0:
+                os.makedirs(self.__manager_dir, int('0700', 8), exist_ok=True)
+                self.__lock_fd = os.open(self.__lock_file, os.O_RDWR | os.O_CREAT, int('0600', 8))
+                fcntl.flock(self.__lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self.__lock_depth += 1
+            try:
+                yield
+            finally:
+                self.__lock_depth -= 1
+                if self.__lock_depth == 0:
+                    fcntl.flock(self.__lock_fd, fcntl.LOCK_UN)
+                    os.close(self.__lock_fd)
+                    self.__lock_fd = None
+
+    def reload(self):
+        # forgets the session key read before, so the one saved by another process is used
+        self.__current_session = None
+
+    def __read_sessions(self):
+        sessions = {}
+        if os.path.isfile(self.__session_file):
+            with open(self.__session_file, 'r') as session_file:
+                for line in session_file:
+                    login, separator, session_key = line.strip().partition(':')
+                    if separator and session_key:
+                        sessions[login] = session_key
+        return sessions
+
+    def __write_sessions(self, sessions):
+        fd, temporary_filename = tempfile.mkstemp(dir=self.__manager_dir, prefix='.session.')
+        try:
+            with os.fdopen(fd, 'w') as session_file:
+                session_file.writelines(f'{login}:{session_key}\n' for login, session_key in sessions.items())
+                session_file.flush()
+                os.fsync(session_file.fileno())
+            os.replace(temporary_filename, self.__session_file)
+        except BaseException:
+            os.unlink(temporary_filename)
+            raise
 
     @property
     def session_key(self):
         if self.__current_session is not None:
             return self.__current_session
 
-        if not os.path.isdir(self.__manager_dir):
-            os.mkdir(self.__manager_dir, int('0700', 8))
-        if os.path.isfile(self.__session_file):
-            with open(self.__session_file, 'r') as session_file:
-                line = session_file.readline()
-                if line != '':
-                    self.__config_manager.manager_login = line.split(':')[0].strip()
-                    self.__current_session = line.split(':')[1].strip()
+        with self.lock(exclusive=False):
+            sessions = self.__read_sessions()
+        login = self.__config_manager.manager_login
+        if login is None and sessions:
+            # without a configured user, the first user with a session is used
+            login = next(iter(sessions))
+            self.__config_manager.manager_login = login
+        self.__current_session = sessions.get(login)
         if self.__current_session is None:
-            if self.__config_manager.manager_login is not None:
-                self.__logger.warning(f'Session key not found for user {self.__config_manager.manager_login}')
+            if login is not None:
+                self.__logger.warning(f'Session key not found for user {login}')
             else:
                 self.__logger.warning(f'Session key not found for any user')
         return self.__current_session
@@ -36,18 +90,16 @@ class SessionManager:
     @session_key.setter
     def session_key(self, session_key):
         self.__current_session = session_key
-        with open(self.__session_file, 'w') as session_file:
-            session_file.write(f'{self.__config_manager.manager_login}:{self.__current_session}\n')
-            self.__logger.debug(f'Session key saved for user {self.__config_manager.manager_login}')
+        with self.lock():
+            sessions = self.__read_sessions()
+            sessions[self.__config_manager.manager_login] = session_key
+            self.__write_sessions(sessions)
+        self.__logger.debug(f'Session key saved for user {self.__config_manager.manager_login}')
 
     @session_key.deleter
     def session_key(self):
-        if os.path.isfile(self.__session_file):
-            with open(self.__session_file, 'r') as in_session_file:
-                lines = in_session_file.readlines()
-                for line in lines:
-                    if line.startswith(self.__config_manager.manager_login):
-                        lines.remove(line)
-
-                with open(self.__session_file, 'w') as out_session_file:
-                    out_session_file.writelines(lines)
+        self.__current_session = None
+        with self.lock():
+            sessions = self.__read_sessions()
+            if sessions.pop(self.__config_manager.manager_login, None) is not None:
+                self.__write_sessions(sessions)
@@ -0,0 +1,29 @@
+import hashlib
+
+
+def parse_shard(value):
+    # "i/N" where i goes from 1 to N
+    try:
+        index, count = [int(x) for x in value.split('/')]
+    except ValueError:
+        raise ValueError(f"Invalid shard: {value}. The format is i/N, for example 1/4")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard: {value}. The shard number must be between 1 and {count}")
+    return index, count
+
+
+def get_shard_index(system_name, shard_count):
+    # the digest does not change between processes or hosts, unlike hash(), and spreads names that only differ by a
+    # number evenly, unlike crc32
+    digest = hashlib.blake2b(system_name.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count + 1
+
+
+def select_shard(systems, shard_index, shard_count):
+    # keeps the systems of each date that belong to the given shard
+    selected = {}
+    for date, date_systems in systems.items():
+        shard_systems = [s for s in date_systems if get_shard_index(s.name, shard_count) == shard_index]
+        if shard_systems:
+            selected[date] = shard_systems
+    return selected
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_tracer = None
+_trace_filename = None
+
+
+class Tracer:
+    # records complete events of the Chrome trace event format, which Perfetto and chrome://tracing can open.
+    # Spans of the same thread nest by time, so the RPCs of a system show up as children of its span. Work that moves
+    # between threads is tied together by an async span, which begins and ends on any thread and is matched by its id
+
+    def __init__(self):
+        self.__events = []
+        self.__thread_names = {}
+        self.__lock = threading.Lock()
+        self.__pid = os.getpid()
+        self.__origin = time.perf_counter()
+        self.__logger = logging.getLogger(__name__)
+
+    @contextmanager
+    def span(self, name, category="sumacli", **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.__add({"name": name, "cat": category, "ph": "X", "ts": round((start - self.__origin) * 1e6, 3),
+                        "dur": round((end - start) * 1e6, 3), "args": args})
+
+    def begin_async(self, name, span_id, category="sumacli", **args):
+        self.__add({"name": name, "cat": category, "ph": "b", "id": span_id,
+                    "ts": round((time.perf_counter() - self.__origin) * 1e6, 3), "args": args})
+
+    def end_async(self, name, span_id, category="sumacli", **args):
+        self.__add({"name": name, "cat": category, "ph": "e", "id": span_id,
+                    "ts": round((time.perf_counter() - self.__origin) * 1e6, 3), "args": args})
+
+    def __add(self, event):
+        thread = threading.current_thread()
+        event.update({"pid": self.__pid, "tid": thread.ident})
+        with self.__lock:
+            self.__events.append(event)
+            self.__thread_names[thread.ident] = thread.name
+
+    def save(self, filename):
+        with self.__lock:
+            metadata = [{"name": "thread_name", "ph": "M", "pid": self.__pid, "tid": tid, "args": {"name": name}}
+                        for tid, name in self.__thread_names.items()]
+            events = metadata + sorted(self.__events, key=lambda e: e["ts"])
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+        self.__logger.info(f"Trace file saved: {filename}")
+
+
+def start_tracing(filename):
+    global _tracer, _trace_filename
+    _tracer = Tracer()
+    _trace_filename = filename
+    return _tracer
+
+
+def stop_tracing():
+    global _tracer
+    if _tracer is not None:
+        _tracer.save(_trace_filename)
+        _tracer = None
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, category="sumacli", **args):
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.span(name, category, **args)
+
+
+def begin_async(name, span_id, category="sumacli", **args):
+    if _tracer is not None:
+        _tracer.begin_async(name, span_id, category, **args)
+
+
+def end_async(name, span_id, category="sumacli", **args):
+    if _tracer is not None:
+        _tracer.end_async(name, span_id, category, **args)
@@ -0,0 +1,51 @@
+import zlib
+from xmlrpc.client import Transport, SafeTransport
+
+
+class CompressedTransportMixin:
+    # Responses are asked gzip encoded and decompressed while they are parsed, chunk by chunk, so that large
+    # responses are never held in full as raw bytes. Servers that compress their responses do not necessarily
+    # decode compressed requests, so requests are only compressed when it is enabled in the configuration
+    read_size = 64 * 1024
+    request_compression_threshold = 4096
+
+    def __init__(self, *args, compress_requests=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accept_gzip_encoding = True
+        self.encode_threshold = self.request_compression_threshold if compress_requests else None
+
+    def parse_response(self, response):
+        decompressor = None
+        if hasattr(response, 'getheader') and response.getheader("Content-Encoding", "") == "gzip":
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        p, u = self.getparser()
+
+        while True:
+            data = response.read(self.read_size)
+            if not data:
+                break
+            if decompressor is not None:
+                data = decompressor.decompress(data)
+            if self.verbose:
+                print("body:", repr(data))
+            p.feed(data)
+        if decompressor is not None:
+            p.feed(decompressor.flush())
+
+        p.close()
+        return u.close()
+
+
+class CompressedTransport(CompressedTransportMixin, Transport):
+    pass
+
+
+class CompressedSafeTransport(CompressedTransportMixin, SafeTransport):
+    pass
+
+
+def get_transport(api_url, context, compress_requests=False):
+    if api_url.startswith("https"):
+        return CompressedSafeTransport(context=context, compress_requests=compress_requests)
+    return CompressedTransport(compress_requests=compress_requests)
@@ -1,21 +1,44 @@
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from xmlrpc.client import Fault
 
-from .scheduler import SchedulerFactory, Scheduler
+from .scheduler import SchedulerFactory, Scheduler, BulkScheduler
 from .config_mgr import ConfigManager
+from . import tracing, log_mgr
+
+
+class KickstartCache:
+    # kickstart data only depends on the target profile, so it is shared by the systems of a run. Each entry is
+    # loaded once, even when systems are prepared concurrently
+
+    def __init__(self):
+        self.__entries = {}
+        self.__lock = threading.Lock()
+
+    def get(self, key, loader):
+        with self.__lock:
+            if key not in self.__entries:
+                self.__entries[key] = loader()
+            return self.__entries[key]
 
 
 class SystemUpgradeScheduler(Scheduler):
-    def __init__(self, client, system, date):
+    operation = "upgrade"
+    description = "upgrade"
+
+    def __init__(self, client, system, date, kickstart_cache=None):
         self.__client = client
         self.__system = system
         self.__date = date
         self.__logger = logging.getLogger(__name__)
-        self.__kstree_label = None
-        self.__kstree_data = None
+        self.__kickstart_cache = kickstart_cache if kickstart_cache is not None else KickstartCache()
         self.__config_manager = ConfigManager()
 
     def __get_org_id(self):
+        return self.__kickstart_cache.get(('org', self.__system.target), self.__find_org_id)
+
+    def __find_org_id(self):
         profile_variables = self.__client.kickstart.profile.getVariables(self.__system.target)
         if 'org' in profile_variables.keys():
             return profile_variables['org']
@@ -28,11 +51,11 @@ class SystemUpgradeScheduler(Scheduler):
         return orgs[0]['id']
 
     def __get_kickstart_tree(self):
-        if self.__kstree_label is not None and self.__kstree_data is not None:
-            return self.__kstree_label, self.__kstree_data
-        self.__kstree_label = self.__client.kickstart.profile.getKickstartTree(self.__system.target)
-        self.__kstree_data = self.__client.kickstart.tree.getDetails(self.__kstree_label)
-        return self.__kstree_label, self.__kstree_data
+        return self.__kickstart_cache.get(('tree', self.__system.target), self.__find_kickstart_tree)
+
+    def __find_kickstart_tree(self):
+        kstree_label = self.__client.kickstart.profile.getKickstartTree(self.__system.target)
+        return kstree_label, self.__client.kickstart.tree.getDetails(kstree_label)
 
     def __build_pillar_data(self):
         kstree_label, kstree_data = self.__get_kickstart_tree()
@@ -48,27 +71,32 @@ class SystemUpgradeScheduler(Scheduler):
                        "kopts": kopts}
         return pillar_data
 
-    def __set_system_record_variables(self):
-        kstree_label, kstree_data = self.__get_kickstart_tree()
-        reactivation_key = self.__client.system.obtainReactivationKey(self.__system.get_id(self.__client))
-        variables = {"ks_distro": kstree_data['install_type']['label'],
-                     "redhat_management_server": self.__config_manager.manager_fqdn,
-                     "redhat_management_key": reactivation_key}
-        self.__client.system.setVariables(self.__system.get_id(self.__client), False, variables)
+    def plan(self):
+        try:
+            system_id = self.__system.get_id(self.__client)
+            kstree_label, kstree_data = self.__get_kickstart_tree()
+            pillar_data = self.__build_pillar_data()
+        except Fault as err:
+            self.__logger.error(f"Failed to obtain upgrade data for system {self.__system.name}")
+            self.__logger.error("Fault code: %d" % err.faultCode)
+            self.__logger.error("Fault string: %s" % err.faultString)
+            return None
+        except ValueError as err:
+            self.__logger.error(err)
+            return None
+        return {"system_id": system_id,
+                "target": self.__system.target,
+                "kickstart_tree": kstree_label,
+                "ks_distro": kstree_data['install_type']['label'],
+                "pillar": pillar_data}
 
-    def schedule(self):
+    def apply(self, plan):
         action_ids = None
+        system_id = plan['system_id']
         try:
-            if self.__client.system.createSystemRecord(self.__system.get_id(self.__client),
-                                                       self.__system.target) == 1:
-                self.__logger.debug(f"Successfully created system record for system {self.__system.name}")
-
-                self.__set_system_record_variables()
-
-                self.__client.system.setPillar(self.__system.get_id(self.__client), "suse_patching_upgrade",
-                                               self.__build_pillar_data())
-                action_ids = [self.__client.system.scheduleApplyStates(self.__system.get_id(self.__client),
-                                                                       ["bootloader.autoinstall"], self.__date, False)]
+            if self.prepare(plan):
+                action_ids = [self.__client.system.scheduleApplyStates(system_id, ["bootloader.autoinstall"],
+                                                                       self.__date, False)]
                 self.__logger.debug(f"Successfully scheduled system upgrade with action ID {action_ids} " +
                                     f"for system {self.__system.name}")
         except Fault as err:
@@ -76,13 +104,104 @@ class SystemUpgradeScheduler(Scheduler):
             self.__logger.error("Fault code: %d" % err.faultCode)
             self.__logger.error("Fault string: %s" % err.faultString)
             return None
-        except ValueError as err:
-            self.__logger.error(err)
-            return None
         return action_ids
 
+    def prepare(self, plan):
+        # everything but scheduling the autoinstall state: the system record, its variables and the pillar
+        system_id = plan['system_id']
+        if self.__client.system.createSystemRecord(system_id, plan['target']) != 1:
+            return False
+        self.__logger.debug(f"Successfully created system record for system {self.__system.name}")
+        self.__set_system_record_variables(system_id, plan['ks_distro'])
+        self.__client.system.setPillar(system_id, "suse_patching_upgrade", plan['pillar'])
+        return True
+
+    def __set_system_record_variables(self, system_id, ks_distro):
+        reactivation_key = self.__client.system.obtainReactivationKey(system_id)
+        variables = {"ks_distro": ks_distro,
+                     "redhat_management_server": self.__config_manager.manager_fqdn,
+                     "redhat_management_key": reactivation_key}
+        self.__client.system.setVariables(system_id, False, variables)
+
+
+class SystemUpgradeBulkScheduler(BulkScheduler):
+    operation = "upgrade"
+    description = "bulk upgrade"
+
+    def __init__(self, client, systems, date, workers, kickstart_cache=None):
+        self.__client = client
+        self.__systems = systems
+        self.__date = date
+        self.__workers = workers
+        self.__kickstart_cache = kickstart_cache if kickstart_cache is not None else KickstartCache()
+        self.__errors = {}
+        self.__logger = logging.getLogger(__name__)
+
+    def schedule(self):
+        results = {system: None for system in self.__systems}
+        # systems are prepared concurrently, then all of them get the autoinstall state with a single call
+        with ThreadPoolExecutor(max_workers=self.__workers) as executor:
+            system_ids = list(executor.map(self.__prepare, self.__systems))
+        prepared = [(system, system_id) for system, system_id in zip(self.__systems, system_ids)
+                    if system_id is not None]
+        if not prepared:
+            return results
+
+        system_names = [system.name for system, _ in prepared]
+        with log_mgr.collect_errors() as errors:
+            try:
+                action_id = self.__client.system.scheduleApplyStates([system_id for _, system_id in prepared],
+                                                                     ["bootloader.autoinstall"], self.__date, False)
+            except Fault as err:
+                self.__logger.error(f"Failed to schedule upgrade for systems: {system_names}")
+                self.__logger.error("Fault code: %d" % err.faultCode)
+                self.__logger.error("Fault string: %s" % err.faultString)
+                action_id = None
+        for system, _ in prepared:
+            self.__errors[system] += errors
+        if action_id is None:
+            return results
+        self.__logger.debug(f"Successfully scheduled system upgrade with action ID {action_id} "
+                            f"for systems {system_names}")
+        for system, _ in prepared:
+            results[system] = [action_id]
+        return results
+
+    def get_errors(self):
+        return self.__errors
+
+    def __prepare(self, system):
+        # runs in a worker thread, so the errors of the system are collected here
+        with log_mgr.collect_errors() as errors:
+            self.__errors[system] = errors
+            return self.__prepare_system(system)
+
+    def __prepare_system(self, system):
+        with tracing.span(f"prepare {system.name}", "system", system=system.name):
+            scheduler = SystemUpgradeScheduler(self.__client, system, self.__date, self.__kickstart_cache)
+            plan = scheduler.plan()
+            if plan is None:
+                return None
+            try:
+                if scheduler.prepare(plan):
+                    return plan['system_id']
+            except Fault as err:
+                self.__logger.error(f"Failed to prepare upgrade for system {system.name}")
+                self.__logger.error("Fault code: %d" % err.faultCode)
+                self.__logger.error("Fault string: %s" % err.faultString)
+            return None
+
 
 class SystemUpgradeSchedulerFactory(SchedulerFactory):
+    def __init__(self):
+        self.__kickstart_cache = KickstartCache()
+
     def get_scheduler(self, client, system, schedule_date, args):
-        scheduler = SystemUpgradeScheduler(client, system, schedule_date)
+        scheduler = SystemUpgradeScheduler(client, system, schedule_date, self.__kickstart_cache)
         return scheduler
+
+    def get_bulk_scheduler(self, client, systems, schedule_date, args):
+        if not args.bulk:
+            return None
+        # the cache of the factory is shared by the bulk schedulers of every date and wave of the run
+        return SystemUpgradeBulkScheduler(client, systems, schedule_date, args.workers, self.__kickstart_cache)
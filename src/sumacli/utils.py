@@ -5,6 +5,8 @@ from .scheduler import SchedulerFactory, Scheduler
 
 
 class SystemPackageRefreshScheduler(Scheduler):
+    operation = "package_refresh"
+    description = "a package refresh"
 
     def __init__(self, client, system, date):
         self.__client = client
@@ -12,23 +14,29 @@ class SystemPackageRefreshScheduler(Scheduler):
         self.__date = date
         self.__logger = logging.getLogger(__name__)
 
-    def schedule(self):
+    def plan(self):
+        try:
+            return {"system_id": self.__system.get_id(self.__client)}
+        except ValueError as err:
+            self.__logger.error(err)
+            return None
+
+    def apply(self, plan):
         action_ids = []
         try:
-            action_ids.append(self.__client.system.schedulePackageRefresh(self.__system.get_id(self.__client), self.__date))
+            action_ids.append(self.__client.system.schedulePackageRefresh(plan['system_id'], self.__date))
             self.__logger.debug(f"Successfully scheduled package refresh with action ID {action_ids}")
         except Fault as err:
             self.__logger.error(f"Failed to schedule package refresh for system {self.__system.name}")
             self.__logger.error("Fault code: %d" % err.faultCode)
             self.__logger.error("Fault string: %s" % err.faultString)
             return None
-        except ValueError as err:
-            self.__logger.error(err)
-            return None
         return action_ids
 
 
 class SystemRebootScheduler(Scheduler):
+    operation = "reboot"
+    description = "reboot"
 
     def __init__(self, client, system, date):
         self.__client = client
@@ -36,19 +44,23 @@ class SystemRebootScheduler(Scheduler):
         self.__date = date
         self.__logger = logging.getLogger(__name__)
 
-    def schedule(self):
+    def plan(self):
+        try:
+            return {"system_id": self.__system.get_id(self.__client)}
+        except ValueError as err:
+            self.__logger.error(err)
+            return None
+
+    def apply(self, plan):
         action_ids = []
         try:
-            action_ids.append(self.__client.system.scheduleReboot(self.__system.get_id(self.__client), self.__date))
+            action_ids.append(self.__client.system.scheduleReboot(plan['system_id'], self.__date))
             self.__logger.debug(f"Successfully scheduled reboot with action ID {action_ids}")
         except Fault as err:
             self.__logger.error(f"Failed to schedule reboot for system {self.__system.name}")
             self.__logger.error("Fault code: %d" % err.faultCode)
             self.__logger.error("Fault string: %s" % err.faultString)
             return None
-        except ValueError as err:
-            self.__logger.error(err)
-            return None
         return action_ids
 
 
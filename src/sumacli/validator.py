@@ -1,13 +1,23 @@
+import json
 import logging
+import math
 import os
 import time
 import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# dimensions the latencies of the actions are reported by
+LATENCY_DIMENSIONS = ["operation", "base_product", "group"]
+
+ACTION_TIME_FORMATS = ["%Y%m%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"]
+
 
 class ActionIDFileManager:
-    def __init__(self, action_id_filename):
+    # action IDs in the order they were added, without duplicates: the systems of a bulk group share their actions
+    def __init__(self, action_id_filename, suffix=""):
         self.__action_ids = []
+        self.__known_action_ids = set()
         self.__logger = logging.getLogger(__name__)
         self.__action_id_filename = action_id_filename
         if action_id_filename is None:
@@ -15,23 +25,30 @@ class ActionIDFileManager:
             if not os.path.exists(actions_directory):
                 os.makedirs(actions_directory)
             self.__action_id_filename = (actions_directory +
-                                         "action_ids." + datetime.fromtimestamp(time.time()).isoformat())
+                                         "action_ids." + datetime.fromtimestamp(time.time()).isoformat() + suffix)
 
     def read(self):
         with open(self.__action_id_filename) as f:
             for line in f:
                 if line.strip() == '':
                     continue
-                self.__action_ids.append(int(line))
+                self.append(int(line))
         return self.__action_ids
 
     def append(self, action_id):
         if isinstance(action_id, list):
             for x in action_id:
-                self.__action_ids.append(x)
-        else:
+                self.append(x)
+        elif action_id not in self.__known_action_ids:
+            self.__known_action_ids.add(action_id)
             self.__action_ids.append(action_id)
 
+    def merge(self, action_id_filenames):
+        # combines the action IDs files of several runs, such as the shards of a run
+        for action_id_filename in action_id_filenames:
+            self.append(ActionIDFileManager(action_id_filename).read())
+        return self.__action_ids
+
     def save(self):
         if not self.__action_ids:
             return False
@@ -52,23 +69,24 @@ class ActionIDValidator:
     def __init__(self, client, action_id_file_manager):
         self.__client = client
         self.__action_id_file_manager = action_id_file_manager
+        self.__systems = {}
         self.__logger = logging.getLogger(__name__)
 
     def validate(self):
         self.__action_id_file_manager.read()
 
         found = False
-        systems = self.__list_systems(self.__client.schedule.listCompletedSystems)
+        systems = self.__list_systems("completed", self.__client.schedule.listCompletedSystems)
         if systems:
             self.__logger.info(f"The following systems have completed successfully: {systems}")
             found = True
 
-        systems = self.__list_systems(self.__client.schedule.listFailedSystems)
+        systems = self.__list_systems("failed", self.__client.schedule.listFailedSystems)
         if systems:
             self.__logger.error(f"The following systems have failed: {systems}")
             found = True
 
-        systems = self.__list_systems(self.__client.schedule.listInProgressSystems)
+        systems = self.__list_systems("in progress", self.__client.schedule.listInProgressSystems)
         if systems:
             self.__logger.warning(f"The following systems have actions in progress: {systems}")
             found = True
@@ -76,7 +94,11 @@ class ActionIDValidator:
         if not found:
             self.__logger.error(f"Action IDs not found.")
 
-    def __list_systems(self, func):
+    def get_systems(self):
+        # status of each system ID found by the last validation
+        return self.__systems
+
+    def __list_systems(self, status, func):
         action_ids = self.__action_id_file_manager.get_action_ids()
         systems = set()
         for action_id in action_ids:
@@ -85,6 +107,140 @@ class ActionIDValidator:
                 s = func(action_id)
             except xmlrpc.client.Fault as err:
                 self.__logger.error(f"Fault string: {err.faultString}")
-            if s:
-                systems.add(s[0]['server_name'])
+            for system in s or []:
+                systems.add(system['server_name'])
+                if system.get('server_id') is not None:
+                    self.__systems.setdefault(system['server_id'], status)
         return systems
+
+
+def parse_action_time(value):
+    # the API returns dates as XML-RPC dates or as formatted strings, depending on the method and version
+    if isinstance(value, xmlrpc.client.DateTime):
+        value = value.value
+    if isinstance(value, datetime) or not value:
+        return value or None
+    for time_format in ACTION_TIME_FORMATS:
+        try:
+            return datetime.strptime(str(value), time_format)
+        except ValueError:
+            continue
+    return None
+
+
+def get_percentile(sorted_values, percentile):
+    # nearest rank
+    return sorted_values[max(math.ceil(percentile / 100 * len(sorted_values)) - 1, 0)]
+
+
+class ActionLatencyCollector:
+    # queue delay (earliest time to pickup) and execution time (pickup to completion) of the actions of each system.
+    # The events of a system give the times of all its actions with a single call, the base product and groups come
+    # from the inventory when it is available
+
+    def __init__(self, client, workers=8, inventory=None):
+        self.__client = client
+        self.__workers = workers
+        self.__inventory = inventory
+        self.__logger = logging.getLogger(__name__)
+
+    def collect(self, action_ids, systems):
+        action_ids = set(action_ids)
+        samples = []
+        with ThreadPoolExecutor(max_workers=self.__workers) as executor:
+            for system_samples in executor.map(lambda system: self.__fetch_system(system, action_ids),
+                                               systems.items()):
+                samples += system_samples
+        return samples
+
+    def __fetch_system(self, system, action_ids):
+        system_id, status = system
+        try:
+            events = [e for e in self.__client.system.listSystemEvents(system_id) if e.get('id') in action_ids]
+            if not events:
+                return []
+            base_product, groups = self.__get_base_product_and_groups(system_id)
+        except xmlrpc.client.Fault as err:
+            self.__logger.error(f"Failed to get the actions of system {system_id}: {err.faultString}")
+            return []
+        samples = []
+        for event in events:
+            earliest = parse_action_time(event.get('earliest_action'))
+            pickup = parse_action_time(event.get('pickup_time'))
+            completion = parse_action_time(event.get('completion_time'))
+            samples.append({"system_id": system_id, "action_id": event['id'], "status": status,
+                            "operation": event.get('action_type') or "Unknown",
+                            "base_product": base_product or "Unknown", "groups": groups,
+                            "queue_delay": (pickup - earliest).total_seconds() if earliest and pickup else None,
+                            "execution_time": (completion - pickup).total_seconds() if pickup and completion
+                            else None})
+        return samples
+
+    def __get_base_product_and_groups(self, system_id):
+        if self.__inventory is not None:
+            base_product = self.__inventory.get_base_product(system_id)
+            groups = self.__inventory.get_system_groups(system_id)
+            if groups is not None:
+                return base_product, groups
+        base_product = None
+        for product in self.__client.system.getInstalledProducts(system_id):
+            if product['isBaseProduct']:
+                base_product = product['friendlyName']
+                break
+        groups = [g['system_group_name'] for g in self.__client.system.listGroups(system_id) if g['subscribed']]
+        return base_product, groups
+
+
+class LatencyReport:
+
+    def __init__(self, samples):
+        self.__samples = samples
+        self.__logger = logging.getLogger(__name__)
+
+    def get_distributions(self, dimension):
+        # p50, p95 and max of the queue delay and execution time in seconds of each value of a dimension. A system
+        # counts once in each of its groups
+        values = {}
+        for sample in self.__samples:
+            keys = (sample["groups"] or ["Ungrouped"]) if dimension == "group" else [sample[dimension]]
+            for key in keys:
+                for metric in ["queue_delay", "execution_time"]:
+                    if sample[metric] is not None:
+                        values.setdefault(key, {"queue_delay": [], "execution_time": []})[metric].append(
+                            sample[metric])
+        distributions = {}
+        for key, metrics in sorted(values.items()):
+            distributions[key] = {}
+            for metric, metric_values in metrics.items():
+                metric_values.sort()
+                distributions[key][metric] = {"count": len(metric_values),
+                                              "p50": get_percentile(metric_values, 50) if metric_values else None,
+                                              "p95": get_percentile(metric_values, 95) if metric_values else None,
+                                              "max": metric_values[-1] if metric_values else None}
+        return distributions
+
+    def to_dict(self):
+        return {"generated": datetime.now().isoformat(),
+                "actions": len({sample["action_id"] for sample in self.__samples}),
+                "systems": len({sample["system_id"] for sample in self.__samples}),
+                **{f"by_{dimension}": self.get_distributions(dimension) for dimension in LATENCY_DIMENSIONS}}
+
+    def log(self):
+        for key, metrics in self.get_distributions("operation").items():
+            for metric, distribution in metrics.items():
+                if distribution["count"]:
+                    self.__logger.info(f"{key} {metric.replace('_', ' ')} of {distribution['count']} action(s): "
+                                       f"p50 {distribution['p50']:.0f}s, p95 {distribution['p95']:.0f}s, "
+                                       f"max {distribution['max']:.0f}s")
+
+    def save(self, filename):
+        if filename is None:
+            reports_directory = "reports/"
+            if not os.path.exists(reports_directory):
+                os.makedirs(reports_directory)
+            filename = reports_directory + "latency." + datetime.fromtimestamp(time.time()).isoformat() + ".json"
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+        self.__logger.debug(f"Latency report file created: {filename}")
+        return filename
@@ -0,0 +1,53 @@
+import logging
+from datetime import timedelta
+
+
+class WaveScheduler:
+    ORDERS = ["input", "group", "canary"]
+
+    def __init__(self, window, slot_size, order="input"):
+        if slot_size < 1:
+            raise ValueError(f"Invalid number of systems per wave: {slot_size}")
+        if order not in self.ORDERS:
+            raise ValueError(f"Invalid wave order: {order}")
+        self.__window = window
+        self.__slot_size = slot_size
+        self.__order = order
+        self.__logger = logging.getLogger(__name__)
+
+    def spread(self, systems, start_date):
+        # sets the effective schedule date of each system, staggering slots evenly across the window
+        ordered = self.__ordered(systems)
+        slots = (len(ordered) + self.__slot_size - 1) // self.__slot_size
+        interval = self.__window / (slots - 1) if slots > 1 else timedelta(0)
+        for index, system in enumerate(ordered):
+            system.schedule_date = start_date + interval * (index // self.__slot_size)
+        if slots > 1:
+            self.__logger.info(f"{len(ordered)} systems spread in {slots} waves of up to {self.__slot_size} "
+                               f"systems every {interval} starting at {start_date}")
+        return ordered
+
+    def __ordered(self, systems):
+        if self.__order == "group":
+            # keeps members of a group together. Systems without a group go last
+            return sorted(systems, key=lambda s: (s.group is None, s.group or ""))
+        if self.__order == "canary":
+            # the first system of every group goes in the first waves, the rest follow in input order
+            canaries = []
+            others = []
+            seen_groups = set()
+            for system in systems:
+                if system.group is not None and system.group not in seen_groups:
+                    seen_groups.add(system.group)
+                    canaries.append(system)
+                else:
+                    others.append(system)
+            return canaries + others
+        return list(systems)
+
+
+def group_by_schedule_date(systems):
+    waves = {}
+    for system in systems:
+        waves.setdefault(system.schedule_date, []).append(system)
+    return sorted(waves.items(), key=lambda wave: wave[0])
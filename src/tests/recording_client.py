@@ -0,0 +1,50 @@
+import threading
+from collections import Counter
+
+
+class _RecordingMethod:
+    def __init__(self, client, name):
+        self.__client = client
+        self.__name = name
+
+    def __getattr__(self, name):
+        return _RecordingMethod(self.__client, "%s.%s" % (self.__name, name))
+
+    def __call__(self, *args):
+        return self.__client.record(self.__name, args)
+
+
+class RecordingClient:
+    # fake SumaClient that counts the calls of each API method. Responses are values or functions of the call
+    # arguments. A call to a method without a response fails the test
+
+    def __init__(self, responses):
+        self.__responses = responses
+        self.__calls = Counter()
+        self.__lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return _RecordingMethod(self, name)
+
+    def record(self, name, args):
+        with self.__lock:
+            self.__calls[name] += 1
+        if name not in self.__responses:
+            raise AssertionError(f"Unexpected API call: {name}{args}")
+        response = self.__responses[name]
+        return response(*args) if callable(response) else response
+
+    def get_calls(self):
+        with self.__lock:
+            return dict(self.__calls)
+
+    def reset_calls(self):
+        with self.__lock:
+            self.__calls.clear()
+
+
+def get_budget(systems, per_system, per_run=None):
+    # expected calls of each method for a run over the given number of systems
+    budget = Counter({method: calls * systems for method, calls in per_system.items()})
+    budget.update(per_run or {})
+    return {method: calls for method, calls in budget.items() if calls > 0}
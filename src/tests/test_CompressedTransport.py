@@ -0,0 +1,46 @@
+import gzip
+import io
+import unittest
+import xmlrpc.client
+from src.sumacli.transport import CompressedSafeTransport, CompressedTransport, get_transport
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, body, headers):
+        super().__init__(body)
+        self.__headers = headers
+
+    def getheader(self, name, default=None):
+        return self.__headers.get(name, default)
+
+
+class TestCompressedTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.errata = [{'id': i, 'advisory_name': f'SUSE-2023-{i}', 'advisory_type': 'Security Advisory'}
+                       for i in range(2000)]
+        self.body = xmlrpc.client.dumps((self.errata,), methodresponse=True).encode('utf-8')
+
+    def test_gzipResponseIsDecodedIncrementally(self):
+        transport = CompressedTransport()
+        transport.verbose = False
+        transport.read_size = 512
+
+        response = transport.parse_response(FakeResponse(gzip.compress(self.body), {"Content-Encoding": "gzip"}))
+
+        self.assertEqual((self.errata,), response)
+
+    def test_requestsAreOnlyCompressedWhenEnabled(self):
+        transport = CompressedTransport()
+        transport.verbose = False
+
+        # a compressed response does not show that the server decodes compressed requests
+        transport.parse_response(FakeResponse(gzip.compress(self.body), {"Content-Encoding": "gzip"}))
+        self.assertIsNone(transport.encode_threshold)
+
+        transport = get_transport("https://suma.suse.local/rpc/api", None, compress_requests=True)
+        self.assertEqual(transport.request_compression_threshold, transport.encode_threshold)
+
+    def test_getTransport(self):
+        self.assertIsInstance(get_transport("https://suma.suse.local/rpc/api", None), CompressedSafeTransport)
+        self.assertIsInstance(get_transport("http://suma.suse.local/rpc/api", None), CompressedTransport)
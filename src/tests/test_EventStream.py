@@ -0,0 +1,55 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+from src.sumacli.events import EventStream
+from src.sumacli.log_mgr import ErrorCollector
+
+
+class TestEventStream(unittest.TestCase):
+
+    def test_eventStreamWritesJsonLines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "events.jsonl")
+            event_stream = EventStream(filename)
+            event_stream.emit(operation="patch", system="mysystem.suse.local", action_ids=[1, 2])
+            event_stream.emit(operation="reboot", system="othersystem.suse.local", action_ids=[])
+            event_stream.close()
+
+            with open(filename) as f:
+                events = [json.loads(line) for line in f]
+            self.assertEqual(2, len(events))
+            self.assertEqual("mysystem.suse.local", events[0]["system"])
+            self.assertEqual([1, 2], events[0]["action_ids"])
+            self.assertIn("timestamp", events[1])
+
+    def test_errorCollectorOnlyCollectsErrorsWhileCollecting(self):
+        logger = logging.getLogger("test_errorCollector")
+        logger.propagate = False
+        collector = ErrorCollector()
+        logger.addHandler(collector)
+
+        logger.error("not collected")
+        with collector.collect() as errors:
+            logger.warning("a warning")
+            logger.error("Failed to schedule reboot for system mysystem.suse.local")
+        logger.error("not collected either")
+
+        self.assertEqual(["Failed to schedule reboot for system mysystem.suse.local"], errors)
+
+    def test_errorCollectorNests(self):
+        logger = logging.getLogger("test_errorCollectorNests")
+        logger.propagate = False
+        collector = ErrorCollector()
+        logger.addHandler(collector)
+
+        with collector.collect() as all_errors:
+            with collector.collect() as first_errors:
+                logger.error("first")
+            with collector.collect() as second_errors:
+                logger.error("second")
+
+        self.assertEqual(["first"], first_errors)
+        self.assertEqual(["second"], second_errors)
+        self.assertEqual(["first", "second"], all_errors)
@@ -0,0 +1,106 @@
+import unittest
+from datetime import datetime
+from unittest.mock import Mock
+from xmlrpc.client import DateTime
+from src.sumacli.advisory_type import AdvisoryType
+from src.sumacli.client_systems import System
+from src.sumacli.fingerprint import FingerprintStore, get_errata_fingerprint
+from src.sumacli.patching import SystemPatchingScheduler, SystemPatchingBulkScheduler
+from src.sumacli.scheduler import SKIPPED
+
+
+class TestFingerprintStore(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(2023, 3, 6, 10, 0, 0)
+        self.system = System("instance-k3s-1.suse.local", system_id=1000010001)
+        self.store = FingerprintStore(database_filename=":memory:")
+
+        self.client = Mock()
+        self.client.schedule.listInProgressActions.return_value = []
+        self.client.schedule.listInProgressSystems.return_value = []
+        self.client.schedule.listFailedSystems.return_value = []
+        self.client.system.getRelevantErrata.return_value = [
+            {'id': 2, 'advisory_name': 'SUSE-2023-2', 'advisory_type': 'Security Advisory'},
+            {'id': 1, 'advisory_name': 'SUSE-2023-1', 'advisory_type': 'Security Advisory'}]
+        self.client.errata.listKeywords.return_value = []
+        self.client.actionchain.createChain.return_value = 1
+        self.client.actionchain.addErrataUpdate.return_value = 500
+        self.client.actionchain.scheduleChain.return_value = 1
+        self.client.system.scheduleApplyErrata.return_value = [501]
+
+    def tearDown(self):
+        self.store.close()
+
+    def __set_in_progress(self, action_id, system):
+        # the previous action of the system is still pending, so the server lists it in progress too
+        self.client.schedule.listInProgressActions.return_value = [
+            {'id': action_id, 'earliest': DateTime('20230306T09:00:00')}]
+        self.client.schedule.listInProgressSystems.return_value = [
+            {'server_id': system.get_id(self.client), 'server_name': system.name}]
+
+    def __get_scheduler(self, unchanged_policy="skip"):
+        return SystemPatchingScheduler(self.client, self.system, self.date, [AdvisoryType.SECURITY], False, False,
+                                       "patching", self.store, unchanged_policy)
+
+    def test_fingerprintIgnoresErrataOrder(self):
+        self.assertEqual(get_errata_fingerprint([AdvisoryType.SECURITY], [1, 2]),
+                         get_errata_fingerprint([AdvisoryType.SECURITY], [2, 1]))
+        self.assertNotEqual(get_errata_fingerprint([AdvisoryType.SECURITY], [1, 2]),
+                            get_errata_fingerprint([AdvisoryType.ALL], [1, 2]))
+
+    def test_scheduledSystemIsRecorded(self):
+        self.assertEqual([500], self.__get_scheduler().schedule())
+
+        self.assertEqual((get_errata_fingerprint([AdvisoryType.SECURITY], [1, 2]), [500]),
+                         self.store.get(1000010001))
+
+    def test_unchangedPendingSystemIsSkipped(self):
+        self.__get_scheduler().schedule()
+        self.__set_in_progress(500, self.system)
+
+        with self.assertLogs("src.sumacli.patching", "WARNING"):
+            self.assertIs(SKIPPED, self.__get_scheduler().schedule())
+        self.assertEqual(1, self.client.actionchain.createChain.call_count)
+
+    def test_unchangedFailedSystemPolicies(self):
+        self.__get_scheduler().schedule()
+        self.client.schedule.listFailedSystems.return_value = [{'server_id': 1000010001}]
+
+        self.assertIs(SKIPPED, self.__get_scheduler("skip").schedule())
+        self.assertEqual([500], self.__get_scheduler("retry-failed").schedule())
+        self.assertEqual(2, self.client.actionchain.createChain.call_count)
+
+    def test_changedOrCompletedSystemIsScheduled(self):
+        self.__get_scheduler().schedule()
+        self.assertEqual([500], self.__get_scheduler().schedule())
+
+        self.client.schedule.listFailedSystems.return_value = [{'server_id': 1000010001}]
+        self.client.system.getRelevantErrata.return_value = [
+            {'id': 3, 'advisory_name': 'SUSE-2023-3', 'advisory_type': 'Security Advisory'}]
+        self.assertEqual([500], self.__get_scheduler().schedule())
+
+    def test_bulkSchedulerSkipsUnchangedSystems(self):
+        system2 = System("instance-k3s-2.suse.local", system_id=1000010002)
+        SystemPatchingBulkScheduler(self.client, [self.system, system2], self.date,
+                                    lambda system: [AdvisoryType.SECURITY], False, False, "patching", self.store,
+                                    "skip").schedule()
+        self.assertEqual([501], self.store.get(1000010002)[1])
+        self.__set_in_progress(501, system2)
+
+        results = SystemPatchingBulkScheduler(self.client, [self.system, system2], self.date,
+                                              lambda system: [AdvisoryType.SECURITY], False, False, "patching",
+                                              self.store, "skip").schedule()
+
+        self.assertEqual({self.system: [501], system2: SKIPPED}, results)
+        self.client.system.scheduleApplyErrata.assert_called_with([1000010001], [1, 2], self.date)
+
+    def test_changedPendingSystemIsStillInProgress(self):
+        self.__get_scheduler().schedule()
+        self.__set_in_progress(500, self.system)
+        self.client.system.getRelevantErrata.return_value = [
+            {'id': 3, 'advisory_name': 'SUSE-2023-3', 'advisory_type': 'Security Advisory'}]
+
+        with self.assertLogs("src.sumacli.patching", "ERROR"):
+            self.assertIsNone(self.__get_scheduler().schedule())
+        self.assertEqual(1, self.client.actionchain.createChain.call_count)
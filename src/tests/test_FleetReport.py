@@ -0,0 +1,95 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from src.sumacli.client_systems import System
+from src.sumacli.report import ErrataMatrix, ErrataCollector, FleetReport
+from src.tests.recording_client import RecordingClient, get_budget
+
+SLES = 'SUSE Linux Enterprise Server 15 SP5 x86_64'
+SLED = 'SUSE Linux Enterprise Desktop 15 SP5 x86_64'
+SECURITY = 'Security Advisory'
+BUGFIX = 'Bug Fix Advisory'
+
+
+def erratum(advisory_name, advisory_type):
+    return {'id': hash(advisory_name), 'advisory_name': advisory_name, 'advisory_type': advisory_type}
+
+
+class TestFleetReport(unittest.TestCase):
+
+    def setUp(self):
+        self.matrix = ErrataMatrix()
+        kernel = erratum('SUSE-2023-1', SECURITY)
+        openssl = erratum('SUSE-2023-2', SECURITY)
+        vim = erratum('SUSE-2023-3', BUGFIX)
+        self.matrix.add_system("sles-1", SLES, [kernel, vim])
+        self.matrix.add_system("sles-2", SLES, [vim, kernel])
+        self.matrix.add_system("sles-3", SLES, [openssl])
+        self.matrix.add_system("sled-1", SLED, [kernel, vim])
+        self.matrix.add_system("sled-2", SLED, [])
+        self.details = {'SUSE-2023-1': {'severity': 'Critical', 'reboot_suggested': True},
+                        'SUSE-2023-2': {'severity': 'moderate', 'reboot_suggested': False},
+                        'SUSE-2023-3': {'severity': None, 'reboot_suggested': False}}
+        self.report = FleetReport(self.matrix, self.details, ["critical"])
+
+    def test_advisoryCounts(self):
+        self.assertEqual([('SUSE-2023-1', 3), ('SUSE-2023-3', 3), ('SUSE-2023-2', 1)],
+                         [(a['advisory'], a['systems']) for a in self.report.get_advisories()])
+
+    def test_productCounts(self):
+        products = {(p['base_product'], p['type']): p for p in self.report.get_products()}
+
+        self.assertEqual({"base_product": SLES, "type": SECURITY, "systems": 3, "affected_systems": 3,
+                          "advisories": 2, "pending": 3}, products[(SLES, SECURITY)])
+        self.assertEqual(1, products[(SLED, BUGFIX)]["affected_systems"])
+        self.assertEqual(2, products[(SLED, BUGFIX)]["systems"])
+
+    def test_criticalSecurityAndReboot(self):
+        self.assertEqual([{"system": "sles-1", "base_product": SLES, "advisories": ['SUSE-2023-1']},
+                          {"system": "sles-2", "base_product": SLES, "advisories": ['SUSE-2023-1']},
+                          {"system": "sled-1", "base_product": SLED, "advisories": ['SUSE-2023-1']}],
+                         self.report.get_critical())
+        summary = self.report.get_summary()
+        self.assertEqual((5, 3, 4, 3, 3), (summary['systems'], summary['advisories'],
+                                           summary['systems_with_pending_advisories'],
+                                           summary['systems_missing_critical_security'],
+                                           summary['systems_requiring_reboot']))
+
+    def test_clustersOfIdenticalSystems(self):
+        # same advisories but a different base product is not the same cluster
+        self.assertEqual([{"base_product": SLES, "advisories": 2, "systems": ["sles-1", "sles-2"]}],
+                         self.report.get_clusters())
+
+    def test_saveReport(self):
+        with tempfile.TemporaryDirectory() as directory:
+            json_filename = self.report.save(os.path.join(directory, "report.json"))
+            csv_filename = self.report.save(os.path.join(directory, "report.csv"), "csv", "critical")
+            with open(json_filename) as f:
+                data = json.load(f)
+            with open(csv_filename) as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(3, data['summary']['advisories'])
+        self.assertEqual(["advisories", "clusters", "critical", "products", "summary"], sorted(data.keys()))
+        self.assertEqual({"system": "sles-1", "base_product": SLES, "advisories": 'SUSE-2023-1'}, rows[0])
+
+    def test_collectorBudget(self):
+        client = RecordingClient({
+            "system.getInstalledProducts": lambda system_id: [{'friendlyName': SLES, 'isBaseProduct': True}],
+            "system.getRelevantErrata": lambda system_id: [erratum('SUSE-2023-1', SECURITY),
+                                                           erratum(f'SUSE-2023-{system_id % 3 + 2}', BUGFIX)],
+            "errata.listKeywords": lambda name: ['reboot_suggested'] if name == 'SUSE-2023-1' else [],
+            "errata.getDetails": lambda name: {'severity': 'Critical'},
+        })
+        systems = [System(f"instance-{i}", system_id=i) for i in range(30)]
+
+        matrix, details = ErrataCollector(client, 4).collect(systems)
+
+        self.assertEqual(30, len(matrix.get_systems()))
+        self.assertEqual(4, len(matrix.get_advisories()))
+        self.assertEqual({'severity': 'Critical', 'reboot_suggested': True}, details['SUSE-2023-1'])
+        self.assertEqual(get_budget(30, {"system.getInstalledProducts": 1, "system.getRelevantErrata": 1},
+                                    {"errata.listKeywords": 4, "errata.getDetails": 1}),
+                         client.get_calls())
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import Mock, patch
+from src.sumacli.client_systems import System, SystemListParser
+from src.sumacli.inventory import Inventory
+from src.sumacli.patching import get_advisory_types_for_system
+from src.sumacli.advisory_type import AdvisoryType
+
+
+class TestInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.system1 = "instance-k3s-1.suse.local"
+        self.system2 = "instance-k3s-2.suse.local"
+        self.client = Mock()
+        self.client.system.listSystems.return_value = [
+            {'id': 1000010001, 'name': self.system1, 'last_checkin': '20230306T10:00:00'},
+            {'id': 1000010002, 'name': self.system2, 'last_checkin': '20230306T10:05:00'}]
+        self.client.systemgroup.listAllGroups.return_value = [{'name': 'k3s'}, {'name': 'empty'}]
+        self.members = {'k3s': [1000010001, 1000010002], 'empty': []}
+        self.client.systemgroup.listSystemsMinimal.side_effect = lambda group: [
+            {'id': system_id} for system_id in self.members[group]]
+        self.client.system.getInstalledProducts.return_value = [
+            {'friendlyName': 'SUSE Linux Enterprise Server 15 SP5 x86_64', 'isBaseProduct': True}]
+        self.inventory = Inventory(database_filename=":memory:")
+
+    def tearDown(self):
+        self.inventory.close()
+
+    def test_inventoryIsNotFreshBeforeSync(self):
+        self.assertFalse(self.inventory.is_fresh(3600))
+
+    def test_inventorySync(self):
+        self.assertEqual((2, 0), self.inventory.sync(self.client, workers=1))
+
+        self.assertTrue(self.inventory.is_fresh(3600))
+        self.assertEqual(1000010002, self.inventory.get_system_id(self.system2))
+        self.assertEqual('SUSE Linux Enterprise Server 15 SP5 x86_64', self.inventory.get_base_product(1000010001))
+        self.assertEqual([1000010001, 1000010002], [s['id'] for s in self.inventory.get_group_systems('k3s')])
+        self.assertEqual([], self.inventory.get_group_systems('empty'))
+        self.assertIsNone(self.inventory.get_group_systems('unknown'))
+
+    def test_inventorySyncIsIncremental(self):
+        self.inventory.sync(self.client, workers=1)
+        self.client.system.listSystems.return_value = [
+            {'id': 1000010001, 'name': self.system1, 'last_checkin': '20230307T10:00:00'}]
+
+        self.assertEqual((1, 1), self.inventory.sync(self.client, workers=1))
+        self.assertEqual(3, self.client.system.getInstalledProducts.call_count)
+        self.assertIsNone(self.inventory.get_system_id(self.system2))
+        self.assertEqual([1000010001], [s['id'] for s in self.inventory.get_group_systems('k3s')])
+
+    def test_inventorySyncRefreshesGroupsWithoutCheckin(self):
+        self.inventory.sync(self.client, workers=1)
+        self.members = {'k3s': [1000010001], 'empty': [1000010002]}
+
+        self.assertEqual((0, 0), self.inventory.sync(self.client, workers=1))
+        self.assertEqual(2, self.client.system.getInstalledProducts.call_count)
+        self.assertEqual([1000010001], [s['id'] for s in self.inventory.get_group_systems('k3s')])
+        self.assertEqual(['empty'], self.inventory.get_system_groups(1000010002))
+        self.assertEqual(4, self.client.systemgroup.listSystemsMinimal.call_count)
+
+    def test_inventorySyncInBatches(self):
+        self.client.system.listSystems.return_value = [
+            {'id': i, 'name': f"instance-{i}.suse.local", 'last_checkin': '20230306T10:00:00'} for i in range(5)]
+
+        with patch("src.sumacli.inventory.SYNC_BATCH_SIZE", 2):
+            self.assertEqual((5, 0), self.inventory.sync(self.client, workers=2))
+        self.assertEqual(5, self.inventory.count_systems())
+
+    def test_systemListParserReadsFromInventory(self):
+        self.inventory.sync(self.client, workers=1)
+        client = Mock()
+        parser = SystemListParser(client, "not-used-filename", self.inventory)
+
+        parser._add_system(["group:k3s", "now"])
+        parser._add_system([self.system2, "now"])
+        systems = parser.get_systems()["now"]
+
+        self.assertEqual([1000010001, 1000010002, 1000010002], [s.get_id(client) for s in systems])
+        client.systemgroup.listSystems.assert_not_called()
+        client.system.getId.assert_not_called()
+
+    def test_advisoryTypesFromInventory(self):
+        self.inventory.sync(self.client, workers=1)
+        client = Mock()
+        policy = {'SUSE Linux Enterprise Server 15 SP5 x86_64': [AdvisoryType.ALL]}
+
+        advisory_types = get_advisory_types_for_system(client, System(self.system1, system_id=1000010001), policy,
+                                                       self.inventory)
+
+        self.assertEqual([AdvisoryType.ALL], advisory_types)
+        client.system.getInstalledProducts.assert_not_called()
@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+import unittest
+from xmlrpc.client import DateTime
+from src.sumacli.validator import ActionLatencyCollector, LatencyReport, parse_action_time
+from src.tests.recording_client import RecordingClient, get_budget
+
+SLES = 'SUSE Linux Enterprise Server 15 SP5 x86_64'
+
+
+def get_events(system_id):
+    # system N waits N minutes to pick up its patching and runs it for 2 minutes, then reboots
+    return [{'id': 500, 'action_type': 'Patch Update', 'earliest_action': DateTime('20230306T10:00:00'),
+             'pickup_time': f'2023-03-06 10:{system_id:02d}:00.0',
+             'completion_time': f'2023-03-06 10:{system_id + 2:02d}:00.0'},
+            {'id': 501, 'action_type': 'System reboot', 'earliest_action': '2023-03-06 10:00:00.0',
+             'pickup_time': None, 'completion_time': None},
+            {'id': 400, 'action_type': 'Package List Refresh', 'earliest_action': '2023-03-01 10:00:00.0',
+             'pickup_time': '2023-03-01 10:00:00.0', 'completion_time': '2023-03-01 10:00:30.0'}]
+
+
+class TestLatencyReport(unittest.TestCase):
+
+    def setUp(self):
+        self.client = RecordingClient({
+            "system.listSystemEvents": get_events,
+            "system.getInstalledProducts": [{'friendlyName': SLES, 'isBaseProduct': True}],
+            "system.listGroups": lambda system_id: [
+                {'system_group_name': 'prod', 'subscribed': 1},
+                {'system_group_name': 'even' if system_id % 2 == 0 else 'odd', 'subscribed': 1},
+                {'system_group_name': 'test', 'subscribed': 0}],
+        })
+        systems = {system_id: "completed" for system_id in range(1, 21)}
+        self.samples = ActionLatencyCollector(self.client, 4).collect([500, 501], systems)
+        self.report = LatencyReport(self.samples)
+
+    def test_collectorBudget(self):
+        self.assertEqual(40, len(self.samples))
+        self.assertEqual(get_budget(20, {"system.listSystemEvents": 1, "system.getInstalledProducts": 1,
+                                         "system.listGroups": 1}),
+                         self.client.get_calls())
+
+    def test_distributionsByOperationAndGroup(self):
+        operations = self.report.get_distributions("operation")
+        groups = self.report.get_distributions("group")
+
+        self.assertEqual({"count": 20, "p50": 600.0, "p95": 1140.0, "max": 1200.0},
+                         operations["Patch Update"]["queue_delay"])
+        self.assertEqual({"count": 20, "p50": 120.0, "p95": 120.0, "max": 120.0},
+                         operations["Patch Update"]["execution_time"])
+        self.assertNotIn("System reboot", operations)
+        self.assertEqual(["even", "odd", "prod"], sorted(groups.keys()))
+        self.assertEqual(1140.0, groups["odd"]["queue_delay"]["max"])
+        self.assertEqual(20, self.report.get_distributions("base_product")[SLES]["queue_delay"]["count"])
+
+    def test_saveReport(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = self.report.save(os.path.join(directory, "latency.json"))
+            with open(filename) as f:
+                data = json.load(f)
+
+        self.assertEqual((2, 20), (data["actions"], data["systems"]))
+        self.assertEqual(["by_base_product", "by_group", "by_operation"], sorted(k for k in data if k.startswith("by")))
+
+    def test_parseActionTime(self):
+        self.assertEqual(parse_action_time(DateTime('20230306T10:00:00')), parse_action_time('2023-03-06 10:00:00'))
+        self.assertIsNone(parse_action_time(None))
+        self.assertIsNone(parse_action_time('not a date'))
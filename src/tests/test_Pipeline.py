@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+from src.sumacli.pipeline import Pipeline, PipelineStage
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_itemsGoThroughAllStages(self):
+        pipeline = Pipeline([PipelineStage("resolve", lambda item: item.append("resolve"), 2),
+                             PipelineStage("inspect", lambda item: item.append("inspect"), 3),
+                             PipelineStage("schedule", lambda item: item.append("schedule"), 1)], queue_size=2)
+        items = [[] for _ in range(20)]
+
+        finished = pipeline.run(items)
+
+        self.assertEqual(20, len(finished))
+        self.assertTrue(all(item == ["resolve", "inspect", "schedule"] for item in items))
+        self.assertEqual([20, 20, 20], [stats["processed"] for stats in pipeline.get_stats()])
+
+    def test_failedItemsStopAtTheirStage(self):
+        scheduled = []
+        pipeline = Pipeline([PipelineStage("inspect", lambda item: item % 2 == 0, 2),
+                             PipelineStage("schedule", scheduled.append, 1)])
+        finished_items = []
+
+        finished = pipeline.run(range(10), finished_items.append)
+
+        self.assertEqual([0, 2, 4, 6, 8], sorted(scheduled))
+        self.assertEqual([], finished)
+        self.assertEqual(list(range(10)), sorted(finished_items))
+        self.assertEqual({"stage": "inspect", "processed": 10, "passed": 5},
+                         {k: pipeline.get_stats()[0][k] for k in ["stage", "processed", "passed"]})
+
+    def test_exceptionsDoNotStopThePipeline(self):
+        def inspect(item):
+            if item == 3:
+                raise ValueError("No such system")
+
+        pipeline = Pipeline([PipelineStage("inspect", inspect, 2), PipelineStage("schedule", lambda item: True, 1)])
+
+        self.assertEqual(5, len(pipeline.run(range(5))))
+        self.assertEqual(4, pipeline.get_stats()[1]["processed"])
+
+    def test_boundedQueuesHoldBackEarlierStages(self):
+        resolved = []
+        release = threading.Event()
+        pipeline = Pipeline([PipelineStage("resolve", resolved.append, 1),
+                             PipelineStage("schedule", lambda item: release.wait(), 1)], queue_size=2)
+        thread = threading.Thread(target=pipeline.run, args=(range(10),))
+        thread.start()
+        time.sleep(0.2)
+
+        # one item being scheduled, two queued and one held by the resolve worker
+        self.assertLessEqual(len(resolved), 4)
+        release.set()
+        thread.join()
+        self.assertEqual(10, len(resolved))
+        self.assertLessEqual(pipeline.get_stats()[1]["max_queue_depth"], 2)
+
+    def test_queueDepthDoesNotCountStopMarkers(self):
+        # the first item keeps the worker busy until the other two and the stop marker are queued
+        pipeline = Pipeline([PipelineStage("schedule", lambda item: time.sleep(0.1) if item == 0 else None, 1)])
+
+        pipeline.run(range(3))
+
+        self.assertEqual(2, pipeline.get_stats()[0]["max_queue_depth"])
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import Mock
+from src.sumacli.client_systems import System
+from src.sumacli.plan import Planner, PlanFileManager
+from src.sumacli.scheduler import SKIPPED
+
+
+class TestPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(2023, 3, 6, 10, 0, 0)
+        self.system1 = System("instance-k3s-1.suse.local", "target1")
+        self.system2 = System("instance-k3s-2.suse.local", group="k3s")
+        for system in [self.system1, self.system2]:
+            system.schedule_date = self.date
+
+    def test_plannerAddsSystemDataToPlans(self):
+        factory = Mock()
+        factory.get_scheduler.return_value.plan.side_effect = [{"system_id": 1}, {"system_id": 2}]
+
+        results = Planner(Mock(), factory, Mock(), 1).plan([self.system1, self.system2])
+
+        self.assertEqual(self.system1, results[0][0])
+        self.assertEqual({"system_id": 1, "name": self.system1.name, "target": "target1", "kopts": None,
+                          "group": None}, results[0][1])
+        self.assertEqual("k3s", results[1][1]["group"])
+
+    def test_plannerFailedSystems(self):
+        factory = Mock()
+        factory.get_scheduler.side_effect = [ValueError("No migration target"), Mock(**{"plan.return_value": None})]
+
+        results = Planner(Mock(), factory, Mock(), 2).plan([self.system1, self.system2])
+
+        self.assertIsNone(results[0][1])
+        self.assertIsNone(results[1][1])
+
+    def test_plannerSkippedSystems(self):
+        factory = Mock()
+        factory.get_scheduler.return_value.plan.return_value = SKIPPED
+
+        results = Planner(Mock(), factory, Mock(), 1).plan([self.system1])
+
+        self.assertIs(SKIPPED, results[0][1])
+
+    def test_planFileRoundTrip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "plan.json")
+            plan_file_manager = PlanFileManager(filename)
+            plan_file_manager.append({"name": self.system1.name, "system_id": 1, "errata_ids": [7, 8]})
+
+            self.assertTrue(plan_file_manager.save("patch", {"security": True, "func": print}))
+
+            plan_file_manager = PlanFileManager(filename)
+            entries = plan_file_manager.read()
+            self.assertEqual("patch", plan_file_manager.get_operation())
+            self.assertEqual({"security": True}, plan_file_manager.get_options())
+            self.assertEqual([7, 8], entries[0]["errata_ids"])
+
+    def test_emptyPlanIsNotSaved(self):
+        self.assertFalse(PlanFileManager("not-used-filename").save("patch", {}))
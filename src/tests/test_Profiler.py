@@ -0,0 +1,60 @@
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from src.sumacli.profiler import Profiler, PROCESS_WIDE_PROFILE
+
+
+def build_schedule(count):
+    return [f"instance-{i},2023-03-06 10:00:00" for i in range(count)]
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_profilesWorkerThreadsAndAllocations(self):
+        profiler = Profiler(sample_interval=0.01)
+        profiler.start()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            schedules = list(executor.map(build_schedule, [20000, 20000]))
+        profiler.stop()
+
+        with tempfile.TemporaryDirectory() as directory:
+            prefix = profiler.save(os.path.join(directory, "profile"))
+            stats = pstats.Stats(prefix + ".pstats")
+            with open(prefix + ".txt") as f:
+                summary = f.read()
+
+        self.assertEqual(2, len(schedules))
+        self.assertIn("build_schedule", [function for _, _, function in stats.stats.keys()])
+        self.assertIn("Hot functions by own time", summary)
+        self.assertIn("Top allocators", summary)
+        self.assertIn("test_Profiler.py", summary)
+
+    @unittest.skipUnless(sys.version_info >= (3, 12), "a profile covers all the threads since Python 3.12")
+    def test_singleProfileForAllThreadsOnPython312(self):
+        self.assertTrue(PROCESS_WIDE_PROFILE)
+        profiler = Profiler(sample_interval=0.01)
+        profiler.start()
+        # a profile per thread would fail here with "Another profiling tool is already active" and lose the thread
+        worker = threading.Thread(target=build_schedule, args=(20000,))
+        worker.start()
+        worker.join()
+        profiler.stop()
+
+        stats = profiler.get_stats()
+        self.assertIn("build_schedule", [function for _, _, function in stats.stats.keys()])
+        self.assertIn("profiled threads: all", profiler.get_summary())
+
+    @unittest.skipUnless(sys.version_info >= (3, 12), "only one profile can be enabled since Python 3.12")
+    def test_startFailsWhenAnotherProfilerIsActive(self):
+        other = cProfile.Profile()
+        other.enable()
+        try:
+            with self.assertRaises(ValueError):
+                Profiler(sample_interval=0.01).start()
+        finally:
+            other.disable()
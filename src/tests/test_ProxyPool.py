@@ -0,0 +1,55 @@
+import threading
+import unittest
+from unittest.mock import Mock
+from xmlrpc.client import Fault
+from src.sumacli.client import ProxyPool
+
+
+class TestProxyPool(unittest.TestCase):
+
+    def setUp(self):
+        self.proxies = []
+        self.pool = ProxyPool(self.__create_proxy)
+
+    def __create_proxy(self):
+        proxy = Mock()
+        self.proxies.append(proxy)
+        return proxy
+
+    def __run_command(self, threads):
+        # like a daemon command, every command starts its own worker threads
+        barrier = threading.Barrier(threads)
+
+        def work():
+            with self.pool.acquire():
+                barrier.wait()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def test_proxiesAreReusedAcrossThreadsAndCommands(self):
+        self.__run_command(4)
+        self.__run_command(4)
+        self.__run_command(2)
+
+        self.assertEqual(4, self.pool.get_created())
+
+    def test_faultKeepsTheProxy(self):
+        with self.assertRaises(Fault):
+            with self.pool.acquire():
+                raise Fault(2800, "No such system")
+        with self.pool.acquire() as proxy:
+            self.assertIs(self.proxies[0], proxy)
+
+    def test_brokenConnectionIsNotReused(self):
+        with self.assertRaises(ConnectionResetError):
+            with self.pool.acquire():
+                raise ConnectionResetError()
+        self.proxies[0].assert_called_once_with("close")
+
+        with self.pool.acquire() as proxy:
+            self.assertIsNot(self.proxies[0], proxy)
+        self.assertEqual(2, self.pool.get_created())
@@ -0,0 +1,278 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from xmlrpc.client import DateTime
+from src.sumacli.client_systems import System
+from src.sumacli.fingerprint import FingerprintStore
+from src.sumacli.migration import ProductMigrationSchedulerFactory
+from src.sumacli.patching import PatchingSchedulerFactory, ProductPatchingPolicyParser
+from src.sumacli.scheduler import SKIPPED
+from src.sumacli.upgrade import SystemUpgradeSchedulerFactory
+from src.sumacli.utils import UtilsSchedulerFactory
+from src.sumacli.validator import ActionIDFileManager, ActionIDValidator
+from src.tests.recording_client import RecordingClient, get_budget
+
+FLEET_SIZE = 50
+BASE_PRODUCT = 'SUSE Linux Enterprise Server 15 SP5 x86_64'
+
+
+def get_fleet(target=None, kopts=None):
+    return [System(f"instance-{i}.suse.local", target, kopts) for i in range(FLEET_SIZE)]
+
+
+def get_system_id(name):
+    return [{'id': 1000010000 + int(name.split('.')[0].split('-')[1])}]
+
+
+def get_system_name(system_id):
+    return f"instance-{system_id - 1000010000}.suse.local"
+
+
+class TestPatchingRpcBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(2023, 3, 6, 10, 0, 0)
+        self.pending = set()
+        self.client = RecordingClient({
+            "schedule.listInProgressActions": lambda: [
+                {'id': 500, 'earliest': DateTime('20230306T09:00:00')}] if self.pending else [],
+            "schedule.listInProgressSystems": lambda action_id: [
+                {'server_id': s, 'server_name': get_system_name(s)} for s in self.pending],
+            "schedule.listFailedSystems": [],
+            "system.getId": get_system_id,
+            "system.getInstalledProducts": lambda system_id: [{'friendlyName': BASE_PRODUCT, 'isBaseProduct': True}],
+            "system.getRelevantErrata": lambda system_id: [
+                {'id': i, 'advisory_name': f'SUSE-2023-{i}', 'advisory_type': 'Security Advisory'} for i in (1, 2, 3)],
+            "errata.listKeywords": lambda name: ['reboot_suggested'] if name == 'SUSE-2023-2' else [],
+            "actionchain.createChain": 1,
+            "actionchain.addErrataUpdate": 500,
+            "actionchain.addSystemReboot": 501,
+            "actionchain.scheduleChain": 1,
+        })
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        policy_filename = os.path.join(directory.name, "policy.conf")
+        with open(policy_filename, "w") as f:
+            f.write(f"{BASE_PRODUCT},security\n")
+        self.args = argparse.Namespace(policy=policy_filename, security=False, bugfix=False, enhancement=False,
+                                       all_patches=False, reboot=False, no_reboot=False, unchanged="skip", bulk=False)
+        self.store = FingerprintStore(database_filename=":memory:")
+        self.addCleanup(self.store.close)
+
+    def __schedule(self, factory):
+        return [factory.get_scheduler(self.client, system, self.date, self.args).schedule() for system in get_fleet()]
+
+    def test_patchingBudget(self):
+        with patch.object(ProductPatchingPolicyParser, "parse", autospec=True,
+                          side_effect=ProductPatchingPolicyParser.parse) as parse:
+            results = self.__schedule(PatchingSchedulerFactory(fingerprint_store=self.store))
+
+        self.assertEqual([[500, 501]] * FLEET_SIZE, results)
+        self.assertEqual(1, parse.call_count)
+        self.assertEqual(get_budget(FLEET_SIZE, {"schedule.listInProgressActions": 1, "system.getId": 1,
+                                                 "system.getInstalledProducts": 1, "system.getRelevantErrata": 1,
+                                                 "errata.listKeywords": 2, "actionchain.createChain": 1,
+                                                 "actionchain.addErrataUpdate": 1, "actionchain.addSystemReboot": 1,
+                                                 "actionchain.scheduleChain": 1}),
+                         self.client.get_calls())
+
+    def test_policyIsParsedOnceByConcurrentWorkers(self):
+        factory = PatchingSchedulerFactory()
+        parse = ProductPatchingPolicyParser.parse
+
+        def slow_parse(parser):
+            time.sleep(0.05)
+            return parse(parser)
+
+        with patch.object(ProductPatchingPolicyParser, "parse", autospec=True, side_effect=slow_parse) as mock_parse:
+            workers = [threading.Thread(target=factory.get_scheduler, args=(self.client, system, self.date, self.args))
+                       for system in get_fleet()[:4]]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual(1, mock_parse.call_count)
+
+    def test_unchangedPatchingBudget(self):
+        factory = PatchingSchedulerFactory(fingerprint_store=self.store)
+        self.__schedule(factory)
+        self.pending = {system_id for system_id in range(1000010000, 1000010000 + FLEET_SIZE)}
+        self.client.reset_calls()
+
+        self.assertEqual([SKIPPED] * FLEET_SIZE, self.__schedule(factory))
+        self.assertEqual(get_budget(FLEET_SIZE, {"system.getId": 1, "system.getInstalledProducts": 1,
+                                                 "system.getRelevantErrata": 1, "schedule.listInProgressSystems": 1}),
+                         self.client.get_calls())
+
+    def test_bulkPatchingBudget(self):
+        self.args.bulk = True
+        factory = PatchingSchedulerFactory()
+
+        results = factory.get_bulk_scheduler(self.client, get_fleet(), self.date, self.args).schedule()
+
+        self.assertEqual([[500, 501]] * FLEET_SIZE, list(results.values()))
+        self.assertEqual(get_budget(FLEET_SIZE, {"system.getId": 1, "system.getInstalledProducts": 1,
+                                                 "system.getRelevantErrata": 1, "actionchain.addSystemReboot": 1},
+                                    {"schedule.listInProgressActions": 1, "errata.listKeywords": 2,
+                                     "actionchain.createChain": 1, "actionchain.addErrataUpdate": 1,
+                                     "actionchain.scheduleChain": 1}),
+                         self.client.get_calls())
+
+
+class TestProductMigrationRpcBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(2023, 3, 6, 10, 0, 0)
+        self.client = RecordingClient({
+            "system.getId": get_system_id,
+            "system.listMigrationTargets": lambda system_id: [{'ident': 'sles15-sp5'}],
+            "system.scheduleProductMigration": lambda *args: 600,
+        })
+        self.args = argparse.Namespace(dry_run=False, list_migration_targets=False)
+
+    def __schedule(self, fleet):
+        factory = ProductMigrationSchedulerFactory()
+        return [factory.get_scheduler(self.client, system, self.date, self.args).schedule() for system in fleet]
+
+    def test_migrationBudget(self):
+        self.assertEqual([[600]] * FLEET_SIZE, self.__schedule(get_fleet("sle-product-sles15-sp5-pool-x86_64")))
+        self.assertEqual(get_budget(FLEET_SIZE, {"system.getId": 1, "system.scheduleProductMigration": 1}),
+                         self.client.get_calls())
+
+    def test_migrationWithIdentBudget(self):
+        self.assertEqual([[600]] * FLEET_SIZE,
+                         self.__schedule(get_fleet("sle-product-sles15-sp5-pool-x86_64", "sles15-sp5")))
+        self.assertEqual(get_budget(FLEET_SIZE, {"system.getId": 1, "system.listMigrationTargets": 1,
+                                                 "system.scheduleProductMigration": 1}),
+                         self.client.get_calls())
+
+
+class TestSystemUpgradeRpcBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(2023, 3, 6, 10, 0, 0)
+        self.client = RecordingClient({
+            "system.getId": get_system_id,
+            "kickstart.profile.getVariables": lambda target: {'org': 1},
+            "kickstart.profile.getKickstartTree": lambda target: "sles15-sp5",
+            "kickstart.tree.getDetails": lambda label: {'kernel_options': 'quiet',
+                                                        'install_type': {'label': 'sles15generic'}},
+            "system.createSystemRecord": lambda system_id, target: 1,
+            "system.obtainReactivationKey": lambda system_id: "re-key",
+            "system.setVariables": lambda *args: 1,
+            "system.setPillar": lambda *args: 1,
+            "system.scheduleApplyStates": lambda *args: 700,
+        })
+        self.args = argparse.Namespace(bulk=True, workers=8)
+        config_manager_patcher = patch("src.sumacli.upgrade.ConfigManager")
+        config_manager_patcher.start().return_value.manager_fqdn = "suma.suse.local"
+        self.addCleanup(config_manager_patcher.stop)
+        self.per_system = {"system.getId": 1, "system.createSystemRecord": 1, "system.obtainReactivationKey": 1,
+                           "system.setVariables": 1, "system.setPillar": 1}
+        self.per_run = {"kickstart.profile.getVariables": 1, "kickstart.profile.getKickstartTree": 1,
+                        "kickstart.tree.getDetails": 1}
+
+    def test_upgradeBudget(self):
+        factory = SystemUpgradeSchedulerFactory()
+
+        results = [factory.get_scheduler(self.client, system, self.date, self.args).schedule()
+                   for system in get_fleet("sles15-sp5-upgrade")]
+
+        self.assertEqual([[700]] * FLEET_SIZE, results)
+        self.assertEqual(get_budget(FLEET_SIZE, {**self.per_system, "system.scheduleApplyStates": 1}, self.per_run),
+                         self.client.get_calls())
+
+    def test_bulkUpgradeBudget(self):
+        fleet = get_fleet("sles15-sp5-upgrade")
+        bulk_scheduler = SystemUpgradeSchedulerFactory().get_bulk_scheduler(self.client, fleet, self.date, self.args)
+
+        self.assertEqual([[700]] * FLEET_SIZE, list(bulk_scheduler.schedule().values()))
+        self.assertEqual(get_budget(FLEET_SIZE, self.per_system, {**self.per_run, "system.scheduleApplyStates": 1}),
+                         self.client.get_calls())
+
+    def test_bulkUpgradeWavesShareKickstartData(self):
+        fleet = get_fleet("sles15-sp5-upgrade")
+        factory = SystemUpgradeSchedulerFactory()
+
+        for wave in (fleet[:FLEET_SIZE // 2], fleet[FLEET_SIZE // 2:]):
+            factory.get_bulk_scheduler(self.client, wave, self.date, self.args).schedule()
+
+        self.assertEqual(get_budget(FLEET_SIZE, self.per_system, {**self.per_run, "system.scheduleApplyStates": 2}),
+                         self.client.get_calls())
+
+
+class TestUtilsRpcBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(2023, 3, 6, 10, 0, 0)
+        self.client = RecordingClient({
+            "system.getId": get_system_id,
+            "system.schedulePackageRefresh": lambda system_id, date: 800,
+            "system.scheduleReboot": lambda system_id, date: 801,
+        })
+
+    def __schedule(self, package_refresh, reboot):
+        factory = UtilsSchedulerFactory()
+        args = argparse.Namespace(package_refresh=package_refresh, reboot=reboot)
+        return [factory.get_scheduler(self.client, system, self.date, args).schedule() for system in get_fleet()]
+
+    def test_packageRefreshBudget(self):
+        self.assertEqual([[800]] * FLEET_SIZE, self.__schedule(True, False))
+        self.assertEqual(get_budget(FLEET_SIZE, {"system.getId": 1, "system.schedulePackageRefresh": 1}),
+                         self.client.get_calls())
+
+    def test_rebootBudget(self):
+        self.assertEqual([[801]] * FLEET_SIZE, self.__schedule(False, True))
+        self.assertEqual(get_budget(FLEET_SIZE, {"system.getId": 1, "system.scheduleReboot": 1}),
+                         self.client.get_calls())
+
+
+class TestActionIDValidatorRpcBudget(unittest.TestCase):
+
+    def test_validationBudget(self):
+        client = RecordingClient({
+            "schedule.listCompletedSystems": lambda action_id: [{'server_name': f"instance-{action_id}.suse.local"}],
+            "schedule.listFailedSystems": [],
+            "schedule.listInProgressSystems": [],
+        })
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "action_ids")
+            action_id_file_manager = ActionIDFileManager(filename)
+            action_id_file_manager.append(list(range(500, 500 + FLEET_SIZE)))
+            action_id_file_manager.save()
+
+            ActionIDValidator(client, ActionIDFileManager(filename)).validate()
+
+        self.assertEqual(get_budget(FLEET_SIZE, {"schedule.listCompletedSystems": 1, "schedule.listFailedSystems": 1,
+                                                 "schedule.listInProgressSystems": 1}),
+                         client.get_calls())
+
+    def test_bulkActionIsValidatedOnceForAllItsSystems(self):
+        client = RecordingClient({
+            "schedule.listCompletedSystems": lambda action_id: [
+                {'server_id': i, 'server_name': f"instance-{i}.suse.local"} for i in range(FLEET_SIZE)],
+            "schedule.listFailedSystems": [],
+            "schedule.listInProgressSystems": [],
+        })
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "action_ids")
+            action_id_file_manager = ActionIDFileManager(filename)
+            # every member of a bulk group gets the same action
+            for _ in range(FLEET_SIZE):
+                action_id_file_manager.append([500])
+            action_id_file_manager.save()
+            with open(filename) as f:
+                self.assertEqual("500\n", f.read())
+
+            action_id_validator = ActionIDValidator(client, ActionIDFileManager(filename))
+            action_id_validator.validate()
+
+        self.assertEqual(FLEET_SIZE, len(action_id_validator.get_systems()))
+        self.assertEqual({"schedule.listCompletedSystems": 1, "schedule.listFailedSystems": 1,
+                          "schedule.listInProgressSystems": 1}, client.get_calls())
@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import Mock
+from src.sumacli.client_systems import SystemListParser
+from src.sumacli.selector import evaluate, is_expression, tokenize
+
+
+class TestSelector(unittest.TestCase):
+
+    def setUp(self):
+        self.groups = {"prod": [1, 2, 3, 4], "sles15": [2, 3, 4, 5], "frozen": [4], "test": [6, 7]}
+        self.date = "2023-03-06 10:00:00"
+        self.client = Mock()
+        self.client.systemgroup.listSystems.side_effect = \
+            lambda group: [{'id': i, 'profile_name': f"instance-{i}.suse.local"} for i in self.groups[group]]
+        self.client.system.getId.side_effect = lambda name: [{'id': 8}] if name == "instance-8.suse.local" else []
+
+    def __resolve(self, term):
+        return self.groups[term[len("group:"):]]
+
+    def test_tokenizeKeepsDashesOfNames(self):
+        self.assertEqual(["group:Build Hosts", "-", "instance-k3s-1.suse.local"],
+                         tokenize("group:Build Hosts - instance-k3s-1.suse.local"))
+        self.assertFalse(is_expression("group:Build Hosts"))
+        self.assertFalse(is_expression("instance-k3s-1.suse.local"))
+
+    def test_setOperators(self):
+        self.assertEqual({2, 3}, evaluate("group:prod & group:sles15 - group:frozen", self.__resolve))
+        self.assertEqual({1, 2, 3, 4, 6, 7}, evaluate("group:prod | group:test", self.__resolve))
+        self.assertEqual({1, 2, 3, 6, 7}, evaluate("group:prod - group:frozen | group:test", self.__resolve))
+        self.assertEqual({1, 2, 3}, evaluate("group:prod - (group:frozen | group:test)", self.__resolve))
+        self.assertEqual({2, 3, 4}, evaluate("(group:prod | group:test) & group:sles15", self.__resolve))
+
+    def test_invalidExpressions(self):
+        for expression in ["group:prod &", "& group:prod", "(group:prod | group:test", "group:prod )",
+                           "group:prod (group:test)"]:
+            with self.assertRaises(ValueError):
+                evaluate(expression, self.__resolve)
+
+    def test_parserFetchesEachGroupOnce(self):
+        parser = SystemListParser(self.client, "not-used-filename")
+
+        self.assertTrue(parser._add_system(["group:prod & group:sles15 - group:frozen - instance-2.suse.local",
+                                            self.date]))
+        self.assertTrue(parser._add_system(["group:prod | group:test - group:frozen", "now"]))
+        systems = parser.get_systems()
+
+        self.assertEqual([(3, "instance-3.suse.local", "prod")],
+                         [(s.get_id(self.client), s.name, s.group) for s in systems[self.date]])
+        self.assertEqual([1, 2, 3, 4, 6, 7], [s.get_id(self.client) for s in systems["now"]])
+        self.assertEqual(4, self.client.systemgroup.listSystems.call_count)
+        self.client.system.getId.assert_not_called()
+
+    def test_parserExplicitHosts(self):
+        parser = SystemListParser(self.client, "not-used-filename")
+
+        self.assertTrue(parser._add_system(["group:frozen | instance-8.suse.local - instance-9.suse.local",
+                                            self.date]))
+        self.assertFalse(parser._add_system(["group:frozen |", self.date]))
+
+        systems = parser.get_systems()[self.date]
+        self.assertEqual([(4, "frozen"), (8, None)], [(s.get_id(self.client), s.group) for s in systems])
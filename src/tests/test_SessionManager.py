@@ -0,0 +1,79 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+from src.sumacli.session_mgr import SessionManager
+
+
+class TestSessionManager(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.config_dir = directory.name
+        self.session_file = os.path.join(self.config_dir, "suma.suse.local", "session")
+        config_manager_patcher = patch("src.sumacli.session_mgr.ConfigManager")
+        self.config_manager_class = config_manager_patcher.start()
+        self.addCleanup(config_manager_patcher.stop)
+        self.config_manager_class.side_effect = lambda: self.__get_config_manager("admin")
+
+    def __get_config_manager(self, login):
+        config_manager = Mock(manager_fqdn="suma.suse.local", manager_login=login)
+        config_manager.get_config_dir.return_value = self.config_dir
+        return config_manager
+
+    def __get_session_manager(self, login):
+        self.config_manager_class.side_effect = lambda: self.__get_config_manager(login)
+        return SessionManager()
+
+    def __read_session_file(self):
+        with open(self.session_file) as f:
+            return f.read()
+
+    def test_sessionsOfSeveralUsers(self):
+        self.__get_session_manager("admin").session_key = "key-admin"
+        self.__get_session_manager("admin2").session_key = "key-admin2"
+
+        self.assertEqual("key-admin", self.__get_session_manager("admin").session_key)
+        self.assertEqual("key-admin2", self.__get_session_manager("admin2").session_key)
+        self.assertEqual("admin:key-admin\nadmin2:key-admin2\n", self.__read_session_file())
+
+    def test_deleteOnlyRemovesItsUser(self):
+        for login in ["admin", "admin2", "operator"]:
+            self.__get_session_manager(login).session_key = f"key-{login}"
+
+        del self.__get_session_manager("admin").session_key
+
+        self.assertIsNone(self.__get_session_manager("admin").session_key)
+        self.assertEqual("admin2:key-admin2\noperator:key-operator\n", self.__read_session_file())
+
+    def test_firstUserIsUsedWithoutConfiguredUser(self):
+        self.__get_session_manager("operator").session_key = "key-operator"
+        config_manager = self.__get_config_manager(None)
+        self.config_manager_class.side_effect = lambda: config_manager
+
+        self.assertEqual("key-operator", SessionManager().session_key)
+        self.assertEqual("operator", config_manager.manager_login)
+
+    def test_concurrentWritersKeepEveryUser(self):
+        session_managers = [self.__get_session_manager(f"user{i}") for i in range(20)]
+        threads = [threading.Thread(target=setattr, args=(session_manager, "session_key", f"key{i}"))
+                   for i, session_manager in enumerate(session_managers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        lines = self.__read_session_file().splitlines()
+        self.assertEqual(sorted(f"user{i}:key{i}" for i in range(20)), sorted(lines))
+        self.assertEqual(["session", "session.lock"], sorted(os.listdir(os.path.dirname(self.session_file))))
+
+    def test_reloadReadsSessionOfAnotherProcess(self):
+        session_manager = self.__get_session_manager("admin")
+        session_manager.session_key = "old-key"
+        self.__get_session_manager("admin").session_key = "new-key"
+
+        self.assertEqual("old-key", session_manager.session_key)
+        session_manager.reload()
+        self.assertEqual("new-key", session_manager.session_key)
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from src.sumacli.client_systems import System
+from src.sumacli.shard import parse_shard, get_shard_index, select_shard
+from src.sumacli.validator import ActionIDFileManager
+
+
+class TestShard(unittest.TestCase):
+
+    def setUp(self):
+        self.systems = {"now": [System(f"instance-{i}.suse.local") for i in range(50)],
+                        "2023-03-06 10:00:00": [System(f"instance-{i}.suse.local") for i in range(50, 60)]}
+
+    def test_parseShard(self):
+        self.assertEqual((2, 4), parse_shard("2/4"))
+        self.assertRaises(ValueError, parse_shard, "0/4")
+        self.assertRaises(ValueError, parse_shard, "5/4")
+        self.assertRaises(ValueError, parse_shard, "2-4")
+
+    def test_shardIndexIsStable(self):
+        self.assertEqual(get_shard_index("instance-1.suse.local", 4), get_shard_index("instance-1.suse.local", 4))
+        self.assertTrue(1 <= get_shard_index("instance-1.suse.local", 4) <= 4)
+
+    def test_sequentialNamesAreBalanced(self):
+        counts = [0] * 8
+        for i in range(1000):
+            counts[get_shard_index(f"web{i}.example.com", 8) - 1] += 1
+
+        # 125 systems per shard on average
+        self.assertTrue(all(100 <= count <= 150 for count in counts), counts)
+
+    def test_everySystemBelongsToExactlyOneShard(self):
+        names = []
+        for index in range(1, 5):
+            for date_systems in select_shard(self.systems, index, 4).values():
+                names += [s.name for s in date_systems]
+
+        self.assertEqual(60, len(names))
+        self.assertEqual(60, len(set(names)))
+
+    def test_singleShardKeepsAllSystems(self):
+        self.assertEqual(self.systems, select_shard(self.systems, 1, 1))
+
+    def test_mergeShardActionIDsFiles(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filenames = [os.path.join(directory, f"action_ids.shard-{i}-of-2") for i in [1, 2]]
+            for filename, action_ids in zip(filenames, [[100, 101], [102, 100]]):
+                action_id_file_manager = ActionIDFileManager(filename)
+                action_id_file_manager.append(action_ids)
+                action_id_file_manager.save()
+
+            merged_file_manager = ActionIDFileManager(os.path.join(directory, "action_ids.merged"))
+
+            self.assertEqual([100, 101, 102], merged_file_manager.merge(filenames))
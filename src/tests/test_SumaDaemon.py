@@ -0,0 +1,79 @@
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from src.sumacli.client import ResponseCache
+from src.sumacli.daemon import SumaDaemon, forward, is_daemon_running
+
+
+class TestSumaDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.directory.name, "sumacli.sock")
+        self.commands = []
+        self.daemon = SumaDaemon(self.socket_path, self.__run)
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+        while not is_daemon_running(self.socket_path):
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        self.directory.cleanup()
+
+    def __run(self, argv):
+        self.commands.append((argv, os.getcwd()))
+        logging.getLogger(__name__).warning(f"Running {argv[0]}")
+        logging.getLogger(__name__).debug("Not sent")
+        return 64
+
+    def test_forwardRunsCommandInDaemon(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = forward(self.socket_path, ["patch", "systems.txt"])
+
+        self.assertEqual(64, exit_code)
+        self.assertEqual([(["patch", "systems.txt"], os.getcwd())], self.commands)
+        self.assertIn("WARNING - Running patch", output.getvalue())
+        self.assertNotIn("Not sent", output.getvalue())
+
+    def test_forwardWithoutDaemon(self):
+        self.assertIsNone(forward(os.path.join(self.directory.name, "missing.sock"), ["patch"]))
+        self.assertFalse(is_daemon_running(os.path.join(self.directory.name, "missing.sock")))
+
+    def test_secondDaemonIsRefused(self):
+        with self.assertRaises(RuntimeError):
+            SumaDaemon(self.socket_path, self.__run).serve_forever()
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_onlyReadOnlyMethodsAreCached(self):
+        cache = ResponseCache(300)
+        cache.put("errata.listKeywords", ("SUSE-2023-7",), ["reboot_suggested"])
+        cache.put("system.scheduleReboot", (1000010001,), 42)
+
+        self.assertEqual((True, ["reboot_suggested"]), cache.get("errata.listKeywords", ("SUSE-2023-7",)))
+        self.assertEqual((False, None), cache.get("system.scheduleReboot", (1000010001,)))
+        self.assertEqual((False, None), cache.get("errata.listKeywords", ("SUSE-2023-8",)))
+
+    def test_membershipLookupsAreNotCached(self):
+        cache = ResponseCache(300)
+        cache.put("system.getId", ("instance-k3s-1.suse.local",), [])
+        cache.put("systemgroup.listSystems", ("k3s",), [])
+
+        self.assertEqual((False, None), cache.get("system.getId", ("instance-k3s-1.suse.local",)))
+        self.assertEqual((False, None), cache.get("systemgroup.listSystems", ("k3s",)))
+
+    def test_expiredResponsesAreNotReturned(self):
+        cache = ResponseCache(0)
+        cache.put("errata.listKeywords", ("SUSE-2023-7",), ["reboot_suggested"])
+        time.sleep(0.01)
+
+        self.assertEqual((False, None), cache.get("errata.listKeywords", ("SUSE-2023-7",)))
@@ -29,3 +29,31 @@ class TestSystemErrataInspector(unittest.TestCase):
         system_errata_inspector = SystemErrataInspector(client, self.system, [AdvisoryType.ALL])
 
         self.assertFalse(system_errata_inspector.has_suggested_reboot())
+
+    def test_obtainSystemErrataFiltersByAdvisoryType(self):
+        client = Mock()
+        client.system.getRelevantErrata.return_value = [
+            {"id": 1, "advisory_name": "SUSE-2023-1", "advisory_type": "Security Advisory", "date": "2023-03-06"},
+            {"id": 2, "advisory_name": "SUSE-2023-2", "advisory_type": "Bug Fix Advisory"},
+            {"id": 3, "advisory_name": "SUSE-2023-3", "advisory_type": "Product Enhancement Advisory"},
+            {"id": 1, "advisory_name": "SUSE-2023-1", "advisory_type": "Security Advisory"}]
+        client.system.getId.return_value = [{'id': '100100001'}]
+
+        system_errata_inspector = SystemErrataInspector(client, self.system,
+                                                        [AdvisoryType.SECURITY, AdvisoryType.BUGFIX])
+        errata = system_errata_inspector.obtain_system_errata()
+
+        self.assertEqual([1, 2], [patch.id for patch in errata])
+        self.assertEqual([1, 2], errata.get_ids())
+        self.assertEqual("SUSE-2023-1", errata[0].advisory_name)
+        self.assertEqual("Bug Fix Advisory", errata[1].advisory_type)
+        self.assertEqual(1, client.system.getRelevantErrata.call_count)
+        client.system.getRelevantErrataByType.assert_not_called()
+
+    def test_obtainSystemErrataWithoutAdvisoryTypes(self):
+        client = Mock()
+
+        system_errata_inspector = SystemErrataInspector(client, self.system, [])
+
+        self.assertEqual([], system_errata_inspector.obtain_system_errata())
+        client.system.getRelevantErrata.assert_not_called()
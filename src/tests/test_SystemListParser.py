@@ -96,3 +96,13 @@ class TestSystemListParser(unittest.TestCase):
         self.parser._add_system([self.system1,self.date1,"target1","kopts1"])
         systems = self.parser.get_systems()
         self.assertEqual("kopts1", systems[self.date1][0].kopts)
+
+    def test_systemListParserCompactSystems(self):
+        # targets built from different lines are the same string object
+        self.parser._add_system([self.system1, self.date1, "".join(["sle-product-", "sles15-sp5"])])
+        self.parser._add_system(["group:my-servers-group", self.date1, "".join(["sle-product-", "sles15-sp5"])])
+        systems = self.parser.get_systems()[self.date1]
+
+        self.assertFalse(hasattr(systems[0], "__dict__"))
+        self.assertIs(systems[0].target, systems[2].target)
+        self.assertEqual(1000010172, systems[2].get_id(None))
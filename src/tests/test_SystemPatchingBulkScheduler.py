@@ -0,0 +1,105 @@
+import logging
+import unittest
+from datetime import datetime
+from unittest.mock import Mock
+from xmlrpc.client import Fault
+from src.sumacli.advisory_type import AdvisoryType
+from src.sumacli.client_systems import System
+from src.sumacli import log_mgr
+from src.sumacli.patching import SystemPatchingBulkScheduler
+
+
+class TestSystemPatchingBulkScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(2023, 3, 6, 10, 0, 0)
+        self.system1 = System("instance-k3s-1.suse.local")
+        self.system2 = System("instance-k3s-2.suse.local")
+        self.system3 = System("instance-k3s-3.suse.local")
+        self.system_ids = {self.system1.name: 1000010001, self.system2.name: 1000010002,
+                           self.system3.name: 1000010003}
+
+        self.client = Mock()
+        self.client.schedule.listInProgressActions.return_value = []
+        self.client.system.getId.side_effect = lambda name: [{'id': self.system_ids[name]}]
+        self.client.system.getRelevantErrata.side_effect = self.__relevant_errata
+        self.client.errata.listKeywords.return_value = []
+        self.client.system.scheduleApplyErrata.side_effect = [[500], [501]]
+
+    def __relevant_errata(self, system_id):
+        if system_id == 1000010003:
+            return [{'id': 3, 'advisory_name': 'SUSE-2023-3'}]
+        return [{'id': 1, 'advisory_name': 'SUSE-2023-1'}, {'id': 2, 'advisory_name': 'SUSE-2023-2'}]
+
+    def __get_scheduler(self, reboot_required=False, no_reboot=False):
+        return SystemPatchingBulkScheduler(self.client, [self.system1, self.system2, self.system3], self.date,
+                                           lambda system: [AdvisoryType.ALL], reboot_required, no_reboot,
+                                           "patching")
+
+    def test_identicalErrataSetsShareOneCall(self):
+        results = self.__get_scheduler().schedule()
+
+        self.assertEqual(2, self.client.system.scheduleApplyErrata.call_count)
+        self.client.system.scheduleApplyErrata.assert_any_call([1000010001, 1000010002], [1, 2], self.date)
+        self.client.system.scheduleApplyErrata.assert_any_call([1000010003], [3], self.date)
+        self.assertEqual([500], results[self.system1])
+        self.assertEqual([500], results[self.system2])
+        self.assertEqual([501], results[self.system3])
+
+    def test_rebootGroupsUseOneActionChain(self):
+        self.client.actionchain.createChain.return_value = 1
+        self.client.actionchain.addErrataUpdate.return_value = 600
+        self.client.actionchain.addSystemReboot.side_effect = [601, 602, 603]
+        self.client.actionchain.scheduleChain.return_value = 1
+
+        results = self.__get_scheduler(reboot_required=True).schedule()
+
+        self.assertEqual(2, self.client.actionchain.createChain.call_count)
+        self.client.system.scheduleApplyErrata.assert_not_called()
+        self.assertEqual([600, 601], results[self.system1])
+        self.assertEqual([600, 602], results[self.system2])
+
+    def test_chainLabelsOfOtherShardsDoNotCollide(self):
+        self.client.actionchain.createChain.return_value = 1
+        self.client.actionchain.addErrataUpdate.return_value = 600
+        self.client.actionchain.addSystemReboot.return_value = 601
+        self.client.actionchain.scheduleChain.return_value = 1
+
+        # two shards with one group each on the same date
+        for systems in ([self.system1], [self.system3]):
+            SystemPatchingBulkScheduler(self.client, systems, self.date, lambda system: [AdvisoryType.ALL], True,
+                                        False, "patching").schedule()
+
+        labels = [c.args[0] for c in self.client.actionchain.createChain.call_args_list]
+        self.assertEqual(2, len(set(labels)))
+        self.assertTrue(all(label.startswith("patching-bulk-") for label in labels))
+
+    def test_systemWithActionInProgressIsNotScheduled(self):
+        action = {'id': 42, 'earliest': Mock(value="20230306T09:00:00")}
+        self.client.schedule.listInProgressActions.return_value = [action]
+        self.client.schedule.listInProgressSystems.return_value = [{'server_name': self.system1.name}]
+
+        results = self.__get_scheduler().schedule()
+
+        self.assertIsNone(results[self.system1])
+        self.client.system.scheduleApplyErrata.assert_any_call([1000010002], [1, 2], self.date)
+
+    def test_errorsAreKeptPerSystem(self):
+        logging.getLogger().addHandler(log_mgr._error_collector)
+        self.addCleanup(logging.getLogger().removeHandler, log_mgr._error_collector)
+        # the name of the first system is a prefix of the name of the second one
+        self.system1 = System("host-1.suse.local")
+        self.system2 = System("host-1.suse.local.old")
+        self.system_ids = {self.system1.name: 1000010001, self.system2.name: 1000010002,
+                           self.system3.name: 1000010003}
+        self.client.system.scheduleApplyErrata.side_effect = [Fault(2800, "Invalid errata"), [501]]
+
+        scheduler = self.__get_scheduler()
+        scheduler.schedule()
+        errors = scheduler.get_errors()
+
+        group_errors = ["Failed to schedule errata for systems: ['host-1.suse.local', 'host-1.suse.local.old']",
+                        "Fault code: 2800", "Fault string: Invalid errata"]
+        self.assertEqual(group_errors, errors[self.system1])
+        self.assertEqual(group_errors, errors[self.system2])
+        self.assertEqual([], errors[self.system3])
@@ -0,0 +1,88 @@
+import logging
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
+from xmlrpc.client import Fault
+from src.sumacli.client_systems import System
+from src.sumacli import log_mgr
+from src.sumacli.upgrade import SystemUpgradeBulkScheduler
+from src.sumacli.validator import ActionIDFileManager
+
+
+class TestSystemUpgradeBulkScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(2023, 3, 6, 10, 0, 0)
+        self.systems = [System(f"instance-sles15-{i}.suse.local", "sles15-sp5-upgrade", system_id=1000010000 + i)
+                        for i in range(3)]
+
+        self.client = Mock()
+        self.client.kickstart.profile.getVariables.return_value = {'org': 1}
+        self.client.kickstart.profile.getKickstartTree.return_value = "sles15-sp5"
+        self.client.kickstart.tree.getDetails.return_value = {'kernel_options': 'quiet',
+                                                              'install_type': {'label': 'sles15generic'}}
+        self.client.system.createSystemRecord.return_value = 1
+        self.client.system.obtainReactivationKey.return_value = "re-key"
+        self.client.system.scheduleApplyStates.return_value = 700
+
+        config_manager_patcher = patch("src.sumacli.upgrade.ConfigManager")
+        config_manager_patcher.start().return_value.manager_fqdn = "suma.suse.local"
+        self.addCleanup(config_manager_patcher.stop)
+
+    def test_systemsShareOneApplyStatesCall(self):
+        results = SystemUpgradeBulkScheduler(self.client, self.systems, self.date, 2).schedule()
+
+        self.client.system.scheduleApplyStates.assert_called_once_with([1000010000, 1000010001, 1000010002],
+                                                                       ["bootloader.autoinstall"], self.date, False)
+        self.assertEqual(3, self.client.system.setPillar.call_count)
+        self.assertEqual(1, self.client.kickstart.profile.getKickstartTree.call_count)
+        self.assertEqual([[700], [700], [700]], [results[s] for s in self.systems])
+
+    def test_sharedActionIsSavedOnce(self):
+        results = SystemUpgradeBulkScheduler(self.client, self.systems, self.date, 2).schedule()
+
+        with tempfile.TemporaryDirectory() as directory:
+            action_id_file_manager = ActionIDFileManager(os.path.join(directory, "action_ids"))
+            for action_ids in results.values():
+                action_id_file_manager.append(action_ids)
+            action_id_file_manager.save()
+            with open(action_id_file_manager.get_filename()) as f:
+                self.assertEqual("700\n", f.read())
+
+    def test_failedPreparationIsNotScheduled(self):
+        self.client.system.createSystemRecord.side_effect = lambda system_id, target: \
+            0 if system_id == 1000010001 else 1
+
+        results = SystemUpgradeBulkScheduler(self.client, self.systems, self.date, 1).schedule()
+
+        self.client.system.scheduleApplyStates.assert_called_once_with([1000010000, 1000010002],
+                                                                       ["bootloader.autoinstall"], self.date, False)
+        self.assertIsNone(results[self.systems[1]])
+
+    def test_faultWhenSchedulingFailsAllSystems(self):
+        self.client.system.scheduleApplyStates.side_effect = Fault(2800, "Invalid state")
+
+        results = SystemUpgradeBulkScheduler(self.client, self.systems, self.date, 1).schedule()
+
+        self.assertTrue(all(action_ids is None for action_ids in results.values()))
+
+    def test_errorsOfWorkersAreKeptPerSystem(self):
+        logging.getLogger().addHandler(log_mgr._error_collector)
+        self.addCleanup(logging.getLogger().removeHandler, log_mgr._error_collector)
+        self.client.system.setPillar.side_effect = lambda system_id, category, pillar: \
+            self.__fail_pillar(system_id)
+        scheduler = SystemUpgradeBulkScheduler(self.client, self.systems, self.date, 3)
+
+        scheduler.schedule()
+        errors = scheduler.get_errors()
+
+        self.assertEqual([], errors[self.systems[0]])
+        self.assertEqual(["Failed to prepare upgrade for system instance-sles15-1.suse.local",
+                          "Fault code: 2800", "Fault string: Invalid pillar"], errors[self.systems[1]])
+
+    def __fail_pillar(self, system_id):
+        if system_id == 1000010001:
+            raise Fault(2800, "Invalid pillar")
+        return 1
@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from src.sumacli.tracing import Tracer
+
+
+class TestTracer(unittest.TestCase):
+
+    def test_tracerSavesNestedSpansInChromeTraceFormat(self):
+        tracer = Tracer()
+        with tracer.span("patch mysystem.suse.local", "system", system="mysystem.suse.local"):
+            with tracer.span("system.getId", "rpc"):
+                pass
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "trace.json")
+            tracer.save(filename)
+            with open(filename) as f:
+                events = json.load(f)["traceEvents"]
+
+        spans = [e for e in events if e["ph"] == "X"]
+        self.assertEqual(["patch mysystem.suse.local", "system.getId"], [e["name"] for e in spans])
+        parent, child = spans
+        self.assertEqual(parent["tid"], child["tid"])
+        self.assertLessEqual(parent["ts"], child["ts"])
+        self.assertGreaterEqual(parent["ts"] + parent["dur"], child["ts"] + child["dur"])
+        self.assertEqual("mysystem.suse.local", parent["args"]["system"])
+        self.assertEqual(1, len([e for e in events if e["ph"] == "M"]))
+
+    def test_asyncSpanTiesTheThreadsOfASystem(self):
+        tracer = Tracer()
+        tracer.begin_async("patch mysystem.suse.local", 7, "system", system="mysystem.suse.local")
+        thread = threading.Thread(target=lambda: tracer.end_async("patch mysystem.suse.local", 7, "system"))
+        thread.start()
+        thread.join()
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "trace.json")
+            tracer.save(filename)
+            with open(filename) as f:
+                events = json.load(f)["traceEvents"]
+
+        begin, end = [e for e in events if e["ph"] in ("b", "e")]
+        self.assertEqual(("b", "e"), (begin["ph"], end["ph"]))
+        self.assertEqual((7, "system"), (end["id"], end["cat"]))
+        self.assertEqual(begin["id"], end["id"])
+        self.assertNotEqual(begin["tid"], end["tid"])
+        self.assertLessEqual(begin["ts"], end["ts"])
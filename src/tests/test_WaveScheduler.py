@@ -0,0 +1,48 @@
+import unittest
+from datetime import datetime, timedelta
+from src.sumacli.client_systems import System
+from src.sumacli.waves import WaveScheduler, group_by_schedule_date
+
+
+class TestWaveScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.start = datetime(2023, 3, 6, 10, 0, 0)
+        self.systems = [System("web-1", group="web"), System("web-2", group="web"), System("db-1", group="db"),
+                        System("db-2", group="db"), System("standalone")]
+
+    def test_waveSchedulerSpreadsSlotsAcrossWindow(self):
+        WaveScheduler(timedelta(minutes=60), 2).spread(self.systems, self.start)
+
+        dates = [s.schedule_date for s in self.systems]
+        self.assertEqual([self.start, self.start, self.start + timedelta(minutes=30),
+                          self.start + timedelta(minutes=30), self.start + timedelta(minutes=60)], dates)
+
+    def test_waveSchedulerSingleSlotKeepsStartDate(self):
+        WaveScheduler(timedelta(minutes=60), 10).spread(self.systems, self.start)
+
+        self.assertTrue(all(s.schedule_date == self.start for s in self.systems))
+
+    def test_waveSchedulerGroupOrder(self):
+        ordered = WaveScheduler(timedelta(minutes=60), 2, "group").spread(self.systems, self.start)
+
+        self.assertEqual(["db-1", "db-2", "web-1", "web-2", "standalone"], [s.name for s in ordered])
+
+    def test_waveSchedulerCanaryOrder(self):
+        ordered = WaveScheduler(timedelta(minutes=60), 2, "canary").spread(self.systems, self.start)
+
+        self.assertEqual(["web-1", "db-1", "web-2", "db-2", "standalone"], [s.name for s in ordered])
+        self.assertEqual(self.start, ordered[0].schedule_date)
+        self.assertEqual(self.start, ordered[1].schedule_date)
+
+    def test_waveSchedulerInvalidSlotSize(self):
+        self.assertRaises(ValueError, WaveScheduler, timedelta(minutes=60), 0)
+
+    def test_groupByScheduleDate(self):
+        WaveScheduler(timedelta(minutes=60), 2).spread(self.systems, self.start)
+
+        waves = group_by_schedule_date(self.systems)
+
+        self.assertEqual(3, len(waves))
+        self.assertEqual(self.start, waves[0][0])
+        self.assertEqual(["web-1", "web-2"], [s.name for s in waves[0][1]])